@@ -0,0 +1,177 @@
+# 大量の虫食い算をまとめて解く
+
+import itertools
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from mushikui_solver import DepthFirstSearch, SearchOptions, SearchStats
+
+# (multiple_line1, multiple_line2, intermediate_lines, product_line)
+Puzzle = Tuple[str, str, List[str], str]
+
+
+@dataclass
+class BatchResult:
+    """solve_manyの1問分の結果。
+
+    Attributes:
+        index (int): 入力での順番(0始まり)
+        puzzle (Puzzle): 入力の虫食い算
+        answer (Optional[Tuple[str, str]]): 掛けられる数と掛ける数。解が見つからなかった場合はNone。
+        error (Optional[str]): 解けなかった場合や、timeoutで探索を止めた場合のエラーメッセージ。解けた場合はNone。
+        stats (Optional[SearchStats]): 探索の統計。入力に誤りがあった場合はNone。
+        answers (Optional[List[Tuple[str, str]]]): all_solutionsを指定した場合の全ての解。
+            timeoutで探索を止めた場合は、それまでに見つけた解。指定しなかった場合はNone。
+    """
+
+    index: int
+    puzzle: Puzzle
+    answer: Optional[Tuple[str, str]] = None
+    error: Optional[str] = None
+    stats: Optional[SearchStats] = None
+    answers: Optional[List[Tuple[str, str]]] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def solve_one(
+    index: int,
+    puzzle: Puzzle,
+    options: Optional[SearchOptions] = None,
+    timeout: Optional[float] = None,
+    all_solutions: bool = False,
+) -> BatchResult:
+    """
+    1問を解き、例外を送出する代わりにエラーメッセージを結果に入れて返す。
+
+    Args:
+        index (int): 入力での順番
+        puzzle (Puzzle): 虫食い算
+        options (Optional[SearchOptions]): 探索の方法。Noneなら既定の設定。
+        timeout (Optional[float]): 探索にかける時間の上限(秒)。Noneなら上限なし。
+        all_solutions (bool): Trueなら最初の解で止めず、全ての解をanswersに入れる。
+
+    Returns:
+        BatchResult: 解いた結果
+    """
+    try:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        search = DepthFirstSearch(*puzzle, options=options)
+        answers = []
+        for node in search.run(deadline=deadline):
+            answers.append(search.decode(node))
+            if not all_solutions:
+                break
+        result = BatchResult(index, puzzle, stats=search.stats)
+        if answers:
+            result.answer = answers[0]
+        if all_solutions:
+            result.answers = answers
+        if search.interrupted is not None:
+            result.error = f"Error: search interrupted ({search.interrupted})"
+        elif not answers:
+            result.error = "Error: no answer"
+        return result
+    except ValueError as e:
+        return BatchResult(index, puzzle, error=str(e))
+    except Exception as e:
+        return BatchResult(index, puzzle, error=f"{type(e).__name__}: {e}")
+
+
+def _solve_chunk(
+    chunk: List[Tuple[int, Puzzle]],
+    options: Optional[SearchOptions],
+    timeout: Optional[float] = None,
+    all_solutions: bool = False,
+) -> List[BatchResult]:
+    return [
+        solve_one(index, puzzle, options, timeout, all_solutions) for index, puzzle in chunk
+    ]
+
+
+def _chunks(
+    puzzles: Iterable[Puzzle], chunksize: int
+) -> Iterator[List[Tuple[int, Puzzle]]]:
+    numbered = enumerate(puzzles)
+    while True:
+        chunk = list(itertools.islice(numbered, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+
+def solve_many(
+    puzzles: Iterable[Puzzle],
+    workers: Optional[int] = None,
+    ordered: bool = True,
+    chunksize: int = 16,
+    options: Optional[SearchOptions] = None,
+    timeout: Optional[float] = None,
+    all_solutions: bool = False,
+) -> Iterator[BatchResult]:
+    """
+    複数の虫食い算を解き、結果を順に返す。
+
+    入力はchunksize問ずつまとめてワーカープロセスに渡す。同時に処理中のまとまりは
+    ワーカー数の2倍までなので、入力がどれだけ大きくても使うメモリは一定になる。
+    1問ごとの入力の誤りや解が無いことはBatchResult.errorに入れ、他の問題の処理は続ける。
+
+    Args:
+        puzzles (Iterable[Puzzle]): (multiple_line1, multiple_line2, intermediate_lines, product_line)の列
+        workers (Optional[int]): ワーカープロセス数。NoneならCPU数。1以下ならこのプロセスで解く。
+        ordered (bool): Trueなら入力の順に、Falseなら解き終わった順に返す。
+        chunksize (int): 1回にワーカーへ渡す問題数。
+        options (Optional[SearchOptions]): 探索の方法。Noneなら既定の設定。
+        timeout (Optional[float]): 1問の探索にかける時間の上限(秒)。超えた問題はerrorに入れて次の問題に進む。
+        all_solutions (bool): Trueなら1問ごとに全ての解を探す。
+
+    Yields:
+        BatchResult: 1問分の結果
+    """
+    if chunksize < 1:
+        raise ValueError("Error: chunksize should be 1 or more")
+    if timeout is not None and timeout < 0:
+        raise ValueError("Error: timeout should be 0 or more")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    chunks = _chunks(puzzles, chunksize)
+
+    if workers <= 1:
+        for chunk in chunks:
+            yield from _solve_chunk(chunk, options, timeout, all_solutions)
+        return
+
+    max_running = 2 * workers
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        running = {}
+        finished: Dict[int, List[BatchResult]] = {}
+        next_chunk = 0
+        submitted = 0
+        exhausted = False
+        while True:
+            while not exhausted and len(running) + len(finished) < max_running:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    exhausted = True
+                    break
+                running[executor.submit(
+                    _solve_chunk, chunk, options, timeout, all_solutions)] = submitted
+                submitted += 1
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                chunk_index = running.pop(future)
+                if not ordered:
+                    yield from future.result()
+                    continue
+                finished[chunk_index] = future.result()
+            while next_chunk in finished:
+                yield from finished.pop(next_chunk)
+                next_chunk += 1
@@ -0,0 +1,259 @@
+# 難しさの違う虫食い算の集まりを、探索の設定ごとに解いて計測する
+
+import argparse
+import json
+import platform
+import random
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+from mushikui_solver import DepthFirstSearch, SearchOptions, SearchStats, np
+
+# (multiple_line1, multiple_line2, intermediate_lines, product_line)
+Puzzle = Tuple[str, str, List[str], str]
+
+
+@dataclass(frozen=True)
+class BenchCase:
+    """計測に使う虫食い算。
+
+    Attributes:
+        name (str): 名前。結果の比較に使うので、コーパスの中で一意。
+        grade (str): 難しさの区分。"被乗数の桁数x乗数の桁数/*の割合"、または"demo"、"no_answer"、"multi"。
+        puzzle (Puzzle): 虫食い算
+    """
+
+    name: str
+    grade: str
+    puzzle: Puzzle
+
+
+def masked_puzzle(length1: int, length2: int, density: float, seed: int) -> Puzzle:
+    """
+    無作為に選んだ掛け算の各桁を、確率densityで*に置き換えた虫食い算を作る。
+    中間結果の0は*にできない(先頭の*は1-9)ので、そのまま残す。
+
+    Args:
+        length1 (int): 被乗数の桁数
+        length2 (int): 乗数の桁数
+        density (float): 桁を*にする確率
+        seed (int): 乱数の種。同じ引数からは同じ虫食い算を作る。
+
+    Returns:
+        Puzzle: 虫食い算。元の掛け算は必ず解の一つになる。
+    """
+    rng = random.Random(f"{length1}x{length2}/{density}/{seed}")
+    value1 = rng.randrange(10 ** (length1 - 1), 10**length1)
+    value2 = rng.randrange(10 ** (length2 - 1), 10**length2)
+
+    def mask(line: str) -> str:
+        if line == "0":
+            return line
+        return "".join("*" if rng.random() < density else char for char in line)
+
+    intermediate_lines = [str(value1 * int(digit)) for digit in reversed(str(value2))]
+    return (
+        mask(str(value1)),
+        mask(str(value2)),
+        [mask(line) for line in intermediate_lines],
+        mask(str(value1 * value2)),
+    )
+
+
+# (被乗数の桁数, 乗数の桁数, *の割合)
+GRADES = [
+    (3, 2, 0.5), (3, 2, 0.8),
+    (4, 3, 0.5), (4, 3, 0.7),
+    (5, 3, 0.5), (5, 3, 0.7),
+    (5, 4, 0.6), (6, 4, 0.6),
+]
+
+
+def make_corpus(cases_per_grade: int = 3) -> List[BenchCase]:
+    """
+    計測に使う虫食い算の集まりを作る。GRADESの区分ごとにcases_per_grade問と、
+    __main__の例題、解が無いもの、解が複数あるものを含む。
+    """
+    corpus = [
+        BenchCase("demo_6x4", "demo",
+                  ("******", "****", ["66****", "6*****", "**666**", "**6**6"], "****66****")),
+        BenchCase("demo_2x2", "demo", ("2*", "**", ["*3*", "**"], "*4*")),
+        BenchCase("demo_3x3", "demo", ("**1", "*2*", ["*3**", "*4**", "*5**"], "6*****")),
+        BenchCase("prime_product", "no_answer", ("***", "**", ["***", "***"], "9973")),
+        BenchCase("short_line", "no_answer", ("2**", "**", ["0", "9***"], "****")),
+        BenchCase("many_2x2", "multi", ("*1", "**", ["**", "***"], "**1*")),
+        BenchCase("many_3x2", "multi", ("**7", "7*", ["***", "***"], "77**")),
+    ]
+    for length1, length2, density in GRADES:
+        grade = f"{length1}x{length2}/{density}"
+        for seed in range(cases_per_grade):
+            corpus.append(BenchCase(
+                f"{grade}#{seed}", grade, masked_puzzle(length1, length2, density, seed)))
+    return corpus
+
+
+def configurations() -> Dict[str, SearchOptions]:
+    """計測する探索の設定。NumPyが無い場合はvectorizedを除く。"""
+    configs = {
+        "ends": SearchOptions(),
+        "mrv": SearchOptions(ordering="mrv"),
+        "columns": SearchOptions(column_propagation=True),
+        "multiplier_first": SearchOptions(engine="multiplier_first"),
+        "suffix_tables": SearchOptions(suffix_tables=True),
+        "nogood": SearchOptions(nogood_cache=10000),
+        "prefix": SearchOptions(prefix_bounds=True),
+        "preprocess": SearchOptions(preprocess=True),
+        "combined": SearchOptions(
+            column_propagation=True, suffix_tables=True, prefix_bounds=True,
+            preprocess=True, visited="none"),
+    }
+    if np is not None:
+        configs["vectorized"] = SearchOptions(vectorized=True)
+    return configs
+
+
+def run_case(case: BenchCase, options: SearchOptions, max_nodes: Optional[int]) -> dict:
+    """
+    1問を全ての解が見つかるまで探索し、統計を返す。
+
+    Returns:
+        dict: SearchStatsの各項目と、case、grade、complete(max_nodesに達せず探索し終えたか)。
+            wall_timeは探索の準備を含めた時間。入力に誤りがある場合はerrorにメッセージを入れる。
+    """
+    record = {"case": case.name, "grade": case.grade}
+    stats = SearchStats()
+    started = time.perf_counter()
+    try:
+        search = DepthFirstSearch(*case.puzzle, stats=stats, options=options)
+        for _ in search.run(max_nodes=max_nodes):
+            pass
+        record["complete"] = not search.stack
+    except ValueError as e:
+        record["error"] = str(e)
+    # preprocessなど、探索の前の準備にかかった時間も含める
+    stats.wall_time = time.perf_counter() - started
+    record.update(asdict(stats))
+    return record
+
+
+def run_benchmark(
+    corpus: List[BenchCase],
+    configs: Dict[str, SearchOptions],
+    max_nodes: Optional[int] = 200000,
+) -> List[dict]:
+    """
+    全ての問題を全ての設定で解き、1問1設定ごとの統計のリストを返す。
+
+    Args:
+        corpus (List[BenchCase]): 問題
+        configs (Dict[str, SearchOptions]): 設定の名前と設定
+        max_nodes (Optional[int]): 1問あたりのノード数の上限。Noneなら最後まで探索する。
+
+    Returns:
+        List[dict]: run_caseの結果にconfig(設定の名前)を加えたもの
+    """
+    results = []
+    for case in corpus:
+        for name, options in configs.items():
+            record = {"config": name}
+            record.update(run_case(case, options, max_nodes))
+            results.append(record)
+    return results
+
+
+def write_results(path: str, results: List[dict]) -> None:
+    """結果を実行環境の情報と一緒にJSONで書き出す。"""
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+
+
+def read_results(path: str) -> List[dict]:
+    """write_resultsで書き出した結果を読む。"""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["results"]
+
+
+def compare_results(
+    baseline: List[dict], current: List[dict], threshold: float = 1.2, min_time: float = 0.05
+) -> List[dict]:
+    """
+    同じ問題と設定の組について二つの結果を比べ、悪くなったものを返す。
+
+    展開したノード数がthreshold倍より多くなったもの、解の数が変わったもの、
+    探索にかかった時間がthreshold倍より長くなったもの(両方ともmin_time秒未満なら無視する)を返す。
+
+    Returns:
+        List[dict]: case、config、metric(悪くなった項目)、baseline、currentからなる辞書のリスト
+    """
+    previous = {(record["config"], record["case"]): record for record in baseline}
+    regressions = []
+    for record in current:
+        old = previous.get((record["config"], record["case"]))
+        if old is None:
+            continue
+        checks = [
+            ("solutions", old["solutions"] != record["solutions"]),
+            ("nodes_expanded", record["nodes_expanded"] > old["nodes_expanded"] * threshold),
+            ("wall_time", record["wall_time"] > max(old["wall_time"] * threshold, min_time)),
+        ]
+        for metric, worse in checks:
+            if worse:
+                regressions.append({
+                    "case": record["case"], "config": record["config"], "metric": metric,
+                    "baseline": old[metric], "current": record[metric],
+                })
+    return regressions
+
+
+def summarize(results: List[dict]) -> List[Tuple[str, int, int, float]]:
+    """設定ごとに(設定の名前, 探索し終えた問題の数, 展開したノード数の合計, 時間の合計)を返す。"""
+    totals = {}
+    for record in results:
+        total = totals.setdefault(record["config"], [0, 0, 0.0])
+        total[0] += bool(record.get("complete"))
+        total[1] += record["nodes_expanded"]
+        total[2] += record["wall_time"]
+    return [(name, *total) for name, total in totals.items()]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="虫食い算ソルバーのベンチマーク")
+    parser.add_argument("--output", default="bench.json", help="結果を書き出すJSONファイル")
+    parser.add_argument("--compare", help="比べる前回の結果のJSONファイル")
+    parser.add_argument("--cases", type=int, default=3, help="区分ごとの問題数")
+    parser.add_argument("--max-nodes", type=int, default=200000, help="1問あたりのノード数の上限")
+    parser.add_argument("--config", action="append", help="計測する設定の名前(複数指定可)。省略すると全て")
+    parser.add_argument("--threshold", type=float, default=1.2, help="悪くなったとみなす比")
+    args = parser.parse_args(argv)
+
+    configs = configurations()
+    if args.config:
+        unknown = set(args.config) - set(configs)
+        if unknown:
+            parser.error(f"unknown config: {', '.join(sorted(unknown))}")
+        configs = {name: configs[name] for name in args.config}
+    results = run_benchmark(make_corpus(args.cases), configs, args.max_nodes)
+    write_results(args.output, results)
+
+    print(f"{'config':<18}{'complete':>9}{'nodes':>12}{'time(s)':>10}")
+    for name, complete, nodes, wall_time in summarize(results):
+        print(f"{name:<18}{complete:>9}{nodes:>12}{wall_time:>10.2f}")
+
+    if args.compare:
+        regressions = compare_results(read_results(args.compare), results, args.threshold)
+        for regression in regressions:
+            print("regression: {case} {config} {metric}: {baseline} -> {current}".format(
+                **regression))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,254 @@
+# 同じ虫食い算を何度も解かないよう、結果をメモリとディスクに覚えておく
+
+import json
+import sqlite3
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from mushikui_solver import SearchOptions, count_solutions, solver, validate_input
+
+# 最初に見つかる解を変えうる探索の設定。これ以外の設定は枝切りや速さだけを変える。
+# division_limitはengine="multiplier_first"のときだけ、被乗数を割り算で求めるか探索するかを変える。
+_ORDER_FIELDS = ("ordering", "column_propagation", "engine", "preprocess")
+
+
+def normalize_puzzle(
+    multiple_line1: str,
+    multiple_line2: str,
+    intermediate_lines: List[str],
+    product_line: str,
+) -> Tuple[str, str, List[str], str]:
+    """
+    前後の空白を取り除き、入力を検査する。
+
+    Raises:
+        ValueError: 入力に誤りがある場合。
+    """
+    puzzle = (
+        multiple_line1.strip(),
+        multiple_line2.strip(),
+        [line.strip() for line in intermediate_lines],
+        product_line.strip(),
+    )
+    validate_input(*puzzle)
+    return puzzle
+
+
+def canonical_key(
+    multiple_line1: str,
+    multiple_line2: str,
+    intermediate_lines: List[str],
+    product_line: str,
+) -> str:
+    """
+    虫食い算をキャッシュのキーにする文字列に変換する。前後の空白は取り除く。
+
+    Returns:
+        str: "被乗数x乗数|中間結果,...|掛け算の結果"。例: "1*3x1*4|4*2,0,1*3|12*92"
+
+    Raises:
+        ValueError: 入力に誤りがある場合。
+    """
+    multiple_line1, multiple_line2, intermediate_lines, product_line = normalize_puzzle(
+        multiple_line1, multiple_line2, intermediate_lines, product_line)
+    return f"{multiple_line1}x{multiple_line2}|{','.join(intermediate_lines)}|{product_line}"
+
+
+def order_key(options: Optional[SearchOptions]) -> str:
+    """
+    最初に見つかる解と解の順序を変えうる設定だけを並べた文字列を返す。この文字列が同じ設定では、解は同じ順に見つかる。
+
+    Returns:
+        str: 例: "ordering=ends,column_propagation=False,engine=dfs,preprocess=False"
+    """
+    options = SearchOptions() if options is None else options
+    fields = _ORDER_FIELDS
+    if options.engine == "multiplier_first":
+        fields += ("division_limit",)
+    return ",".join(f"{name}={getattr(options, name)}" for name in fields)
+
+
+@dataclass
+class CacheStats:
+    """SolutionCacheの統計。
+
+    Attributes:
+        hits (int): メモリに覚えた結果を使った回数
+        disk_hits (int): メモリに無く、ディスクに覚えた結果を使った回数
+        misses (int): 覚えた結果が無く、探索した回数
+    """
+
+    hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+
+
+class SolutionCache:
+    """
+    solverとcount_solutionsの結果を、虫食い算ごとに覚えておく。
+
+    メモリには最大maxsize件、max_bytesを与えた場合は合計max_bytesバイトまでをLRUで覚え、
+    pathを与えた場合はsqliteのファイルにも書き込む。1件の大きさは、キーとJSONにした結果の長さで見積もる。
+    ファイルは複数のプロセスから同時に使える。解が無いという結果と解の数も覚えるので、
+    解が無いと分かった虫食い算をsolverで解き直すことも無い。
+
+    solverの結果は、最初に見つかる解を変えうる設定(order_key)ごとに覚える。解の数と解が無いことは設定によらない。
+
+    Args:
+        maxsize (int): メモリに覚える結果の件数の上限。0ならメモリには覚えない。
+        path (Optional[str]): sqliteのファイル。Noneならディスクには覚えない。
+        max_bytes (Optional[int]): メモリに覚える結果の大きさの合計の上限(バイト)。Noneなら件数だけで制限する。
+    """
+
+    def __init__(
+        self, maxsize: int = 1024, path: Optional[str] = None, max_bytes: Optional[int] = None
+    ):
+        if maxsize < 0:
+            raise ValueError("Error: maxsize should be 0 or more")
+        if max_bytes is not None and max_bytes < 0:
+            raise ValueError("Error: max_bytes should be 0 or more")
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.path = path
+        self.stats = CacheStats()
+        self.memory_bytes = 0  # メモリに覚えた結果の大きさの合計の見積もり
+        self._memory = OrderedDict()  # キー -> (結果, 大きさ)
+        self._connection = None
+        if path is not None:
+            self._connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+
+    def __len__(self) -> int:
+        return len(self._memory)
+
+    def __enter__(self) -> "SolutionCache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """ディスクのファイルを閉じる。"""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def clear(self) -> None:
+        """メモリとディスクに覚えた結果を全て消す。"""
+        self._memory.clear()
+        self.memory_bytes = 0
+        if self._connection is not None:
+            self._connection.execute("DELETE FROM results")
+
+    def _remember(self, key: str, value, encoded: str) -> None:
+        if not self.maxsize:
+            return
+        size = len(key) + len(encoded)
+        if key in self._memory:
+            self.memory_bytes -= self._memory.pop(key)[1]
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        self._memory[key] = (value, size)
+        self.memory_bytes += size
+        while len(self._memory) > self.maxsize or (
+            self.max_bytes is not None and self.memory_bytes > self.max_bytes
+        ):
+            self.memory_bytes -= self._memory.popitem(last=False)[1][1]
+
+    def get(self, key: str):
+        """keyの結果を返す。覚えていなければNoneを返す。"""
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.stats.hits += 1
+            return self._memory[key][0]
+        if self._connection is not None:
+            row = self._connection.execute(
+                "SELECT value FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                value = json.loads(row[0])
+                self._remember(key, value, row[0])
+                self.stats.disk_hits += 1
+                return value
+        return None
+
+    def put(self, key: str, value) -> None:
+        """keyの結果としてvalue(JSONにできる値)を覚える。"""
+        encoded = json.dumps(value)
+        self._remember(key, value, encoded)
+        if self._connection is not None:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO results (key, value) VALUES (?, ?)",
+                (key, encoded),
+            )
+
+    def solver(
+        self,
+        multiple_line1: str,
+        multiple_line2: str,
+        intermediate_lines: List[str],
+        product_line: str,
+        options: Optional[SearchOptions] = None,
+    ) -> Tuple[str, str]:
+        """
+        solverの結果を覚えておき、同じ虫食い算には覚えた結果を返す。
+
+        Returns:
+            Tuple[str, str]: 掛けられる数と掛ける数をタプルで返す。
+
+        Raises:
+            ValueError: 入力に誤りがある場合、解が見つからない場合。
+        """
+        lines = normalize_puzzle(multiple_line1, multiple_line2, intermediate_lines, product_line)
+        puzzle = canonical_key(*lines)
+        key = f"solve|{order_key(options)}|{puzzle}"
+        answer = self.get(key)
+        if answer is None and self.get(f"count|{puzzle}") == 0:
+            answer = []
+        if answer is None:
+            self.stats.misses += 1
+            try:
+                answer = list(solver(*lines, options=options))
+            except ValueError as e:
+                if str(e) != "Error: no answer":
+                    raise
+                # 解が無いことは空のリストで覚える
+                answer = []
+                self.put(f"count|{puzzle}", 0)
+            self.put(key, answer)
+        if not answer:
+            raise ValueError("Error: no answer")
+        return tuple(answer)
+
+    def count_solutions(
+        self,
+        multiple_line1: str,
+        multiple_line2: str,
+        intermediate_lines: List[str],
+        product_line: str,
+        limit: Optional[int] = None,
+        options: Optional[SearchOptions] = None,
+    ) -> int:
+        """
+        count_solutionsの結果を覚えておき、同じ虫食い算には覚えた結果を返す。
+
+        limitに達して探索を打ち切った場合は解の数が分からないので覚えない。
+
+        Returns:
+            int: 解の数。limitを与えた場合はlimit以下。
+        """
+        lines = normalize_puzzle(multiple_line1, multiple_line2, intermediate_lines, product_line)
+        puzzle = canonical_key(*lines)
+        key = f"count|{puzzle}"
+        count = self.get(key)
+        if count is None:
+            self.stats.misses += 1
+            count = count_solutions(*lines, limit=limit, options=options)
+            if limit is not None and count >= limit:
+                return count
+            self.put(key, count)
+        return count if limit is None else min(count, limit)
@@ -0,0 +1,203 @@
+# 時間のかかる探索の途中経過をファイルに書き出し、止まった所から再開する
+
+import gzip
+import json
+import os
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional, Tuple
+
+from mushikui_solver import (
+    DepthFirstSearch,
+    SearchInterrupted,
+    SearchNode,
+    SearchOptions,
+    SearchStats,
+)
+
+# (multiple_line1, multiple_line2, intermediate_lines, product_line)
+Puzzle = Tuple[str, str, List[str], str]
+
+CHECKPOINT_VERSION = 1
+
+
+@dataclass
+class Checkpoint:
+    """探索の途中経過。
+
+    Attributes:
+        puzzle (Puzzle): 虫食い算
+        options (SearchOptions): 探索の方法
+        limit (Optional[int]): 探す解の最大数
+        nodes (List[SearchNode]): まだ探索していない部分木の根。深さ優先探索で訪れる順に並んでいる。
+        solutions (List[Tuple[str, str]]): それまでに見つかった解
+        stats (SearchStats): それまでの探索の統計
+        counter (int): それまでにスタックから取り出したノード数
+        complete (bool): 探索し終えたか(limit個の解が見つかった場合を含む)
+    """
+
+    puzzle: Puzzle
+    options: SearchOptions = field(default_factory=SearchOptions)
+    limit: Optional[int] = None
+    nodes: List[SearchNode] = field(default_factory=list)
+    solutions: List[Tuple[str, str]] = field(default_factory=list)
+    stats: SearchStats = field(default_factory=SearchStats)
+    counter: int = 0
+    complete: bool = False
+
+
+def save_checkpoint(path: str, checkpoint: Checkpoint) -> None:
+    """
+    途中経過をgzipで圧縮したJSONで書き出す。
+
+    同じディレクトリの一時ファイルに書いてからos.replaceで置き換えるので、書き出しの途中で
+    プロセスが止まっても、pathには前回の途中経過か今回の途中経過のどちらかが必ず残る。
+    ノードは(value1, mask1, value2, mask2)の4つの整数だけを書く。
+    """
+    data = {
+        "version": CHECKPOINT_VERSION,
+        "puzzle": list(checkpoint.puzzle),
+        "options": asdict(checkpoint.options),
+        "limit": checkpoint.limit,
+        "nodes": [node.key() for node in checkpoint.nodes],
+        "solutions": [list(solution) for solution in checkpoint.solutions],
+        "stats": asdict(checkpoint.stats),
+        "counter": checkpoint.counter,
+        "complete": checkpoint.complete,
+    }
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temporary = tempfile.mkstemp(dir=directory, prefix=".checkpoint-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as f:
+                f.write(json.dumps(data, separators=(",", ":")).encode())
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def load_checkpoint(path: str) -> Checkpoint:
+    """
+    save_checkpointで書き出した途中経過を読む。
+
+    Raises:
+        ValueError: 途中経過の形式が違う場合。
+    """
+    with gzip.open(path, "rb") as f:
+        data = json.loads(f.read())
+    if data.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"Error: unsupported checkpoint version {data.get('version')}")
+    puzzle = tuple(data["puzzle"])
+    length1 = len(puzzle[0])
+    return Checkpoint(
+        puzzle=puzzle,
+        options=SearchOptions(**data["options"]),
+        limit=data["limit"],
+        nodes=[SearchNode.from_values(*key, length1) for key in data["nodes"]],
+        solutions=[tuple(solution) for solution in data["solutions"]],
+        stats=SearchStats(**data["stats"]),
+        counter=data["counter"],
+        complete=data["complete"],
+    )
+
+
+def _run_checkpointed(
+    checkpoint: Checkpoint, path: str, interval: float, max_nodes: Optional[int]
+) -> List[Tuple[str, str]]:
+    if interval <= 0:
+        raise ValueError("Error: interval should be positive")
+    if checkpoint.complete:
+        return list(checkpoint.solutions)
+
+    search = DepthFirstSearch(
+        *checkpoint.puzzle, stats=checkpoint.stats, options=checkpoint.options)
+    if checkpoint.counter or checkpoint.nodes:
+        search.reset(checkpoint.nodes)
+        search.counter = checkpoint.counter
+    solutions = checkpoint.solutions
+    limit = checkpoint.limit
+
+    def save(complete: bool) -> None:
+        checkpoint.nodes = list(reversed(search.stack))
+        checkpoint.counter = search.counter
+        checkpoint.complete = complete
+        save_checkpoint(path, checkpoint)
+
+    while limit is None or len(solutions) < limit:
+        # runが止まった後はスタックの全ての部分木が未探索なので、そのまま書き出せる
+        for node in search.run(max_nodes=max_nodes, deadline=time.monotonic() + interval):
+            solutions.append(search.decode(node))
+            if len(solutions) == limit:
+                break
+        if search.interrupted is None:
+            break
+        save(False)
+        if search.interrupted == "max_nodes":
+            raise SearchInterrupted("max_nodes", search.stats, search.explored_fraction())
+    save(True)
+    return list(solutions)
+
+
+def checkpointed_solve_all(
+    multiple_line1: str,
+    multiple_line2: str,
+    intermediate_lines: List[str],
+    product_line: str,
+    path: str,
+    interval: float = 60.0,
+    limit: Optional[int] = None,
+    options: Optional[SearchOptions] = None,
+    max_nodes: Optional[int] = None,
+) -> List[Tuple[str, str]]:
+    """
+    solve_allと同じ探索を行い、interval秒ごとに途中経過をpathに書き出す。
+
+    プロセスが止まった場合は、resume(path)で最後に書き出した所から探索を続けられる。
+    途中経過を書き出すのはinterval秒ごとなので、探索の速さはほとんど変わらない。
+    探索し終えた場合も、見つかった解を途中経過として書き出す。
+
+    Args:
+        path (str): 途中経過を書き出すファイル
+        interval (float): 途中経過を書き出す間隔(秒)
+        limit (Optional[int]): 返す解の最大数。Noneなら全て返す。
+        options (Optional[SearchOptions]): 探索の方法。Noneなら既定の設定。
+        max_nodes (Optional[int]): スタックから取り出すノード数の上限
+        その他の引数はsolve_allを参照。
+
+    Returns:
+        List[Tuple[str, str]]: 掛けられる数と掛ける数のタプルのリスト。solve_allと同じ順序。
+
+    Raises:
+        ValueError: 入力に誤りがある場合。
+        SearchInterrupted: max_nodesに達した場合。途中経過を書き出してから送出する。
+    """
+    checkpoint = Checkpoint(
+        (multiple_line1, multiple_line2, list(intermediate_lines), product_line),
+        SearchOptions() if options is None else options,
+        limit,
+    )
+    return _run_checkpointed(checkpoint, path, interval, max_nodes)
+
+
+def resume(
+    path: str, interval: float = 60.0, max_nodes: Optional[int] = None
+) -> List[Tuple[str, str]]:
+    """
+    checkpointed_solve_allが書き出した途中経過から探索を続け、それまでに見つかった解を含めて返す。
+
+    Args:
+        path (str): 途中経過のファイル。探索を続ける間も、interval秒ごとに書き出す。
+        interval (float): 途中経過を書き出す間隔(秒)
+        max_nodes (Optional[int]): スタックから取り出すノード数の上限(前回までの分も含む)
+
+    Returns:
+        List[Tuple[str, str]]: 掛けられる数と掛ける数のタプルのリスト。中断しなかった場合と同じ順序。
+
+    Raises:
+        SearchInterrupted: max_nodesに達した場合。途中経過を書き出してから送出する。
+    """
+    return _run_checkpointed(load_checkpoint(path), path, interval, max_nodes)
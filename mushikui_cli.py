@@ -0,0 +1,152 @@
+# JSON Linesで虫食い算を読み、1問解くごとに結果を1行ずつ書き出すコマンド
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+
+from mushikui_batch import BatchResult, Puzzle, solve_many
+
+
+def parse_line(line: str) -> Tuple[object, Puzzle]:
+    """
+    入力の1行を読む。
+
+    行は[被乗数, 乗数, [中間結果, ...], 掛け算の結果]か、{"id": 任意の値, "puzzle": [...]}。
+
+    Returns:
+        Tuple[object, Puzzle]: (id, 虫食い算)。idが無ければNone。
+
+    Raises:
+        ValueError: 行が読めない場合。
+    """
+    try:
+        request = json.loads(line)
+    except ValueError as e:
+        raise ValueError(f"Error: invalid JSON ({e})")
+    request_id = None
+    if isinstance(request, dict):
+        request_id = request.get("id")
+        request = request.get("puzzle")
+    if (
+        not isinstance(request, list)
+        or len(request) != 4
+        or not isinstance(request[2], list)
+        or not all(isinstance(field, str) for field in request[:2] + request[2] + request[3:])
+    ):
+        raise ValueError("Error: puzzle should be [multiple_line1, multiple_line2, [lines], product_line]")
+    return request_id, (request[0], request[1], request[2], request[3])
+
+
+def _read_puzzles(
+    lines: TextIO, pending: Dict[int, Tuple[int, object, Optional[str]]]
+) -> Iterator[Optional[Puzzle]]:
+    """
+    虫食い算を1行ずつ読んで返す。空行は飛ばす。
+
+    結果を書き出すときのために、返した順番ごとに(行番号, id, 読めなかった理由)をpendingに入れる。
+    読めなかった行もNoneとして返し、結果の順番を入力と揃える。
+    """
+    index = 0
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            request_id, puzzle = parse_line(line)
+            pending[index] = (number, request_id, None)
+        except ValueError as e:
+            puzzle = None
+            pending[index] = (number, None, str(e))
+        index += 1
+        yield puzzle
+
+
+def format_result(
+    result: BatchResult, number: int, request_id: object, all_solutions: bool
+) -> dict:
+    """solve_manyの1問分の結果を、書き出す辞書にする。"""
+    stats = result.stats
+    record = {"line": number}
+    if request_id is not None:
+        record["id"] = request_id
+    record["answer"] = None if result.answer is None else list(result.answer)
+    if all_solutions:
+        record["answers"] = [list(answer) for answer in result.answers or []]
+        record["solutions"] = len(result.answers or [])
+    else:
+        record["solutions"] = int(result.answer is not None)
+    # solutionsが全ての解の数か(Falseなら、見つけた数)
+    record["complete"] = all_solutions and result.error in (None, "Error: no answer")
+    record["nodes"] = 0 if stats is None else stats.nodes_expanded
+    record["time"] = 0.0 if stats is None else round(stats.wall_time, 6)
+    record["error"] = result.error
+    return record
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="JSON Linesの虫食い算を解き、1問ごとに結果を1行のJSONで書き出す")
+    parser.add_argument("input", nargs="?", default="-", help="入力ファイル。省略するか-なら標準入力")
+    parser.add_argument("--output", default="-", help="出力ファイル。省略するか-なら標準出力")
+    parser.add_argument("--workers", type=int, help="ワーカープロセス数。省略するとCPU数、1ならこのプロセスで解く")
+    parser.add_argument("--timeout", type=float, help="1問の探索にかける時間の上限(秒)")
+    parser.add_argument("--all-solutions", action="store_true", help="最初の解で止めず、全ての解を探す")
+    parser.add_argument("--ordered", action="store_true", help="解き終わった順ではなく入力の順に書き出す")
+    parser.add_argument("--chunksize", type=int, default=16, help="1回にワーカーへ渡す問題数")
+    parser.add_argument("--quiet", action="store_true", help="最後に標準エラーへ集計を書き出さない")
+    args = parser.parse_args(argv)
+    if args.timeout is not None and args.timeout < 0:
+        parser.error("--timeout should be 0 or more")
+    if args.chunksize < 1:
+        parser.error("--chunksize should be 1 or more")
+
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    sink = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    pending: Dict[int, Tuple[int, object, Optional[str]]] = {}
+    counts = {"solved": 0, "no_answer": 0, "error": 0}
+    started = time.perf_counter()
+    try:
+        results = solve_many(
+            _read_puzzles(source, pending),
+            workers=args.workers,
+            ordered=args.ordered,
+            chunksize=args.chunksize,
+            timeout=args.timeout,
+            all_solutions=args.all_solutions,
+        )
+        for result in results:
+            number, request_id, error = pending.pop(result.index)
+            if error is not None:
+                result = BatchResult(result.index, result.puzzle, error=error)
+            record = format_result(result, number, request_id, args.all_solutions)
+            sink.write(json.dumps(record, ensure_ascii=False) + "\n")
+            sink.flush()
+            if result.answer is not None:
+                counts["solved"] += 1
+            elif result.error == "Error: no answer":
+                counts["no_answer"] += 1
+            else:
+                counts["error"] += 1
+    except BrokenPipeError:
+        # headなどに渡して先に閉じられた場合。終了時に標準出力を閉じるときの例外も抑える。
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+
+    if not args.quiet:
+        print(
+            "solved: {solved}, no answer: {no_answer}, error: {error}, ".format(**counts)
+            + f"time: {time.perf_counter() - started:.2f}s",
+            file=sys.stderr,
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,392 @@
+# 虫食い算の探索木を部分木に分けて、TCPでつないだ複数のワーカーに貸し出して探索する
+
+import argparse
+import asyncio
+import heapq
+import json
+import multiprocessing
+import socket
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+from mushikui_parallel import Key, split_search
+from mushikui_solver import DepthFirstSearch, SearchNode, SearchOptions
+
+
+@dataclass
+class DistributedStats:
+    """Coordinatorの統計。
+
+    Attributes:
+        workers (int): 接続したワーカーの数
+        leases (int): 部分木を貸し出した回数
+        expired (int): lease_timeout以内に結果が返らず、貸し出し直した部分木の数
+        requeued (int): ワーカーの接続が切れたため、貸し出し直した部分木の数
+        nodes_expanded (int): ワーカーがスタックから取り出したノード数の合計
+    """
+
+    workers: int = 0
+    leases: int = 0
+    expired: int = 0
+    requeued: int = 0
+    nodes_expanded: int = 0
+
+
+class Coordinator:
+    """
+    探索木を部分木に分け、接続してきたワーカー(run_worker)に貸し出す。
+
+    部分木は(被乗数, 乗数)の一部を埋めた文字列で表す。ワーカーは借りた部分木を最大chunk_nodesノードだけ探索し、
+    見つけた解と、探索しきれなかった残りの部分木を返す。残りは新しい部分木として貸し出すので、
+    大きな部分木は空いているワーカーに分け直される。lease_timeout秒以内に結果が返らない部分木と、
+    接続が切れたワーカーに貸していた部分木は、別のワーカーに貸し出し直す。
+
+    部分木には逐次の深さ優先探索で訪れる順の位置を付け(mushikui_parallel.split_search)、
+    解は逐次の探索と同じ順に返す。limit個の解が見つかった後は、それより後ろの部分木は貸し出さない。
+
+    Args:
+        multiple_line1, multiple_line2, intermediate_lines, product_line: 虫食い算
+        limit (Optional[int]): 返す解の最大数。Noneなら全て返す。2なら解が一つだけかを調べられる。
+        split_depth (int): 最初に探索木を部分木に分ける深さ
+        chunk_nodes (int): 1回の貸し出しで探索するノード数の上限。超えた分は部分木に分け直す。
+        lease_timeout (float): 貸し出した部分木の結果を待つ時間(秒)
+        options (Optional[SearchOptions]): 探索の方法。Noneなら既定の設定。
+
+    Raises:
+        ValueError: 入力に誤りがある場合。
+    """
+
+    def __init__(
+        self,
+        multiple_line1: str,
+        multiple_line2: str,
+        intermediate_lines: List[str],
+        product_line: str,
+        limit: Optional[int] = None,
+        split_depth: int = 2,
+        chunk_nodes: int = 10000,
+        lease_timeout: float = 60.0,
+        options: Optional[SearchOptions] = None,
+    ):
+        if chunk_nodes < 1:
+            raise ValueError("Error: chunk_nodes should be 1 or more")
+        if lease_timeout <= 0:
+            raise ValueError("Error: lease_timeout should be positive")
+        self.puzzle = [multiple_line1, multiple_line2, list(intermediate_lines), product_line]
+        self.options = SearchOptions() if options is None else options
+        self.limit = limit
+        self.chunk_nodes = chunk_nodes
+        self.lease_timeout = lease_timeout
+        self.stats = DistributedStats()
+
+        self._search = DepthFirstSearch(*self.puzzle, options=self.options)
+        found, subtrees = split_search(self._search, split_depth) if self._search.stack else ([], [])
+        self._found: List[Tuple[Key, SearchNode]] = sorted(found)
+        # 位置の小さい部分木から順に貸し出す
+        self._pending: List[Tuple[Key, SearchNode]] = list(subtrees)
+        heapq.heapify(self._pending)
+        # 貸し出し番号 -> (位置, 部分木の根, 期限)
+        self._leases: Dict[int, Tuple[Key, SearchNode, float]] = {}
+        self._next_lease = 0
+        self._done: Optional[asyncio.Event] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._reaper: Optional[asyncio.Task] = None
+
+    def _cutoff(self) -> Optional[Key]:
+        """これより後ろの部分木は探索しなくてよい、という位置。"""
+        if self.limit is None or len(self._found) < self.limit:
+            return None
+        return self._found[self.limit - 1][0]
+
+    def _check_done(self) -> None:
+        limit_key = self._cutoff()
+        leases = [key for key, _, _ in self._leases.values()]
+        if limit_key is not None:
+            self._pending = [item for item in self._pending if item[0] <= limit_key]
+            heapq.heapify(self._pending)
+            leases = [key for key in leases if key <= limit_key]
+        if not self._pending and not leases:
+            self._done.set()
+
+    def _requeue(self, lease: int) -> None:
+        key, node, _ = self._leases.pop(lease)
+        heapq.heappush(self._pending, (key, node))
+
+    async def _reap(self) -> None:
+        """期限を過ぎた貸し出しを取り消し、部分木を貸し出し直す。"""
+        while True:
+            await asyncio.sleep(min(self.lease_timeout / 4, 1.0))
+            now = time.monotonic()
+            for lease, (_, _, deadline) in list(self._leases.items()):
+                if deadline <= now:
+                    self._requeue(lease)
+                    self.stats.expired += 1
+
+    def _lease(self, owned: Set[int]) -> dict:
+        """ワーカーに次に貸し出す部分木を選ぶ。"""
+        if self._done.is_set():
+            return {"type": "done"}
+        if not self._pending:
+            # 貸し出し中の部分木が返るか、期限を過ぎるのを待つ
+            return {"type": "wait", "seconds": 0.05}
+        key, node = heapq.heappop(self._pending)
+        lease = self._next_lease
+        self._next_lease += 1
+        self._leases[lease] = (key, node, time.monotonic() + self.lease_timeout)
+        owned.add(lease)
+        self.stats.leases += 1
+        return {
+            "type": "subtree",
+            "lease": lease,
+            "node": list(self._search.decode(node)),
+            "max_nodes": self.chunk_nodes,
+        }
+
+    def _decode_nodes(self, items: object) -> List[SearchNode]:
+        """ワーカーが返した[被乗数, 乗数]のリストをノードにする。形式が違う場合はValueError。"""
+        if not isinstance(items, list):
+            raise ValueError("Error: malformed result")
+        length1, length2 = len(self.puzzle[0]), len(self.puzzle[1])
+        nodes = []
+        for lines in items:
+            if (
+                not isinstance(lines, list)
+                or len(lines) != 2
+                or not all(isinstance(line, str) for line in lines)
+                or (len(lines[0]), len(lines[1])) != (length1, length2)
+                or not all(char == "*" or char.isdigit() for char in "".join(lines))
+            ):
+                raise ValueError("Error: malformed result")
+            nodes.append(SearchNode.from_strings(*lines))
+        return nodes
+
+    def _receive_result(self, message: dict) -> None:
+        """
+        ワーカーが返した部分木の探索結果を受け取る。期限を過ぎた貸し出しの結果は捨てる。
+
+        結果を全て読んでから貸し出しを消すので、形式が違う結果でValueErrorになった場合も、
+        部分木は貸し出し中のまま残り、接続を閉じたときか期限を過ぎたときに貸し出し直される。
+        """
+        lease = message["lease"]
+        nodes = message["nodes"]
+        if not isinstance(nodes, int) or isinstance(nodes, bool):
+            raise ValueError("Error: malformed result")
+        solutions = self._decode_nodes(message["solutions"])
+        remaining = self._decode_nodes(message["remaining"])
+        entry = self._leases.pop(lease, None)
+        if entry is None:
+            return
+        key = entry[0]
+        self.stats.nodes_expanded += nodes
+        for i, node in enumerate(solutions):
+            self._found.append((key + (0, i), node))
+        self._found.sort(key=lambda item: item[0])
+        for i, node in enumerate(remaining):
+            heapq.heappush(self._pending, (key + (1, i), node))
+        self._check_done()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.stats.workers += 1
+        owned: Set[int] = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                if message["type"] == "result":
+                    self._receive_result(message)
+                    owned.discard(message["lease"])
+                    continue
+                if message["type"] == "hello":
+                    reply = {"type": "puzzle", "puzzle": self.puzzle, "options": asdict(self.options)}
+                elif message["type"] == "lease":
+                    reply = self._lease(owned)
+                else:
+                    reply = {"type": "error", "error": f"Error: unknown message {message['type']}"}
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, ValueError, KeyError, TypeError):
+            pass
+        finally:
+            # 接続が切れたワーカーに貸していた部分木は、すぐに貸し出し直す
+            for lease in owned:
+                if lease in self._leases:
+                    self._requeue(lease)
+                    self.stats.requeued += 1
+            writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> Tuple[str, int]:
+        """
+        ワーカーの接続を待ち受けるサーバーを始める。
+
+        Returns:
+            Tuple[str, int]: 待ち受けるアドレスとポート。port=0なら空いているポートを使う。
+        """
+        self._done = asyncio.Event()
+        self._server = await asyncio.start_server(self._handle, host, port)
+        self._reaper = asyncio.ensure_future(self._reap())
+        self._check_done()
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def wait(self) -> List[Tuple[str, str]]:
+        """
+        探索が終わるのを待ち、サーバーを止める。
+
+        Returns:
+            List[Tuple[str, str]]: 掛けられる数と掛ける数のタプルのリスト。逐次の探索と同じ順に最大limit個。
+        """
+        await self._done.wait()
+        self._reaper.cancel()
+        self._server.close()
+        await self._server.wait_closed()
+        found = self._found if self.limit is None else self._found[:self.limit]
+        return [self._search.decode(node) for _, node in found]
+
+
+def run_worker(host: str, port: int) -> int:
+    """
+    Coordinatorに接続し、部分木を借りて探索することを、探索が終わるまで繰り返す。
+
+    Returns:
+        int: 探索した部分木の数
+    """
+    leases = 0
+    with socket.create_connection((host, port)) as connection:
+        # 結果と次の貸し出しの依頼を続けて送るので、Nagleのアルゴリズムで待たされないようにする
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        stream = connection.makefile("rw", encoding="utf-8")
+
+        def request(message: dict) -> Optional[dict]:
+            stream.write(json.dumps(message) + "\n")
+            stream.flush()
+            if message["type"] == "result":
+                return None
+            line = stream.readline()
+            return json.loads(line) if line else {"type": "done"}
+
+        try:
+            setup = request({"type": "hello"})
+            search = DepthFirstSearch(*setup["puzzle"], options=SearchOptions(**setup["options"]))
+            while True:
+                message = request({"type": "lease"})
+                if message["type"] == "wait":
+                    time.sleep(message["seconds"])
+                    continue
+                if message["type"] != "subtree":
+                    return leases
+                search.reset([SearchNode.from_strings(*message["node"])])
+                solutions = [search.decode(node) for node in search.run(max_nodes=message["max_nodes"])]
+                request({
+                    "type": "result",
+                    "lease": message["lease"],
+                    "solutions": solutions,
+                    "remaining": [search.decode(node) for node in reversed(search.stack)],
+                    "nodes": search.counter,
+                })
+                leases += 1
+        except ConnectionError:
+            # 探索が終わってCoordinatorが先に接続を閉じた
+            return leases
+
+
+async def _solve_locally(coordinator: Coordinator, workers: int) -> List[Tuple[str, str]]:
+    host, port = await coordinator.start("127.0.0.1", 0)
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=run_worker, args=(host, port)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    loop = asyncio.get_running_loop()
+    waiting = asyncio.ensure_future(coordinator.wait())
+    try:
+        while not waiting.done():
+            await asyncio.wait([waiting], timeout=0.5)
+            if not waiting.done() and not any(process.is_alive() for process in processes):
+                waiting.cancel()
+                raise RuntimeError("Error: all workers exited before the search finished")
+        return waiting.result()
+    finally:
+        # ワーカーが探索の終わりを受け取れるよう、イベントループを止めずに待つ
+        for process in processes:
+            await loop.run_in_executor(None, process.join, 5)
+            if process.is_alive():
+                process.terminate()
+
+
+def distributed_solve_all(
+    multiple_line1: str,
+    multiple_line2: str,
+    intermediate_lines: List[str],
+    product_line: str,
+    limit: Optional[int] = None,
+    workers: int = 2,
+    split_depth: int = 2,
+    chunk_nodes: int = 10000,
+    lease_timeout: float = 60.0,
+    options: Optional[SearchOptions] = None,
+) -> List[Tuple[str, str]]:
+    """
+    Coordinatorをlocalhostで始め、workers個のワーカープロセスで探索する。
+
+    複数のマシンで探索する場合は、Coordinatorを始めたマシンのアドレスとポートに、
+    各マシンからrun_worker(python mushikui_distributed.py worker)で接続する。
+    引数はCoordinatorを参照。
+
+    Returns:
+        List[Tuple[str, str]]: 掛けられる数と掛ける数のタプルのリスト。solve_allと同じ順序。
+
+    Raises:
+        ValueError: 入力に誤りがある場合。
+    """
+    if workers < 1:
+        raise ValueError("Error: workers should be 1 or more")
+    coordinator = Coordinator(
+        multiple_line1, multiple_line2, intermediate_lines, product_line,
+        limit, split_depth, chunk_nodes, lease_timeout, options,
+    )
+    return asyncio.run(_solve_locally(coordinator, workers))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="虫食い算の探索を複数のマシンで行う")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    coordinator_parser = subparsers.add_parser("coordinator", help="部分木を貸し出す")
+    coordinator_parser.add_argument(
+        "puzzle", help='虫食い算のJSON。例: \'["5**", "*4", ["20*8", "3**2"], "3308*"]\'')
+    # 認証の無いプロトコルなので、既定では同じマシンのワーカーだけを受け付ける
+    coordinator_parser.add_argument(
+        "--host", default="127.0.0.1", help="待ち受けるアドレス。他のマシンのワーカーを受け付けるなら0.0.0.0など")
+    coordinator_parser.add_argument("--port", type=int, default=5712)
+    coordinator_parser.add_argument("--limit", type=int, help="見つける解の最大数。2なら解が一つだけかを調べる")
+    coordinator_parser.add_argument("--split-depth", type=int, default=2, help="最初に探索木を部分木に分ける深さ")
+    coordinator_parser.add_argument("--chunk-nodes", type=int, default=10000)
+    coordinator_parser.add_argument("--lease-timeout", type=float, default=60.0)
+    coordinator_parser.add_argument(
+        "--options", default="{}", help='SearchOptionsの引数のJSON。例: \'{"ordering": "mrv"}\'')
+    worker_parser = subparsers.add_parser("worker", help="部分木を借りて探索する")
+    worker_parser.add_argument("--host", default="127.0.0.1")
+    worker_parser.add_argument("--port", type=int, default=5712)
+    args = parser.parse_args(argv)
+
+    if args.command == "worker":
+        run_worker(args.host, args.port)
+        return 0
+
+    coordinator = Coordinator(
+        *json.loads(args.puzzle), limit=args.limit, split_depth=args.split_depth,
+        chunk_nodes=args.chunk_nodes, lease_timeout=args.lease_timeout,
+        options=SearchOptions(**json.loads(args.options)),
+    )
+
+    async def serve() -> List[Tuple[str, str]]:
+        await coordinator.start(args.host, args.port)
+        return await coordinator.wait()
+
+    for answer in asyncio.run(serve()):
+        print(json.dumps(list(answer)))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,214 @@
+# 解が一つだけの虫食い算を作る
+
+import random
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Tuple, Union
+
+from mushikui_solver import DepthFirstSearch, SearchOptions
+
+# (multiple_line1, multiple_line2, intermediate_lines, product_line)
+Puzzle = Tuple[str, str, List[str], str]
+
+# 名前で指定する難しさと、*にする桁の割合
+DIFFICULTIES = {"easy": 0.5, "normal": 0.7, "hard": 0.85, "max": 1.0}
+
+# 解が一つだけかを調べる探索の設定。解の順序は問わないので、速い設定を使う。
+GENERATOR_OPTIONS = SearchOptions(prefix_bounds=True, suffix_tables=True, visited="none")
+
+
+@dataclass
+class GeneratedPuzzle:
+    """generate_puzzleの結果。
+
+    Attributes:
+        seed (int): 乱数の種
+        puzzle (Puzzle): 解が一つだけの虫食い算
+        answer (Tuple[str, str]): 唯一の解(掛けられる数と掛ける数)
+        stars (int): *にした桁の数
+        cells (int): *にできる桁の数(中間結果の0を除く全ての桁)
+    """
+
+    seed: int
+    puzzle: Puzzle
+    answer: Tuple[str, str]
+    stars: int
+    cells: int
+
+
+def _to_puzzle(lines: List[str]) -> Puzzle:
+    return lines[0], lines[1], lines[2:-1], lines[-1]
+
+
+def _star_ratio(shape: Tuple[int, int], difficulty: Union[float, str]) -> float:
+    """引数を検査し、*にする桁の割合を返す。"""
+    if min(shape) < 1:
+        raise ValueError("Error: shape should be positive")
+    ratio = DIFFICULTIES.get(difficulty) if isinstance(difficulty, str) else difficulty
+    if ratio is None or not 0 <= ratio <= 1:
+        raise ValueError(
+            f"Error: difficulty should be between 0 and 1 or one of {tuple(DIFFICULTIES)}")
+    return ratio
+
+
+def has_other_solution(
+    lines: List[str],
+    index: int,
+    position: int,
+    digit: str,
+    options: SearchOptions = GENERATOR_OPTIONS,
+    max_nodes: Optional[int] = None,
+) -> Optional[bool]:
+    """
+    解が一つだけの虫食い算の1桁を*にしたとき、元の解以外の解ができるかを調べる。
+
+    *を増やすと解の集合は広がるだけなので、新しくできる解は*にした桁が元の数字と違うものに限られる。
+    被乗数か乗数の桁なら、その*に元の数字以外を入れたノードだけを根として探索する。
+    それ以外の行の桁と、optionsの前処理でその*が埋まった場合は、解を2つ見つけるまで探索する。
+    ただしpreprocessで埋まった*は数字が一つに決まるので、探索せずにFalseを返す。
+
+    Args:
+        lines (List[str]): [被乗数, 乗数, 中間結果..., 掛け算の結果]。index行目のposition文字目が*になっている。
+        index (int): *にした行
+        position (int): *にした文字の位置(左から数える)
+        digit (str): *にする前の数字
+        options (SearchOptions): 探索の方法
+        max_nodes (Optional[int]): 探索するノード数の上限
+
+    Returns:
+        Optional[bool]: 元の解以外の解があればTrue、無ければFalse。max_nodesまでに分からなければNone。
+    """
+    search = DepthFirstSearch(*_to_puzzle(lines), options=options)
+    needed = 2
+    place = len(lines[index]) - 1 - position
+    # preprocessやcolumn_propagationで、探索を作るときに*が数字で埋まっていることがある
+    is_star = index < 2 and (search.root.mask1 if index == 0 else search.root.mask2) >> place & 1
+    if index < 2 and not is_star and options.preprocess:
+        # 数字が一つに決まる*だけを埋めるので、元の解と同じ数字に決まっている
+        return False
+    if is_star:
+        children = [
+            child
+            for child in search.next_node_candidates(search.root, (index + 1, place))
+            if (child.value1 if index == 0 else child.value2) // 10**place % 10 != int(digit)
+        ]
+        search.reset(children)
+        needed = 1
+
+    found = 0
+    for _ in search.run(max_nodes=max_nodes):
+        found += 1
+        if found == needed:
+            return True
+    if search.stack:
+        return None
+    return False
+
+
+def generate_puzzle(
+    shape: Tuple[int, int] = (6, 4),
+    difficulty: Union[float, str] = "normal",
+    seed: Optional[int] = None,
+    max_nodes: Optional[int] = 2000,
+    options: SearchOptions = GENERATOR_OPTIONS,
+) -> GeneratedPuzzle:
+    """
+    解が一つだけの虫食い算を作る。
+
+    無作為に選んだ掛け算から始め、無作為な順に1桁ずつ*にしていく。*にすると解が一つでなくなる桁は
+    元の数字に戻す。*を増やすと解の集合は広がるだけなので、一度戻した桁は後で*にできるようになることは無く、
+    各桁を一度ずつ調べれば済む。調べる探索は、*にした桁が元の数字と違う解だけを探す(has_other_solution)。
+
+    Args:
+        shape (Tuple[int, int]): (被乗数の桁数, 乗数の桁数)
+        difficulty (Union[float, str]): *にする桁の割合の目標(0-1)、またはDIFFICULTIESの名前。
+            それ以上*にすると解が一つでなくなる場合は、目標より少なくなる。
+        seed (Optional[int]): 乱数の種。同じ引数からは同じ虫食い算を作る。
+        max_nodes (Optional[int]): 1桁を調べる探索のノード数の上限。超えた桁は*にしない。
+            Noneなら上限なし(遅くなるが、*にできる桁は全て*にする)。
+        options (SearchOptions): 解が一つだけかを調べる探索の方法
+
+    Returns:
+        GeneratedPuzzle: 作った虫食い算
+
+    Raises:
+        ValueError: 桁数や難しさに誤りがある場合。
+    """
+    length1, length2 = shape
+    ratio = _star_ratio(shape, difficulty)
+    rng = random.Random(seed)
+    value1 = rng.randrange(10 ** (length1 - 1), 10**length1)
+    value2 = rng.randrange(10 ** (length2 - 1), 10**length2)
+    lines = [str(value1), str(value2)]
+    lines += [str(value1 * int(digit)) for digit in reversed(str(value2))]
+    lines.append(str(value1 * value2))
+
+    # 中間結果の0は*にできない(先頭の*は1-9)
+    cells = [
+        (index, position)
+        for index, line in enumerate(lines)
+        if line != "0"
+        for position in range(len(line))
+    ]
+    rng.shuffle(cells)
+    target = round(ratio * len(cells))
+    stars = 0
+    for index, position in cells:
+        if stars >= target:
+            break
+        line = lines[index]
+        lines[index] = line[:position] + "*" + line[position + 1:]
+        if has_other_solution(lines, index, position, line[position], options, max_nodes) is False:
+            stars += 1
+        else:
+            lines[index] = line
+
+    return GeneratedPuzzle(
+        seed, _to_puzzle(lines), (str(value1), str(value2)), stars, len(cells))
+
+
+def _generate_seed(
+    seed: int, shape: Tuple[int, int], difficulty: Union[float, str], max_nodes: Optional[int]
+) -> GeneratedPuzzle:
+    return generate_puzzle(shape, difficulty, seed, max_nodes)
+
+
+def generate_many(
+    count: int,
+    shape: Tuple[int, int] = (6, 4),
+    difficulty: Union[float, str] = "normal",
+    seed: int = 0,
+    workers: Optional[int] = None,
+    chunksize: int = 16,
+    max_nodes: Optional[int] = 2000,
+) -> Iterator[GeneratedPuzzle]:
+    """
+    generate_puzzleを乱数の種seed, seed+1, ..., seed+count-1で呼び、複数のプロセスで並列に作る。
+
+    結果は種の順に返し、workersによらず同じになる。
+
+    Args:
+        count (int): 作る数
+        workers (Optional[int]): ワーカープロセス数。NoneならCPU数。1以下ならこのプロセスで作る。
+        chunksize (int): 1回にワーカーへ渡す数
+        その他の引数はgenerate_puzzleを参照。
+
+    Yields:
+        GeneratedPuzzle: 作った虫食い算
+    """
+    if chunksize < 1:
+        raise ValueError("Error: chunksize should be 1 or more")
+    # 引数の誤りは、ワーカーに渡す前に送出する
+    _star_ratio(shape, difficulty)
+    seeds = range(seed, seed + count)
+    if workers is not None and workers <= 1:
+        for puzzle_seed in seeds:
+            yield _generate_seed(puzzle_seed, shape, difficulty, max_nodes)
+        return
+
+    n = len(seeds)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(
+            _generate_seed, seeds, [shape] * n, [difficulty] * n, [max_nodes] * n,
+            chunksize=chunksize,
+        )
@@ -0,0 +1,215 @@
+# 虫食い算の探索木を部分木に分けて、複数のプロセスで並列に探索する
+
+import heapq
+import os
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
+
+from mushikui_solver import DepthFirstSearch, SearchNode, SearchOptions
+
+# 探索木の中での位置。タプルの辞書式順序が、逐次の深さ優先探索で訪れる順序と一致する。
+Key = Tuple[int, ...]
+
+_worker_search: Optional[DepthFirstSearch] = None
+
+
+def split_search(
+    search: DepthFirstSearch, split_depth: int
+) -> Tuple[List[Tuple[Key, SearchNode]], List[Tuple[Key, SearchNode]]]:
+    """
+    探索木を根からsplit_depth段だけ展開し、部分木に分ける。
+
+    Args:
+        search (DepthFirstSearch): 分割する探索
+        split_depth (int): 展開する段数。0なら根をそのまま返す。
+
+    Returns:
+        Tuple[List[Tuple[Key, SearchNode]], List[Tuple[Key, SearchNode]]]:
+            (展開中に見つかった解, 部分木の根) のタプル。どちらも(位置, ノード)のリストで、
+            逐次の深さ優先探索で訪れる順に並んでいる。
+    """
+    solutions = []
+    subtrees = []
+
+    def visit(node: SearchNode, depth: int, key: Key):
+        if depth == 0:
+            subtrees.append((key, node))
+            return
+        found, children = search.expand(node)
+        for i, solution in enumerate(found):
+            solutions.append((key + (i,), solution))
+        # スタックに積んだ子は最後のものから取り出される
+        for i, child in enumerate(reversed(children)):
+            visit(child, depth - 1, key + (i,))
+
+    visit(search.root, split_depth, ())
+    return solutions, subtrees
+
+
+def _init_worker(
+    puzzle: Tuple[str, str, List[str], str], options: Optional[SearchOptions]
+) -> None:
+    global _worker_search
+    _worker_search = DepthFirstSearch(*puzzle, options=options)
+
+
+def _search_subtree(
+    node: SearchNode, chunk_nodes: int
+) -> Tuple[List[SearchNode], List[SearchNode]]:
+    """
+    ワーカープロセスで部分木を探索する。
+
+    Returns:
+        Tuple[List[SearchNode], List[SearchNode]]: (見つかった解, 探索しきれなかった部分木の根)。
+            どちらも深さ優先探索で訪れる順に並んでいる。
+    """
+    search = _worker_search
+    search.reset([node])
+    solutions = list(search.run(max_nodes=chunk_nodes))
+    return solutions, list(reversed(search.stack))
+
+
+def _parallel_search(
+    puzzle: Tuple[str, str, List[str], str],
+    limit: Optional[int],
+    workers: Optional[int],
+    split_depth: int,
+    chunk_nodes: int,
+    options: Optional[SearchOptions],
+) -> List[Tuple[str, str]]:
+    """
+    部分木をプロセスプールで探索し、逐次の探索で最初に見つかるlimit個の解を返す。
+
+    各タスクは最大chunk_nodesノードだけ探索し、残りの部分木を返す。残りは新しいタスクとして
+    キューに戻すので、大きな部分木は空いているワーカーに分け直される(ワークスティーリング)。
+    必要な数の解が見つかった後は、それより後ろの部分木のタスクを取り消す。
+    """
+    search = DepthFirstSearch(*puzzle, options=options)
+    found, subtrees = split_search(search, split_depth)
+    found = sorted(found)
+
+    def cutoff() -> Optional[Key]:
+        """これより後ろの部分木は探索しなくてよい、という位置。"""
+        if limit is None or len(found) < limit:
+            return None
+        return found[limit - 1][0]
+
+    # 位置の小さい部分木から順にワーカーへ渡す
+    pending: List[Tuple[Key, SearchNode]] = list(subtrees)
+    heapq.heapify(pending)
+    running: Dict[Future, Key] = {}
+    # 取り消しが効くよう、ワーカーに渡すタスクはワーカー数の数倍までにする
+    max_running = 4 * (workers or os.cpu_count() or 1)
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(puzzle, options)
+    ) as executor:
+        while pending or running:
+            limit_key = cutoff()
+            while pending and len(running) < max_running:
+                key, node = heapq.heappop(pending)
+                if limit_key is not None and key > limit_key:
+                    pending.clear()
+                    break
+                running[executor.submit(_search_subtree, node, chunk_nodes)] = key
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = running.pop(future)
+                solutions, remaining = future.result()
+                for i, solution in enumerate(solutions):
+                    found.append((key + (0, i), solution))
+                for i, node in enumerate(remaining):
+                    heapq.heappush(pending, (key + (1, i), node))
+            found.sort()
+
+            limit_key = cutoff()
+            if limit_key is not None:
+                for future, key in list(running.items()):
+                    if key > limit_key and future.cancel():
+                        del running[future]
+
+    if limit is not None:
+        found = found[:limit]
+    return [search.decode(node) for _, node in found]
+
+
+def parallel_solve_all(
+    multiple_line1: str,
+    multiple_line2: str,
+    intermediate_lines: List[str],
+    product_line: str,
+    limit: Optional[int] = None,
+    workers: Optional[int] = None,
+    split_depth: int = 2,
+    chunk_nodes: int = 10000,
+    options: Optional[SearchOptions] = None,
+) -> List[Tuple[str, str]]:
+    """solve_allを複数のプロセスで並列に行う。
+
+    解はsolve_allと同じ順序で返す。
+
+    Args:
+        multiple_line1 (str): 掛けられる数を表す文字列。数字と*のみからなる。
+        multiple_line2 (str): 掛ける数を表す文字列。数字と*のみからなる。
+        intermediate_lines (List[str]): 掛け算の中間結果を表す文字列のリスト。
+        product_line (str): 掛け算の結果を表す文字列。数字と*のみからなる。
+        limit (Optional[int]): 返す解の最大数。Noneなら全て返す。
+        workers (Optional[int]): ワーカープロセス数。NoneならCPU数。
+        split_depth (int): 探索木を部分木に分ける深さ。
+        chunk_nodes (int): 1タスクで探索するノード数の上限。超えた分は部分木に分け直す。
+        options (Optional[SearchOptions]): 探索の方法。Noneなら既定の設定。
+
+    Returns:
+        List[Tuple[str, str]]: 掛けられる数と掛ける数のタプルのリスト。
+
+    Raises:
+        ValueError: 入力に誤りがある場合。
+    """
+    return _parallel_search(
+        (multiple_line1, multiple_line2, intermediate_lines, product_line),
+        limit,
+        workers,
+        split_depth,
+        chunk_nodes,
+        options,
+    )
+
+
+def parallel_solver(
+    multiple_line1: str,
+    multiple_line2: str,
+    intermediate_lines: List[str],
+    product_line: str,
+    workers: Optional[int] = None,
+    split_depth: int = 2,
+    chunk_nodes: int = 10000,
+    options: Optional[SearchOptions] = None,
+) -> Tuple[str, str]:
+    """solverを複数のプロセスで並列に行う。
+
+    どのワーカーが先に解を見つけても、同じoptionsを与えたsolverと同じ解を返す。
+    引数はparallel_solve_allを参照。
+
+    Returns:
+        Tuple[str, str]: 掛けられる数と掛ける数をタプルで返す。
+
+    Raises:
+        ValueError: 入力に誤りがある場合、解が見つからない場合。
+    """
+    solutions = parallel_solve_all(
+        multiple_line1,
+        multiple_line2,
+        intermediate_lines,
+        product_line,
+        limit=1,
+        workers=workers,
+        split_depth=split_depth,
+        chunk_nodes=chunk_nodes,
+        options=options,
+    )
+    if not solutions:
+        raise ValueError("Error: no answer")
+    return solutions[0]
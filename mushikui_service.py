@@ -0,0 +1,379 @@
+# asyncioのイベントループから、虫食い算をプロセスプールで解くサービス
+
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from mushikui_cache import canonical_key, normalize_puzzle
+from mushikui_solver import (
+    DepthFirstSearch,
+    SearchInterrupted,
+    SearchNode,
+    SearchOptions,
+    SearchStats,
+)
+
+# (multiple_line1, multiple_line2, intermediate_lines, product_line)
+Puzzle = Tuple[str, str, List[str], str]
+
+# ワーカープロセスごとに覚えておく探索の数
+_WORKER_SEARCHES = 16
+_worker_searches: "OrderedDict[tuple, Tuple[DepthFirstSearch, List[SearchNode]]]" = OrderedDict()
+
+
+class ServiceBusy(RuntimeError):
+    """処理待ちの探索がmax_pendingに達しているため、新しい虫食い算を受け付けられないことを表す例外。"""
+
+
+def _run_slice(
+    key: str, puzzle: Puzzle, options: Optional[SearchOptions],
+    nodes: Optional[List[SearchNode]], slice_nodes: int,
+) -> Tuple[Optional[Tuple[str, str]], List[SearchNode], SearchStats, float]:
+    """
+    ワーカープロセスで、nodesを根とする部分木を最大slice_nodesノードだけ探索する。
+    nodesがNoneなら最初から探索する。同じ虫食い算の探索は作り直さずに使い回す。
+
+    Returns:
+        Tuple[Optional[Tuple[str, str]], List[SearchNode], SearchStats, float]:
+            (最初に見つかった解, 探索しきれなかった部分木の根, この探索の統計, 探索し終えた割合)
+    """
+    cache_key = (key, options)
+    entry = _worker_searches.get(cache_key)
+    if entry is None:
+        search = DepthFirstSearch(*puzzle, options=options)
+        entry = _worker_searches[cache_key] = (search, list(reversed(search.stack)))
+        if len(_worker_searches) > _WORKER_SEARCHES:
+            _worker_searches.popitem(last=False)
+    _worker_searches.move_to_end(cache_key)
+    search, initial = entry
+
+    search.reset(initial if nodes is None else nodes)
+    search.stats = SearchStats()
+    answer = None
+    for node in search.run(max_nodes=slice_nodes):
+        answer = search.decode(node)
+        break
+    return answer, list(reversed(search.stack)), search.stats, search.explored_fraction()
+
+
+def _add_stats(total: SearchStats, stats: SearchStats) -> None:
+    for name, value in asdict(stats).items():
+        if name in ("max_stack_depth", "peak_memory"):
+            setattr(total, name, max(getattr(total, name), value))
+        else:
+            setattr(total, name, getattr(total, name) + value)
+
+
+def _error(kind: str, message: str) -> dict:
+    return {"event": "error", "type": kind, "error": message}
+
+
+def _options_key(options: Optional[SearchOptions]) -> str:
+    """設定の全ての値を並べた文字列。同じ虫食い算でも、設定が一つでも違えば別に探索する。"""
+    options = SearchOptions() if options is None else options
+    return json.dumps(asdict(options), sort_keys=True)
+
+
+class _Job:
+    """一つの虫食い算の探索。同じ虫食い算を待っている全ての要求に、進み具合と結果を送る。"""
+
+    def __init__(
+        self, key: str, puzzle: Puzzle, options: Optional[SearchOptions],
+        deadline: Optional[float],
+    ):
+        self.key = key
+        self.puzzle = puzzle
+        self.options = options
+        self.deadline = deadline
+        self.nodes: Optional[List[SearchNode]] = None  # 次に探索する部分木の根
+        self.stats = SearchStats()
+        self.explored = 0.0  # 探索し終えた割合
+        self.subscribers: List[asyncio.Queue] = []
+        self.finished = False
+
+    def publish(self, event: dict) -> None:
+        for queue in self.subscribers:
+            queue.put_nowait(event)
+
+
+@dataclass
+class ServiceStats:
+    """SolverServiceの統計。
+
+    Attributes:
+        requests (int): 受け付けた要求の数
+        jobs (int): 始めた探索の数
+        coalesced (int): 同じ虫食い算の探索が進行中だったため、その結果を待つことにした要求の数
+        rejected (int): 処理待ちが多すぎて断った要求の数
+        slices (int): ワーカープロセスで探索した回数
+    """
+
+    requests: int = 0
+    jobs: int = 0
+    coalesced: int = 0
+    rejected: int = 0
+    slices: int = 0
+
+
+class SolverService:
+    """
+    虫食い算をプロセスプールで解き、イベントループを止めずに結果を返す。
+
+    探索はslice_nodesノードずつに区切ってワーカープロセスで行い、終わらなければ処理待ちの列の最後に戻す。
+    難しい虫食い算が全てのワーカーを占めることが無いので、後から来た易しい虫食い算もすぐに解ける。
+    同時に来た同じ虫食い算(canonical_keyと設定が全て同じもの)の要求は、
+    一つの探索の結果を共有する。処理待ちの探索がmax_pendingに達したら、新しい虫食い算は断る。
+
+    Args:
+        workers (Optional[int]): ワーカープロセス数。NoneならCPU数。
+        max_pending (int): 同時に扱う探索の数の上限
+        slice_nodes (int): ワーカープロセスで1回に探索するノード数
+        timeout (Optional[float]): 1つの探索にかける時間の上限(秒)。Noneなら上限なし。
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        max_pending: int = 64,
+        slice_nodes: int = 20000,
+        timeout: Optional[float] = None,
+    ):
+        if max_pending < 1:
+            raise ValueError("Error: max_pending should be 1 or more")
+        if slice_nodes < 1:
+            raise ValueError("Error: slice_nodes should be 1 or more")
+        # ProcessPoolExecutorと同じく、NoneならCPU数
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_pending = max_pending
+        self.slice_nodes = slice_nodes
+        self.timeout = timeout
+        self.stats = ServiceStats()
+        self._jobs: Dict[str, _Job] = {}
+        self._ready: Optional[asyncio.Queue] = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._schedulers: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        """ワーカープロセスと、探索をワーカーに割り当てるタスクを始める。"""
+        if self._executor is not None:
+            return
+        # forkだと、その時点で開いている接続のソケットをワーカーが引き継ぎ、接続を閉じられなくなる
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        self._ready = asyncio.Queue()
+        self._schedulers = [asyncio.ensure_future(self._schedule()) for _ in range(self.workers)]
+
+    async def close(self) -> None:
+        """進行中の探索を止め、ワーカープロセスを終了する。"""
+        for task in self._schedulers:
+            task.cancel()
+        await asyncio.gather(*self._schedulers, return_exceptions=True)
+        self._schedulers = []
+        for job in list(self._jobs.values()):
+            self._finish(job, _error("cancelled", "Error: service closed"))
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def __aenter__(self) -> "SolverService":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    def _finish(self, job: _Job, event: dict) -> None:
+        job.finished = True
+        if self._jobs.get(job.key) is job:
+            del self._jobs[job.key]
+        job.publish(event)
+
+    async def _schedule(self) -> None:
+        """処理待ちの列から探索を取り出し、slice_nodesノードずつワーカーで進める。"""
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._ready.get()
+            if job.finished:
+                continue
+            if not job.subscribers:
+                # 待っている要求が全て無くなった
+                self._finish(job, _error("cancelled", "Error: search interrupted (cancelled)"))
+                continue
+            if job.deadline is not None and time.monotonic() >= job.deadline:
+                self._finish(job, dict(
+                    _error("interrupted", "Error: search interrupted (timeout)"),
+                    stats=asdict(job.stats), explored=job.explored,
+                ))
+                continue
+
+            self.stats.slices += 1
+            try:
+                answer, nodes, stats, explored = await loop.run_in_executor(
+                    self._executor, _run_slice,
+                    job.key, job.puzzle, job.options, job.nodes, self.slice_nodes,
+                )
+            except Exception as e:
+                self._finish(job, _error("internal", f"{type(e).__name__}: {e}"))
+                continue
+            _add_stats(job.stats, stats)
+            job.explored = explored
+            if answer is not None:
+                self._finish(job, {
+                    "event": "answer", "answer": list(answer),
+                    "nodes": job.stats.nodes_expanded,
+                })
+            elif not nodes:
+                self._finish(job, _error("no_answer", "Error: no answer"))
+            else:
+                job.nodes = nodes
+                job.publish({
+                    "event": "progress", "nodes": job.stats.nodes_expanded,
+                    "explored": explored,
+                })
+                self._ready.put_nowait(job)
+
+    async def stream(
+        self,
+        multiple_line1: str,
+        multiple_line2: str,
+        intermediate_lines: List[str],
+        product_line: str,
+        options: Optional[SearchOptions] = None,
+    ) -> AsyncIterator[dict]:
+        """
+        虫食い算を解き、進み具合と結果をJSONにできる辞書で返す。
+
+        Yields:
+            dict: 探索がslice_nodesノード進むごとに{"event": "progress", "nodes": 展開したノード数,
+                "explored": 探索し終えた割合}、最後に{"event": "answer", "answer": [被乗数, 乗数], "nodes": ...}
+                か{"event": "error", "type": 種類, "error": メッセージ}。
+                種類は"invalid"(入力の誤り)、"no_answer"、"busy"、"interrupted"、"cancelled"、"internal"。
+                "interrupted"には、止めるまでの統計(SearchStatsの辞書)"stats"と探索し終えた割合"explored"も入れる。
+        """
+        await self.start()
+        self.stats.requests += 1
+        try:
+            puzzle = normalize_puzzle(multiple_line1, multiple_line2, intermediate_lines, product_line)
+            key = f"{_options_key(options)}|{canonical_key(*puzzle)}"
+        except ValueError as e:
+            yield _error("invalid", str(e))
+            return
+
+        job = self._jobs.get(key)
+        if job is not None:
+            self.stats.coalesced += 1
+        elif len(self._jobs) >= self.max_pending:
+            self.stats.rejected += 1
+            yield _error("busy", "Error: service busy")
+            return
+        else:
+            deadline = None if self.timeout is None else time.monotonic() + self.timeout
+            job = self._jobs[key] = _Job(key, puzzle, options, deadline)
+            self.stats.jobs += 1
+            self._ready.put_nowait(job)
+
+        queue = asyncio.Queue()
+        job.subscribers.append(queue)
+        try:
+            while True:
+                event = await queue.get()
+                yield event
+                if event["event"] != "progress":
+                    return
+        finally:
+            job.subscribers.remove(queue)
+
+    async def solve(
+        self,
+        multiple_line1: str,
+        multiple_line2: str,
+        intermediate_lines: List[str],
+        product_line: str,
+        options: Optional[SearchOptions] = None,
+    ) -> Tuple[str, str]:
+        """
+        solverのasyncio版。
+
+        Returns:
+            Tuple[str, str]: 掛けられる数と掛ける数をタプルで返す。
+
+        Raises:
+            ValueError: 入力に誤りがある場合、解が無い場合。
+            ServiceBusy: 処理待ちが多すぎる場合。
+            SearchInterrupted: timeoutに達した場合。
+        """
+        async for event in self.stream(
+            multiple_line1, multiple_line2, intermediate_lines, product_line, options
+        ):
+            if event["event"] == "answer":
+                return tuple(event["answer"])
+            if event["event"] == "error":
+                if event["type"] == "busy":
+                    raise ServiceBusy(event["error"])
+                if event["type"] == "interrupted":
+                    raise SearchInterrupted(
+                        "timeout", SearchStats(**event["stats"]), event["explored"])
+                if event["type"] in ("invalid", "no_answer"):
+                    raise ValueError(event["error"])
+                raise RuntimeError(event["error"])
+        raise RuntimeError("Error: no result")
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 0) -> asyncio.AbstractServer:
+        """
+        JSON Linesで要求を受け付けるサーバーを始める。
+
+        1行に1つ{"id": 任意の値, "puzzle": [被乗数, 乗数, [中間結果, ...], 掛け算の結果],
+        "options": {SearchOptionsの引数}}を送ると、streamの返す辞書にidを加えたものを1行ずつ返す。
+        1つの接続で複数の要求を送ってよく、結果は解き終わった順に返す。
+
+        Returns:
+            asyncio.AbstractServer: サーバー。port=0なら空いているポートを使う。
+        """
+        await self.start()
+        return await asyncio.start_server(self._handle, host, port)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        lock = asyncio.Lock()
+        tasks = set()  # 返し終わっていない要求のタスク
+
+        async def send(event: dict) -> None:
+            async with lock:
+                writer.write(json.dumps(event, ensure_ascii=False).encode() + b"\n")
+                await writer.drain()
+
+        async def respond(request_id, puzzle: list, options: Optional[SearchOptions]) -> None:
+            async for event in self.stream(*puzzle, options=options):
+                await send(dict(event, id=request_id))
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                request_id = None
+                try:
+                    request = json.loads(line)
+                    request_id = request.get("id")
+                    puzzle = request["puzzle"]
+                    if not isinstance(puzzle, list) or len(puzzle) != 4:
+                        raise ValueError("Error: puzzle should have 4 elements")
+                    options = SearchOptions(**request.get("options", {}))
+                except (ValueError, TypeError, KeyError, AttributeError) as e:
+                    await send(dict(_error("invalid", f"Error: bad request ({e})"), id=request_id))
+                    continue
+                task = asyncio.ensure_future(respond(request_id, puzzle, options))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            await asyncio.gather(*tasks)
+        finally:
+            for task in list(tasks):
+                task.cancel()
+            writer.close()
@@ -1,8 +1,20 @@
 # 虫食い算数のsolver
 
+import functools
+import itertools
 import math
 import re
-from typing import List, Tuple
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # SearchOptions(vectorized=True)を使わなければ不要
+    np = None
 
 
 def find_star_index(str1: str, str2: str) -> int:
@@ -108,14 +120,14 @@ def is_correct_answer(
     # check product line
     product = str(int(multiple_line_1) * int(multiple_line_2))
     # 正規表現で完全一致かチェック
-    if not product_line_regex.match(product):
+    if not product_line_regex.fullmatch(product):
         return False
 
     for multiple_line_2_char, intermediate_line_regex in zip(
         reversed(multiple_line_2), intermediate_lines_regex
     ):
         product_single = str(int(multiple_line_1) * int(multiple_line_2_char))
-        if not intermediate_line_regex.match(product_single):
+        if not intermediate_line_regex.fullmatch(product_single):
             return False
 
     return True
@@ -170,8 +182,9 @@ def check_mod(multiple_1: str, multiple_2: str, product: str) -> bool:
 
     multiple_1 = multiple_1[last_star_index1 + 1:]
     multiple_2 = multiple_2[last_star_index2 + 1:]
+    # 上の桁が0の場合("01"など)も桁数を揃えて比べる
     return (
-        str(int(multiple_1) * int(multiple_2))[-reliable_digit:]
+        str(int(multiple_1) * int(multiple_2)).zfill(reliable_digit)[-reliable_digit:]
         == product[-reliable_digit:]
     )
 
@@ -188,8 +201,8 @@ def make_min_max(string: str) -> Tuple[int, int]:
     """
     min_str = string.replace("*", "0")
     max_str = string.replace("*", "9")
-    if min_str[0] == "0":
-        # replace first 0 to 1
+    if string[0] == "*":
+        # 先頭の*は1以上
         min_str = "1" + min_str[1:]
     return int(min_str), int(max_str)
 
@@ -358,11 +371,1950 @@ def validate_input(
             )
 
 
+def encode_line(line: str) -> Tuple[int, int]:
+    """
+    *を含む文字列を、埋まっている桁の値と虫食い位置のビットマスクに変換する。
+
+    Args:
+        line (str): 数字と*からなる文字列。例: "1*2"
+
+    Returns:
+        Tuple[int, int]: *を0とした値と、*の位置のビットマスク。ビットiは10**iの位に対応する。
+                         例: "1*2" -> (102, 0b10)
+    """
+    mask = 0
+    for i, char in enumerate(reversed(line)):
+        if char == "*":
+            mask |= 1 << i
+    return int(line.replace("*", "0")), mask
+
+
+def decode_line(value: int, mask: int, length: int) -> str:
+    """
+    encode_lineの逆変換。
+
+    Args:
+        value (int): *を0とした値
+        mask (int): *の位置のビットマスク
+        length (int): 文字列の長さ
+
+    Returns:
+        str: 数字と*からなる文字列
+    """
+    if not mask:
+        return str(value).zfill(length)
+    chars = list(str(value).zfill(length))
+    while mask:
+        low_bit = mask & -mask
+        chars[length - low_bit.bit_length()] = "*"
+        mask ^= low_bit
+    return "".join(chars)
+
+
+def count_trailing_known(mask: int) -> int:
+    """
+    下の位から連続して埋まっている桁数を返す。全て埋まっている場合はmath.infを返す。
+
+    Args:
+        mask (int): *の位置のビットマスク
+
+    Returns:
+        int: 下の位から連続して埋まっている桁数。例: 0b100 -> 2
+    """
+    if mask == 0:
+        return math.inf
+    return (mask & -mask).bit_length() - 1
+
+
+def spread_digits(value: int, base: int) -> int:
+    """
+    10進数の各桁を、base進数の各桁に並べ直した値を返す。
+
+    Args:
+        value (int): 10進数の値。例: 123
+        base (int): 並べ直す先の基数。例: 1000
+
+    Returns:
+        int: 例: (123, 1000) -> 1 * 1000**2 + 2 * 1000 + 3
+    """
+    spread = 0
+    shift = 1
+    while value:
+        value, digit = divmod(value, 10)
+        spread += digit * shift
+        shift *= base
+    return spread
+
+
+ALL_DIGITS = 0b1111111111  # 0-9の集合。ビットdが数字dに対応する。
+NONZERO_DIGITS = 0b1111111110  # 1-9の集合
+
+
+def digit_domains(line: str) -> List[int]:
+    """
+    文字列の各桁が取りうる数字の集合を返す。
+
+    Args:
+        line (str): 数字と*からなる文字列。例: "*3*"
+
+    Returns:
+        List[int]: 下の位から順に並べた、取りうる数字の集合(ビットdが数字dに対応する)のリスト。
+                   先頭の*は1-9、それ以外の*は0-9。例: "*3*" -> [0b1111111111, 0b1000, 0b1111111110]
+    """
+    domains = []
+    for i, char in enumerate(reversed(line)):
+        if char != "*":
+            domains.append(1 << int(char))
+        elif i == len(line) - 1:
+            domains.append(NONZERO_DIGITS)
+        else:
+            domains.append(ALL_DIGITS)
+    return domains
+
+
+def fill_forced_digits(line: str, domains: List[int]) -> str:
+    """digit_domainsの逆変換。取りうる数字が一つに決まった*を、その数字で置き換える。"""
+    chars = list(line)
+    for i, domain in enumerate(domains):
+        if domain & (domain - 1) == 0:
+            chars[len(line) - 1 - i] = str(domain.bit_length() - 1)
+    return "".join(chars)
+
+
+def _add_digits(sums: int, domain: int) -> int:
+    """和の集合sumsの各要素に、domainの数字を一つ足してできる和の集合。"""
+    if domain and domain & (domain - 1) == 0:
+        return sums << (domain.bit_length() - 1)
+    result = 0
+    while domain:
+        low_bit = domain & -domain
+        result |= sums << (low_bit.bit_length() - 1)
+        domain ^= low_bit
+    return result
+
+
+def _carries_out(sums: int, digit_domain: int) -> int:
+    """列の和の集合のうち一の位がdigit_domainに含まれるものについて、上の列への繰り上がりの集合。"""
+    carries = 0
+    carry = 1
+    while sums:
+        if sums & digit_domain:
+            carries |= carry
+        sums >>= 10
+        carry <<= 1
+    return carries
+
+
+def _valid_sums(digit_domain: int, carries: int) -> int:
+    """一の位がdigit_domainに含まれ、上の列への繰り上がりがcarriesに含まれる和の集合。"""
+    sums = 0
+    while carries:
+        low_bit = carries & -carries
+        sums |= digit_domain << (10 * (low_bit.bit_length() - 1))
+        carries ^= low_bit
+    return sums
+
+
+def _digit_range(first_digit: int, digit_mask: Optional[int]):
+    """first_digit以上の数字のうち、digit_maskのビットが立っているもの。digit_maskがNoneなら全て。"""
+    if digit_mask is None:
+        return range(first_digit, 10)
+    return [digit for digit in range(first_digit, 10) if digit_mask >> digit & 1]
+
+
+class _ColumnLayout:
+    """
+    中間結果を1桁ずつずらして足すと掛け算の結果になる、という筆算の足し算を列ごとに並べたもの。
+
+    列cには中間結果の行jの10**(c-j)の位が並び、それらと下の列からの繰り上がりの和の一の位が
+    掛け算の結果の10**cの位、残りが上の列への繰り上がりになる。掛け算の結果の桁数より上の列は0。
+    各桁の数字と繰り上がりを取りうる値の集合(ビットマスク)で持ち、下の列から順に足し合わせて矛盾を調べる。
+    """
+
+    __slots__ = ("cells", "product_length")
+
+    def __init__(self, intermediate_lengths: List[int], product_length: int):
+        width = max(
+            [product_length]
+            + [length + j for j, length in enumerate(intermediate_lengths)]
+        )
+        self.product_length = product_length
+        # 列ごとの (行, 位) のリスト
+        self.cells = [
+            [
+                (j, column - j)
+                for j, length in enumerate(intermediate_lengths)
+                if 0 <= column - j < length
+            ]
+            for column in range(width)
+        ]
+
+    def narrow(
+        self, intermediate_domains: List[List[int]], product_domains: List[int]
+    ) -> bool:
+        """
+        各桁の取りうる数字から、どう繰り上がりを選んでも足し算が合わない数字を取り除く。
+        取り除くものが無くなるまで繰り返す。
+
+        Args:
+            intermediate_domains (List[List[int]]): 中間結果の各行のdigit_domains。その場で書き換える。
+            product_domains (List[int]): 掛け算の結果のdigit_domains。その場で書き換える。
+
+        Returns:
+            bool: 矛盾の無い数字の入れ方がある場合はTrue。無い場合はFalse。
+        """
+        cells = self.cells
+        width = len(cells)
+        # 掛け算の結果の桁数より上の列は0
+        column_domains = product_domains + [1] * (width - self.product_length)
+
+        changed = True
+        while changed:
+            changed = False
+
+            # forward[c]: 下の列から矛盾なく受け取れる、列cへの繰り上がりの集合
+            forward = [1]
+            for column in range(width):
+                sums = forward[column]
+                for j, place in cells[column]:
+                    sums = _add_digits(sums, intermediate_domains[j][place])
+                carries = _carries_out(sums, column_domains[column])
+                if not carries:
+                    return False
+                forward.append(carries)
+            # 一番上の列から先への繰り上がりは0
+            if not forward[width] & 1:
+                return False
+
+            # backward[c]: 列c以上の足し算を矛盾なく行える、列cへの繰り上がりの集合
+            backward = [0] * width + [1]
+            for column in reversed(range(width)):
+                sums = 1
+                for j, place in cells[column]:
+                    sums = _add_digits(sums, intermediate_domains[j][place])
+                valid = _valid_sums(column_domains[column], backward[column + 1])
+                carries = forward[column]
+                while carries:
+                    low_bit = carries & -carries
+                    if (sums << (low_bit.bit_length() - 1)) & valid:
+                        backward[column] |= low_bit
+                    carries ^= low_bit
+
+            # 各列で、前後の繰り上がりと矛盾しない数字だけを残す
+            for column in range(width):
+                carries_in = forward[column] & backward[column]
+                carries_out = forward[column + 1] & backward[column + 1]
+                domains = [intermediate_domains[j][place] for j, place in cells[column]]
+
+                sums = carries_in
+                for domain in domains:
+                    sums = _add_digits(sums, domain)
+                digit_domain = column_domains[column]
+                supported = 0
+                for digit in range(10):
+                    if digit_domain >> digit & 1 and sums & _valid_sums(
+                        1 << digit, carries_out
+                    ):
+                        supported |= 1 << digit
+                if supported != digit_domain:
+                    column_domains[column] = digit_domain = supported
+                    changed = True
+
+                valid = _valid_sums(digit_domain, carries_out)
+                for k, (j, place) in enumerate(cells[column]):
+                    others = carries_in
+                    for other, domain in enumerate(domains):
+                        if other != k:
+                            others = _add_digits(others, domain)
+                    supported = 0
+                    for digit in range(10):
+                        if domains[k] >> digit & 1 and (others << digit) & valid:
+                            supported |= 1 << digit
+                    if supported != domains[k]:
+                        intermediate_domains[j][place] = domains[k] = supported
+                        changed = True
+
+        product_domains[:] = column_domains[: self.product_length]
+        return True
+
+
+def propagate_columns(
+    intermediate_lines: List[str], product_line: str
+) -> Tuple[List[str], str]:
+    """
+    中間結果を桁をずらして足したものが掛け算の結果になるよう、筆算の足し算を列ごとに調べ、
+    数字が一つに決まる*をその数字で埋める。
+
+    Args:
+        intermediate_lines (List[str]): 掛け算の中間結果を表す文字列のリスト。
+        product_line (str): 掛け算の結果を表す文字列。
+
+    Returns:
+        Tuple[List[str], str]: *を埋めた中間結果と掛け算の結果のタプル。
+
+    Raises:
+        ValueError: どう*を埋めても足し算が合わない場合。
+    """
+    layout = _ColumnLayout(
+        [len(line) for line in intermediate_lines], len(product_line))
+    intermediate_domains = [digit_domains(line) for line in intermediate_lines]
+    product_domains = digit_domains(product_line)
+    if not layout.narrow(intermediate_domains, product_domains):
+        raise ValueError("Error: no answer")
+    return (
+        [
+            fill_forced_digits(line, domains)
+            for line, domains in zip(intermediate_lines, intermediate_domains)
+        ],
+        fill_forced_digits(product_line, product_domains),
+    )
+
+
+class SearchNode:
+    """
+    探索木のノード。被乗数と乗数を、埋まっている桁の値(*は0とする)と*の位置のビットマスクで保持する。
+    文字列への変換はDepthFirstSearch.decodeで、探索の入口と出口でのみ行う。
+
+    mod 10^nの枝切りのために、*を0とした積 value1 * value2 (product) と、
+    乗数の各桁との積 value1 * (乗数の下からi桁目) を partial_base 進数の各桁に詰めた整数 (partials) も持ち、
+    1桁埋めるごとに差分で更新する。
+    *は0として扱うので、これらの下の位のうち埋まっている桁だけから決まる部分は正しい値になる。
+    """
+
+    __slots__ = ("value1", "mask1", "value2", "mask2", "product", "partials")
+
+    def __init__(
+        self,
+        value1: int,
+        mask1: int,
+        value2: int,
+        mask2: int,
+        product: int,
+        partials: int,
+    ):
+        self.value1 = value1
+        self.mask1 = mask1
+        self.value2 = value2
+        self.mask2 = mask2
+        self.product = product
+        self.partials = partials
+
+    @staticmethod
+    def partial_base(length1: int) -> int:
+        """partialsの1桁分の大きさ。被乗数と1桁の数の積が必ず収まる。"""
+        return 10 ** (length1 + 1)
+
+    @classmethod
+    def from_values(
+        cls, value1: int, mask1: int, value2: int, mask2: int, length1: int
+    ) -> "SearchNode":
+        """埋まっている桁の値とビットマスクからノードを作る。productとpartialsはここで計算する。"""
+        return cls(
+            value1,
+            mask1,
+            value2,
+            mask2,
+            value1 * value2,
+            value1 * spread_digits(value2, cls.partial_base(length1)),
+        )
+
+    @classmethod
+    def from_strings(cls, multiple_line_1: str, multiple_line_2: str) -> "SearchNode":
+        """(被乗数, 乗数)の文字列からノードを作る。"""
+        return cls.from_values(
+            *encode_line(multiple_line_1),
+            *encode_line(multiple_line_2),
+            len(multiple_line_1),
+        )
+
+    def to_strings(self, length1: int, length2: int) -> Tuple[str, str]:
+        """ノードを(被乗数, 乗数)の文字列に戻す。"""
+        return (
+            decode_line(self.value1, self.mask1, length1),
+            decode_line(self.value2, self.mask2, length2),
+        )
+
+    def key(self) -> Tuple[int, int, int, int]:
+        return (self.value1, self.mask1, self.value2, self.mask2)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, SearchNode) and self.key() == other.key()
+
+    def __hash__(self) -> int:
+        return hash((self.value1, self.mask1, self.value2, self.mask2))
+
+    def __reduce__(self):
+        return (SearchNode, self.key() + (self.product, self.partials))
+
+    def __repr__(self) -> str:
+        return f"SearchNode{self.key()}"
+
+
+class _LinePattern:
+    """中間結果・掛け算の結果の1行分を、探索中に文字列を解析しなくて済むよう前計算したもの。"""
+
+    __slots__ = ("length", "known_suffix", "suffix_value", "min", "max", "value", "mask")
+
+    def __init__(self, line: str):
+        last_star = line.rfind("*")
+        self.length = len(line)
+        self.value, self.mask = encode_line(line)
+        # 下の位から連続して決まっている桁数と、その値
+        self.known_suffix = math.inf if last_star == -1 else len(line) - last_star - 1
+        self.suffix_value = int(line[last_star + 1:] or "0")
+        self.min, self.max = make_min_max(line)
+
+
+def _fixed_runs(line: str) -> List[Tuple[int, int, int]]:
+    """数字が決まっている桁の連続を(下の位の10のべき, 10の桁数乗, 値)のリストにする。"""
+    runs = []
+    for match in re.finditer(r"[0-9]+", line):
+        runs.append((10 ** (len(line) - match.end()), 10 ** len(match.group()), int(match.group())))
+    return runs
+
+
+def _line_conditions(line: str, name: str) -> List[str]:
+    """
+    nameの値が、文字列にしたときlineにfullmatchするための条件式のリスト。
+
+    桁数は範囲で、決まっている数字は連続ごとに//と%で検査する。先頭の*は1-9なので範囲に含まれる。
+    2桁以上で先頭が0の行には、どの値も一致しない。
+    """
+    length = len(line)
+    if length > 1 and line[0] == "0":
+        return ["False"]
+    low, high = make_min_max(line)
+    if length > 1:
+        low = max(low, 10 ** (length - 1))
+    conditions = [f"{low} <= {name} <= {high}"]
+    for unit, modulus, value in _fixed_runs(line):
+        if unit * modulus == 10**length and low // unit % modulus == value == high // unit % modulus:
+            # 範囲で決まる上の位は検査しなくてよい
+            continue
+        shifted = name if unit == 1 else f"{name} // {unit}"
+        conditions.append(f"{shifted} % {modulus} == {value}")
+    return conditions
+
+
+class CompiledPuzzle:
+    """
+    虫食い算の中間結果と掛け算の結果を、葉の検証専用の関数に変換したもの。
+
+    check(product, partials)は、積と、被乗数と乗数の各桁との積をpartial_base進数の各桁に詰めた整数
+    (SearchNode.partials)を受け取り、全ての行が一致するかを返す。正規表現も文字列も使わず、
+    行ごとの範囲と決まった桁の//と%だけの直線的なコードを生成してexecする。
+
+    Attributes:
+        intermediate_lines (Tuple[str, ...]): 中間結果
+        product_line (str): 掛け算の結果
+        length1 (int): 被乗数の桁数
+        source (str): 生成したcheckのソース
+    """
+
+    __slots__ = ("intermediate_lines", "product_line", "length1", "source", "check")
+
+    def __init__(self, intermediate_lines: Tuple[str, ...], product_line: str, length1: int):
+        self.intermediate_lines = intermediate_lines
+        self.product_line = product_line
+        self.length1 = length1
+        partial_base = SearchNode.partial_base(length1)
+        body = [f"    if not ({' and '.join(_line_conditions(product_line, 'product'))}):",
+                "        return False"]
+        for i, line in enumerate(intermediate_lines):
+            if i == len(intermediate_lines) - 1:
+                body.append("    partial = partials")
+            else:
+                body.append(f"    partials, partial = divmod(partials, {partial_base})")
+            body += [f"    if not ({' and '.join(_line_conditions(line, 'partial'))}):",
+                     "        return False"]
+        self.source = "def check(product, partials):\n" + "\n".join(body) + "\n    return True\n"
+        namespace = {}
+        exec(compile(self.source, "<mushikui check>", "exec"), namespace)
+        self.check = namespace["check"]
+
+    def __reduce__(self):
+        return (CompiledPuzzle, (self.intermediate_lines, self.product_line, self.length1))
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile_puzzle(intermediate_lines: Tuple[str, ...], product_line: str, length1: int):
+    return CompiledPuzzle(intermediate_lines, product_line, length1)
+
+
+def compile_puzzle(intermediate_lines: List[str], product_line: str, length1: int) -> CompiledPuzzle:
+    """
+    中間結果と掛け算の結果をCompiledPuzzleに変換する。同じ行と被乗数の桁数に対しては、変換済みのものを返す。
+
+    Args:
+        intermediate_lines (List[str]): 中間結果(乗数の下の位から)
+        product_line (str): 掛け算の結果
+        length1 (int): 被乗数の桁数
+
+    Returns:
+        CompiledPuzzle: 変換したもの
+    """
+    return _compile_puzzle(tuple(intermediate_lines), product_line, length1)
+
+
+def count_completions(mask: int, length: int) -> int:
+    """*を埋めてできる数の個数。先頭の*は1-9、それ以外の*は0-9。"""
+    count = 10 ** bin(mask).count("1")
+    if mask >> (length - 1) & 1:
+        count = count // 10 * 9
+    return count
+
+
+def pattern_completions(value: int, mask: int, length: int) -> List[int]:
+    """
+    *を埋めてできる数を小さい順に並べたリストを返す。
+
+    Args:
+        value (int): *を0とした値
+        mask (int): *の位置のビットマスク
+        length (int): 桁数
+
+    Returns:
+        List[int]: *を埋めた数のリスト。例: (102, 0b10, 3) -> [102, 112, ..., 192]
+    """
+    values = [value]
+    place = length - 1
+    # 上の位から埋めていくと小さい順に並ぶ
+    while place >= 0:
+        if mask >> place & 1:
+            unit = 10**place
+            first_digit = 1 if place == length - 1 else 0
+            values = [v + digit * unit for v in values for digit in range(first_digit, 10)]
+        place -= 1
+    return values
+
+
+def smallest_completion(value: int, mask: int, length: int, lower: int) -> Optional[int]:
+    """
+    *を埋めてできる数のうち、lower以上で最小のものを返す。
+
+    上の位から順にlowerの数字に合わせていき、合わせられない位が出たら、
+    それより上で数字を1つ大きくできる*のうち最も下のものを大きくして、残りを最小に埋める。
+
+    Args:
+        value (int): *を0とした値
+        mask (int): *の位置のビットマスク
+        length (int): 桁数
+        lower (int): 下限
+
+    Returns:
+        Optional[int]: lower以上で最小の数。無い場合はNone。例: (102, 0b10, 3, 150) -> 152
+    """
+    if lower >= 10**length:
+        return None
+    lower = max(lower, 0)
+    result = 0  # 上の位から決めた値
+    fallback = None  # 合わせられない位が出たときの答え
+    for place in range(length - 1, -1, -1):
+        unit = 10**place
+        low_digit = lower // unit % 10
+        if mask >> place & 1:
+            first_digit = 1 if place == length - 1 else 0
+            if low_digit < first_digit:
+                return result + first_digit * unit + value % unit
+            if low_digit < 9:
+                fallback = result + (low_digit + 1) * unit + value % unit
+            result += low_digit * unit
+        else:
+            digit = value // unit % 10
+            if digit > low_digit:
+                return result + digit * unit + value % unit
+            if digit < low_digit:
+                return fallback
+            result += digit * unit
+    return result
+
+
+ORDERINGS = ("ends", "mrv")
+ENGINES = ("dfs", "multiplier_first")
+VISITED_MODES = ("set", "table", "none")
+
+# SearchOptions(vectorized=True)で使う、*に入れる数字の配列。添字は最小の数字(0か1)。
+_DIGITS = (
+    None if np is None else (np.arange(0, 10, dtype=np.int64), np.arange(1, 10, dtype=np.int64))
+)
+# NumPyのint64で扱える桁数
+_VECTORIZED_MAX_DIGITS = 18
+# is_wrong_answer_suffixの1回の判定で調べるノード数の上限
+_SUFFIX_SEARCH_LIMIT = 2000
+
+
+# setの1要素あたりの大きさの目安(ハッシュ値と参照、空きを含む)
+_SET_ENTRY_BYTES = 40
+
+
+class _VisitedSet(set):
+    """探索済みのノードを全て覚える。"""
+
+    def memory(self, node_bytes: int) -> int:
+        return len(self) * (node_bytes + _SET_ENTRY_BYTES)
+
+
+class _VisitedTable:
+    """
+    探索済みのノードを、大きさが一定のハッシュ表に覚える。同じ場所に入るノードが来たら古い方を忘れる。
+    忘れたノードは再び探索されることがあるだけで、探索していないノードを飛ばすことは無い。
+    """
+
+    __slots__ = ("slots", "mask", "count")
+
+    def __init__(self, size: int):
+        size = 1 << max(size - 1, 0).bit_length()  # 2のべき乗に切り上げる
+        self.slots = [None] * size
+        self.mask = size - 1
+        self.count = 0
+
+    def __contains__(self, node: "SearchNode") -> bool:
+        return self.slots[hash(node) & self.mask] == node
+
+    def add(self, node: "SearchNode") -> None:
+        index = hash(node) & self.mask
+        if self.slots[index] is None:
+            self.count += 1
+        self.slots[index] = node
+
+    def __len__(self) -> int:
+        return self.count
+
+    def memory(self, node_bytes: int) -> int:
+        return sys.getsizeof(self.slots) + self.count * node_bytes
+
+
+class _NoVisited:
+    """探索済みのノードを覚えない。"""
+
+    __slots__ = ()
+
+    def __contains__(self, node: "SearchNode") -> bool:
+        return False
+
+    def add(self, node: "SearchNode") -> None:
+        pass
+
+    def __len__(self) -> int:
+        return 0
+
+    def memory(self, node_bytes: int) -> int:
+        return 0
+
+
+@dataclass(frozen=True)
+class SearchOptions:
+    """探索の方法の設定。
+
+    Attributes:
+        ordering (str): 次に埋める*の選び方。
+            "ends": 数字の両端に近い*を優先する(find_star_index)。
+            "mrv": 全ての*に0-9を入れてみて、枝切りされずに残る数字が最も少ない*を優先する。
+                   残る数字が無い*があれば、そのノードをすぐに捨てる。
+        column_propagation (bool): Trueなら筆算の足し算を列ごとに調べる(propagate_columns)。
+            探索の前に数字が一つに決まる*を埋め、探索中は埋まった下の桁と繰り上がりから
+            掛け算の結果と矛盾するノードを枝切りする。
+        vectorized (bool): Trueなら一つの*に入れる全ての数字の枝切りを、NumPyの配列でまとめて行う。
+            探索の順序と解は変わらない。速くなっても1.2倍程度で、小さい虫食い算では遅くなることもある。NumPyが必要。掛ける数と掛けられる数の桁数の和などが
+            18を超える場合は、int64に収まらないので通常の方法で探索する。
+        engine (str): 探索の進め方。
+            "dfs": orderingに従って被乗数と乗数の*を埋めていく。
+            "multiplier_first": 乗数の*を先に全て埋める。乗数が決まると中間結果の各行は被乗数の1桁倍になるので、
+                   行の*を埋めて割り切れるものから被乗数の候補を求め、行ごとの候補の共通部分を葉として検証する
+                   (divide_multiplicand)。*の多い行しか無い場合は"dfs"と同じように被乗数の*を埋めていく。
+        division_limit (int): engine="multiplier_first"で、被乗数の候補を求めるのに使う行の*の埋め方の上限。
+        suffix_tables (bool): Trueならmod 10^nの検査を、下の桁ごとに覚えた表を引いて行い(suffix_digit_mask)、
+            検査に通る数字だけ子を作る。探索の順序と解は変わらない。vectorizedと同時に指定した場合は
+            vectorizedを優先する。
+        suffix_table_limit (int): suffix_tablesの表に覚える組み合わせの数の上限。
+        nogood_cache (int): 0より大きければ、被乗数の下の桁と乗数の*をどう埋めてもmod 10^nの検査に
+            通らない子を、部分木ごと枝切りする(is_wrong_answer_suffix)。判定結果は被乗数の上の桁によらないので、
+            最大この数だけ覚えて使い回す(最も長く使われていないものから捨てる)。
+        visited (str): 探索済みのノードの覚え方。
+            "set": 展開したノードと枝切り・検証した子を全てsetに覚える。探索が進むほどメモリが増える。
+            "table": 大きさvisited_table_sizeのハッシュ表に覚え、衝突したら古い方を忘れる。
+            "none": 覚えない。子は一つの*に違う数字を入れたものなので部分木は重ならず、
+                    どのorderingやengineでも同じノードが二度現れることは無い。メモリは深さ×分岐数に比例する。
+        visited_table_size (int): visited="table"のハッシュ表の大きさ。2のべき乗に切り上げる。
+        prefix_bounds (bool): Trueなら子ノードごとに、被乗数と乗数が取りうる範囲から積と中間結果の範囲を求め、
+            その範囲に入力の文字列と上の桁が合う数があるかを調べて枝切りする(is_wrong_answer_prefix)。
+        preprocess (bool): Trueなら探索の前に、数字が一つに決まる*をその数字で埋める(preprocess_puzzle)。
+            解の集合は変わらないが、埋める*の順序が変わるので解が見つかる順序は変わりうる。
+    """
+
+    ordering: str = "ends"
+    column_propagation: bool = False
+    vectorized: bool = False
+    engine: str = "dfs"
+    division_limit: int = 100000
+    suffix_tables: bool = False
+    suffix_table_limit: int = 1 << 20
+    nogood_cache: int = 0
+    visited: str = "set"
+    visited_table_size: int = 1 << 16
+    prefix_bounds: bool = False
+    preprocess: bool = False
+
+    def __post_init__(self):
+        if self.ordering not in ORDERINGS:
+            raise ValueError(
+                f"Error: ordering should be one of {ORDERINGS}")
+        if self.vectorized and np is None:
+            raise ValueError("Error: vectorized search requires numpy")
+        if self.engine not in ENGINES:
+            raise ValueError(f"Error: engine should be one of {ENGINES}")
+        if self.division_limit < 0:
+            raise ValueError("Error: division_limit should be 0 or more")
+        if self.suffix_table_limit < 0:
+            raise ValueError("Error: suffix_table_limit should be 0 or more")
+        if self.nogood_cache < 0:
+            raise ValueError("Error: nogood_cache should be 0 or more")
+        if self.visited not in VISITED_MODES:
+            raise ValueError(f"Error: visited should be one of {VISITED_MODES}")
+        if self.visited_table_size < 1:
+            raise ValueError("Error: visited_table_size should be 1 or more")
+
+
+@dataclass
+class SearchStats:
+    """探索の統計。
+
+    Attributes:
+        nodes_expanded (int): 展開したノード数
+        pruned_mod (int): mod 10^n の検査(is_wrong_answer_mod)で枝切りした子の数
+        pruned_range (int): 値の範囲の検査(is_wrong_answer_range)で枝切りした子の数
+        pruned_column (int): 列ごとの足し算の検査(is_wrong_answer_column)で枝切りした子の数
+        leaves_verified (int): 全ての*が埋まり、is_correct_answerで検証した葉の数
+        nodes_divided (int): engine="multiplier_first"で、被乗数の候補を割り算で求めたノード数
+        pruned_suffix (int): 下の桁の埋め方の検査(is_wrong_answer_suffix)で枝切りした子の数
+        nogood_hits (int): is_wrong_answer_suffixで、覚えた結果を使った回数
+        nogood_misses (int): is_wrong_answer_suffixで、覚えた結果が無く下の桁を探索した回数
+        pruned_prefix (int): 上の桁の検査(is_wrong_answer_prefix)で枝切りした子の数
+        solutions (int): 見つかった解の数
+        max_stack_depth (int): スタックの長さの最大値
+        wall_time (float): 探索にかかった時間(秒)
+        peak_memory (int): スタックと探索済みのノードが使うメモリの最大値の見積もり(バイト)
+    """
+
+    nodes_expanded: int = 0
+    pruned_mod: int = 0
+    pruned_range: int = 0
+    pruned_column: int = 0
+    leaves_verified: int = 0
+    nodes_divided: int = 0
+    pruned_suffix: int = 0
+    nogood_hits: int = 0
+    nogood_misses: int = 0
+    pruned_prefix: int = 0
+    solutions: int = 0
+    max_stack_depth: int = 0
+    wall_time: float = 0.0
+    peak_memory: int = 0
+
+
+# 探索の時間と取り消しを調べる間隔(ノード数)。毎回調べると遅くなる。
+_CHECK_INTERVAL = 64
+
+
+class CancellationToken:
+    """
+    探索を外から止めるための目印。別のスレッドからcancelを呼ぶと、探索は次に調べたときに止まる。
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+
+class SearchInterrupted(RuntimeError):
+    """
+    ノード数、時間の上限に達したか取り消されたため、探索を最後まで行わずに止めたことを表す例外。
+    解が無いこと(ValueError)とは区別する。
+
+    Attributes:
+        reason (str): 止めた理由。"max_nodes"、"timeout"、"cancelled"のいずれか。
+        stats (SearchStats): 止めるまでの探索の統計。見つかった解の数はstats.solutions。
+        explored (float): 探索し終えた割合の見積もり(0-1)。DepthFirstSearch.explored_fractionを参照。
+    """
+
+    def __init__(self, reason: str, stats: "SearchStats", explored: float):
+        super().__init__(f"Error: search interrupted ({reason})")
+        self.reason = reason
+        self.stats = stats
+        self.explored = explored
+
+    def __reduce__(self):
+        return SearchInterrupted, (self.reason, self.stats, self.explored)
+
+
+class DepthFirstSearch:
+    """
+    虫食い算の探索空間。入力の文字列を一度だけ解析し、以降の枝切りは整数演算のみで行う。
+
+    Args:
+        multiple_line1 (str): 掛けられる数を表す文字列。
+        multiple_line2 (str): 掛ける数を表す文字列。
+        intermediate_lines (List[str]): 掛け算の中間結果を表す文字列のリスト。
+        product_line (str): 掛け算の結果を表す文字列。
+        stats (Optional[SearchStats]): 探索の統計を書き込むオブジェクト。Noneなら新しく作る。
+        options (Optional[SearchOptions]): 探索の方法。Noneなら既定の設定。
+    """
+
+    def __init__(
+        self,
+        multiple_line1: str,
+        multiple_line2: str,
+        intermediate_lines: List[str],
+        product_line: str,
+        stats: Optional[SearchStats] = None,
+        options: Optional[SearchOptions] = None,
+    ):
+        validate_input(multiple_line1, multiple_line2,
+                       intermediate_lines, product_line)
+        self.options = SearchOptions() if options is None else options
+
+        feasible = True
+        if self.options.preprocess:
+            try:
+                multiple_line1, multiple_line2, intermediate_lines, product_line = (
+                    preprocess_puzzle(multiple_line1, multiple_line2,
+                                      intermediate_lines, product_line))
+            except ValueError:
+                feasible = False
+        self.column_layout = None
+        if self.options.column_propagation:
+            try:
+                intermediate_lines, product_line = propagate_columns(
+                    intermediate_lines, product_line)
+            except ValueError:
+                feasible = False
+            self.column_layout = _ColumnLayout(
+                [len(line) for line in intermediate_lines], len(product_line))
+            self.intermediate_domains = [
+                digit_domains(line) for line in intermediate_lines]
+            self.product_domains = digit_domains(product_line)
+
+        self.length1 = len(multiple_line1)
+        self.length2 = len(multiple_line2)
+        self.intermediate_lines = [_LinePattern(line)
+                                   for line in intermediate_lines]
+        self.product_line = _LinePattern(product_line)
+        self.product_min, self.product_max = make_min_max_product_line(
+            product_line,
+            [(line.min, line.max) for line in self.intermediate_lines],
+        )
+        self.checker = compile_puzzle(intermediate_lines, product_line, self.length1)
+
+        max_length = max(self.length1, self.length2, len(product_line),
+                         *(len(line) for line in intermediate_lines))
+        self.pow10 = [10**i for i in range(max_length + 2)]
+        self.vectorized = self.options.vectorized and max(
+            max_length, self.length1 + self.length2) <= _VECTORIZED_MAX_DIGITS
+        self.partial_base = SearchNode.partial_base(self.length1)
+        self.partial_shift = [self.partial_base**i for i in range(self.length2)]
+        self._nines = {}  # mask -> *を全て9にしたときに加える値
+        self._quotients = {}  # (行, 数字, value1, mask1) -> divide_multiplicandの被乗数の候補
+        self._suffix_masks = {}  # suffix_digit_maskの表
+        # is_wrong_answer_suffixで見る被乗数の下の桁数と、各行で検査する下の桁数
+        reliable_digits = [self.product_line.known_suffix] + [
+            line.known_suffix for line in self.intermediate_lines]
+        self.suffix_digits = min(self.length1, max(reliable_digits))
+        self._suffix_lines = [
+            (line, min(self.suffix_digits, line.known_suffix))
+            for line in self.intermediate_lines
+        ]
+        # 積の検査する桁より上で、その行も検査しない乗数の位は判定に関わらない
+        reliable_product = min(self.suffix_digits, self.product_line.known_suffix)
+        ignored_places = [
+            place for place, (_, reliable_digit) in enumerate(self._suffix_lines)
+            if place >= reliable_product and not reliable_digit
+        ]
+        self._suffix_ignored_units = [10**place for place in ignored_places]
+        self._suffix_mask2 = (1 << self.length2) - 1
+        for place in ignored_places:
+            self._suffix_mask2 ^= 1 << place
+        self.nogoods = OrderedDict()  # is_wrong_answer_suffixのキー -> 埋め方があるか
+        self._suffix_steps = 0
+        self.root = SearchNode.from_strings(multiple_line1, multiple_line2)
+        # 足し算が合わない場合は、探索するまでもなく解が無い
+        self.stack = [self.root] if feasible else []
+        self.visited = self._new_visited()
+        self.counter = 0
+        self.interrupted = None  # runが途中で止まった理由
+        self.stats = SearchStats() if stats is None else stats
+        # ノード1つの大きさの見積もり。値が最も大きいときの整数の大きさで見積もる。
+        largest = SearchNode.from_values(
+            self.pow10[self.length1] - 1, (1 << self.length1) - 1,
+            self.pow10[self.length2] - 1, (1 << self.length2) - 1, self.length1)
+        self.node_bytes = sys.getsizeof(largest) + sum(
+            sys.getsizeof(value) for value in largest.key() + (largest.product, largest.partials))
+
+    def partial(self, node: SearchNode, i: int) -> int:
+        """被乗数と乗数の下からi桁目との積(*は0とする)。"""
+        return node.partials // self.partial_shift[i] % self.partial_base
+
+    def decode(self, node: SearchNode) -> Tuple[str, str]:
+        """ノードを(被乗数, 乗数)の文字列に変換する。"""
+        return node.to_strings(self.length1, self.length2)
+
+    def find_star_place(self, node: SearchNode) -> Tuple[int, int]:
+        """
+        次に埋める*を、find_star_indexと同じ優先順位(数字の両端に近い*を優先)で選ぶ。
+
+        Returns:
+            Tuple[int, int]: (1なら被乗数、2なら乗数, 位)。*が無い場合は(0, -1)。
+        """
+        best_priority = math.inf
+        best = (0, -1)
+        for line_number, mask, length in (
+            (1, node.mask1, self.length1),
+            (2, node.mask2, self.length2),
+        ):
+            if not mask:
+                continue
+            first = mask.bit_length() - 1  # 最上位の*の位
+            last = (mask & -mask).bit_length() - 1  # 最下位の*の位
+            if length - 1 - first < best_priority:
+                best_priority = length - 1 - first
+                best = (line_number, first)
+            if last < best_priority:
+                best_priority = last
+                best = (line_number, last)
+        return best
+
+    def open_places(self, node: SearchNode) -> List[Tuple[int, int]]:
+        """
+        埋まっていない全ての*の(行, 位)を、数字の両端に近い順に返す。
+
+        Returns:
+            List[Tuple[int, int]]: (1なら被乗数、2なら乗数, 位)のリスト
+        """
+        places = []
+        for line_number, mask, length in (
+            (1, node.mask1, self.length1),
+            (2, node.mask2, self.length2),
+        ):
+            while mask:
+                low_bit = mask & -mask
+                place = low_bit.bit_length() - 1
+                places.append((min(place, length - 1 - place), line_number, place))
+                mask ^= low_bit
+        places.sort()
+        return [(line_number, place) for _, line_number, place in places]
+
+    def next_node_candidates(
+        self,
+        node: SearchNode,
+        star_place: Optional[Tuple[int, int]] = None,
+        digit_mask: Optional[int] = None,
+    ) -> List[SearchNode]:
+        """
+        get_next_node_candidatesのノード版。
+
+        Args:
+            node (SearchNode): *を含むノード
+            star_place (Optional[Tuple[int, int]]): 埋める*の(行, 位)。Noneならfind_star_placeで選ぶ。
+            digit_mask (Optional[int]): 与えた場合、ビットが立っている数字だけを入れる。
+
+        Returns:
+            List[SearchNode]: 次に埋める*に0-9(先頭の桁なら1-9)を入れたノードのリスト
+        """
+        if star_place is None:
+            star_place = self.find_star_place(node)
+        line_number, place = star_place
+        if place == -1:
+            raise ValueError("Error: no answer")
+
+        bit = 1 << place
+        unit = self.pow10[place]
+        value1, mask1 = node.value1, node.mask1
+        value2, mask2 = node.value2, node.mask2
+        product, partials = node.product, node.partials
+        if line_number == 1:
+            # 被乗数の位を埋めると、積は digit * 10**place * (乗数) だけ増え、
+            # 中間結果は各行 digit * 10**place * (乗数のその桁) だけ増える
+            first_digit = 1 if place == self.length1 - 1 else 0
+            digits = _digit_range(first_digit, digit_mask)
+            step_product = unit * value2
+            step_partials = unit * spread_digits(value2, self.partial_base)
+            mask1 ^= bit
+            return [
+                SearchNode(
+                    value1 + digit * unit,
+                    mask1,
+                    value2,
+                    mask2,
+                    product + digit * step_product,
+                    partials + digit * step_partials,
+                )
+                for digit in digits
+            ]
+
+        # 乗数の位を埋めると、その桁の中間結果が決まり、積はそれを10**place倍した分だけ増える
+        first_digit = 1 if place == self.length2 - 1 else 0
+        digits = _digit_range(first_digit, digit_mask)
+        step_product = unit * value1
+        step_partials = self.partial_shift[place] * value1
+        mask2 ^= bit
+        return [
+            SearchNode(
+                value1,
+                mask1,
+                value2 + digit * unit,
+                mask2,
+                product + digit * step_product,
+                partials + digit * step_partials,
+            )
+            for digit in digits
+        ]
+
+    def _matches_suffix(self, value: int, line: _LinePattern, reliable_digit) -> bool:
+        """valueの下reliable_digit桁がlineと一致するか。reliable_digitがmath.infなら完全一致を見る。"""
+        if reliable_digit == math.inf:
+            return value == line.suffix_value
+        modulus = self.pow10[reliable_digit]
+        return value % modulus == line.suffix_value % modulus
+
+    def is_wrong_answer_mod(
+        self, node: SearchNode, parent: Optional[SearchNode] = None
+    ) -> bool:
+        """
+        is_wrong_answer_modのノード版。
+
+        Args:
+            node (SearchNode): 検査するノード
+            parent (Optional[SearchNode]): nodeの親。与えた場合、親で検査済みの桁数から
+                信頼できる桁数が増えた行だけを検査する。
+
+        Returns:
+            bool: 正しい答えでない場合はTrue。それ以外はFalse。
+        """
+        known1 = count_trailing_known(node.mask1)
+        known2 = count_trailing_known(node.mask2)
+        if parent is None:
+            checked1 = checked2 = 0
+            checked_mask2 = -1
+        else:
+            checked1 = count_trailing_known(parent.mask1)
+            checked2 = count_trailing_known(parent.mask2)
+            checked_mask2 = parent.mask2
+            if known1 == checked1 and node.mask2 == checked_mask2:
+                # 上の位を埋めただけなので、下の位の一致は親と変わらない
+                return False
+
+        product_line = self.product_line
+        reliable_digit = min(known1, known2, product_line.known_suffix)
+        if reliable_digit > min(checked1, checked2, product_line.known_suffix):
+            if not self._matches_suffix(node.product, product_line, reliable_digit):
+                return True
+
+        mask2 = node.mask2
+        for i, line in enumerate(self.intermediate_lines):
+            if mask2 >> i & 1:
+                continue
+            reliable_digit = min(known1, line.known_suffix)
+            checked_digit = 0 if checked_mask2 >> i & 1 else min(
+                checked1, line.known_suffix)
+            if reliable_digit > checked_digit and not self._matches_suffix(
+                self.partial(node, i), line, reliable_digit
+            ):
+                return True
+        return False
+
+    def suffix_digit_mask(self, node: SearchNode, star_place: Tuple[int, int]) -> int:
+        """
+        star_placeの*に入れたときに、is_wrong_answer_mod(子, node)で枝切りされない数字の集合を求める。
+
+        mod 10^nの検査は被乗数と乗数の下r桁だけで決まるので、(行, r, 埋める位, 下r桁)ごとに
+        通る数字の集合を表に覚え、同じ下の桁が別の上の桁のもとで現れたときは表を引くだけで済ませる。
+        表はsuffix_table_limit個まで作り、それを超えたら覚えずに毎回計算する。
+
+        Returns:
+            int: 通る数字の集合(ビットdが数字dに対応する)
+        """
+        line_number, place = star_place
+        bit = 1 << place
+        mask1, mask2 = node.mask1, node.mask2
+        new_mask1 = mask1 ^ bit if line_number == 1 else mask1
+        new_mask2 = mask2 ^ bit if line_number == 2 else mask2
+        known1 = count_trailing_known(new_mask1)
+        known2 = count_trailing_known(new_mask2)
+        checked1 = count_trailing_known(mask1)
+        checked2 = count_trailing_known(mask2)
+        if known1 == checked1 and new_mask2 == mask2:
+            return ALL_DIGITS
+
+        pow10 = self.pow10
+        digit_mask = ALL_DIGITS
+        product_line = self.product_line
+        reliable_digit = min(known1, known2, product_line.known_suffix)
+        if reliable_digit > min(checked1, checked2, product_line.known_suffix):
+            digit_mask &= self._suffix_mask(
+                (-1, reliable_digit, line_number, place,
+                 self._suffix(node.value1, reliable_digit),
+                 self._suffix(node.value2, reliable_digit)),
+                product_line,
+            )
+
+        for i, line in enumerate(self.intermediate_lines):
+            if new_mask2 >> i & 1:
+                continue
+            reliable_digit = min(known1, line.known_suffix)
+            checked_digit = 0 if mask2 >> i & 1 else min(checked1, line.known_suffix)
+            if reliable_digit <= checked_digit:
+                continue
+            suffix1 = self._suffix(node.value1, reliable_digit)
+            if line_number == 2:
+                # 行iは被乗数とこれから入れる数字の積
+                key = (i, reliable_digit, 2, 0, suffix1, 0)
+            else:
+                key = (i, reliable_digit, 1, place, suffix1, node.value2 // pow10[i] % 10)
+            digit_mask &= self._suffix_mask(key, line)
+            if not digit_mask:
+                break
+        return digit_mask
+
+    def _suffix(self, value: int, reliable_digit) -> int:
+        """valueの下reliable_digit桁。reliable_digitがmath.infならvalueそのもの。"""
+        if reliable_digit == math.inf:
+            return value
+        return value % self.pow10[reliable_digit]
+
+    def _suffix_mask(self, key: Tuple[int, ...], line: _LinePattern) -> int:
+        """suffix_digit_maskの表を引く。無ければ計算して表に加える。"""
+        digit_mask = self._suffix_masks.get(key)
+        if digit_mask is not None:
+            return digit_mask
+
+        _, reliable_digit, line_number, place, suffix1, suffix2 = key
+        unit = self.pow10[place]
+        digit_mask = 0
+        for digit in range(10):
+            if line_number == 1:
+                value = (suffix1 + digit * unit) * suffix2
+            else:
+                value = suffix1 * (suffix2 + digit * unit)
+            if self._matches_suffix(value, line, reliable_digit):
+                digit_mask |= 1 << digit
+        if len(self._suffix_masks) < self.options.suffix_table_limit:
+            self._suffix_masks[key] = digit_mask
+        return digit_mask
+
+    def is_wrong_answer_suffix(self, node: SearchNode) -> bool:
+        """
+        被乗数の下suffix_digits桁と乗数の*をどう埋めても、mod 10^nの検査に通らないかを判定する。
+
+        この判定は被乗数の上の桁によらないので、(被乗数の下の桁とその*の位置, 乗数とその*の位置)を
+        キーにして結果をnogood_cache個まで覚え、上の桁だけが違うノードでは覚えた結果を使う。
+
+        Returns:
+            bool: 正しい答えでない場合はTrue。それ以外はFalse。
+        """
+        digits = self.suffix_digits
+        mask1 = node.mask1 & ((1 << digits) - 1)
+        if not mask1 and not node.mask2:
+            # 下の桁が全て埋まっていれば、is_wrong_answer_modで検査済み
+            return False
+
+        # 判定に関わらない乗数の桁はキーに含めない
+        value2 = node.value2
+        for unit in self._suffix_ignored_units:
+            value2 -= value2 // unit % 10 * unit
+        key = (node.value1 % self.pow10[digits], mask1, value2,
+               node.mask2 & self._suffix_mask2)
+        nogoods = self.nogoods
+        feasible = nogoods.get(key)
+        if feasible is not None:
+            nogoods.move_to_end(key)
+            self.stats.nogood_hits += 1
+            return not feasible
+
+        self.stats.nogood_misses += 1
+        self._suffix_steps = _SUFFIX_SEARCH_LIMIT
+        feasible = self._fill_suffix(0, *key)
+        nogoods[key] = feasible
+        if len(nogoods) > self.options.nogood_cache:
+            nogoods.popitem(last=False)
+        return not feasible
+
+    def _fill_suffix(self, place: int, value1: int, mask1: int, value2: int, mask2: int) -> bool:
+        """
+        is_wrong_answer_suffixの本体。下の位から順に*を埋め、mod 10^nの検査に通る埋め方があるかを返す。
+        探索が_SUFFIX_SEARCH_LIMITノードを超えた場合は、埋め方があるものとして打ち切る。
+        """
+        self._suffix_steps -= 1
+        if self._suffix_steps < 0:
+            return True
+        if place == self.suffix_digits:
+            # 乗数の残りの*は、その行の下の桁が合う数字があればよい
+            for i, (line, reliable_digit) in enumerate(self._suffix_lines):
+                if mask2 >> i & 1 and not any(
+                    self._matches_suffix(value1 * digit, line, reliable_digit)
+                    for digit in range(1 if i == self.length2 - 1 else 0, 10)
+                ):
+                    return False
+            return True
+
+        unit = self.pow10[place]
+        bit = 1 << place
+        if mask1 & bit:
+            digits1 = range(1 if place == self.length1 - 1 else 0, 10)
+            mask1 ^= bit
+        else:
+            digits1 = (0,)
+        # 乗数の*は、積の下の桁の検査にかかるときだけここで埋める
+        reliable_product = min(self.suffix_digits, self.product_line.known_suffix)
+        if mask2 & bit and place < reliable_product:
+            digits2 = range(1 if place == self.length2 - 1 else 0, 10)
+            mask2 ^= bit
+        else:
+            digits2 = (0,)
+
+        modulus = self.pow10[place + 1]
+        reliable_lines = self._suffix_lines
+        for digit1 in digits1:
+            next_value1 = value1 + digit1 * unit
+            for digit2 in digits2:
+                next_value2 = value2 + digit2 * unit
+                if place < reliable_product and (
+                    next_value1 * next_value2 - self.product_line.suffix_value
+                ) % modulus:
+                    continue
+                if any(
+                    not mask2 >> i & 1
+                    and (next_value1 * (next_value2 // self.pow10[i] % 10)
+                         - line.suffix_value) % self.pow10[min(place + 1, reliable_digit)]
+                    for i, (line, reliable_digit) in enumerate(reliable_lines)
+                ):
+                    continue
+                if self._fill_suffix(place + 1, next_value1, mask1, next_value2, mask2):
+                    return True
+        return False
+
+    def nines(self, mask: int) -> int:
+        """maskの*を全て9にしたときに加える値。"""
+        nines = self._nines.get(mask)
+        if nines is None:
+            nines = 0
+            rest = mask
+            while rest:
+                low_bit = rest & -rest
+                nines += 9 * self.pow10[low_bit.bit_length() - 1]
+                rest ^= low_bit
+            self._nines[mask] = nines
+        return nines
+
+    def is_wrong_answer_range(self, node: SearchNode) -> bool:
+        """is_wrong_answer_rangeのノード版。"""
+        value1, mask1, value2, mask2 = node.key()
+        # 先頭の*は1以上
+        lead1 = self.pow10[self.length1 - 1] if mask1 >> (self.length1 - 1) else 0
+        lead2 = self.pow10[self.length2 - 1] if mask2 >> (self.length2 - 1) else 0
+        min1 = value1 + lead1
+        max1 = value1 + self.nines(mask1)
+        min2 = value2 + lead2
+        max2 = value2 + self.nines(mask2)
+        if max1 * max2 < self.product_min or min1 * min2 > self.product_max:
+            return True
+
+        for i, line in enumerate(self.intermediate_lines):
+            if mask2 >> i & 1:
+                digit_min = 1 if i == self.length2 - 1 else 0
+                digit_max = 9
+            else:
+                digit_min = digit_max = value2 // self.pow10[i] % 10
+            if max1 * digit_max < line.min or min1 * digit_min > line.max:
+                return True
+        return False
+
+    def is_wrong_answer_prefix(self, node: SearchNode) -> bool:
+        """
+        被乗数と乗数が取りうる範囲から、積と各行の中間結果が取りうる範囲を求め、
+        その範囲に入力の文字列と合う数が無ければTrueを返す。
+
+        is_wrong_answer_rangeは範囲と文字列の最小値・最大値を比べるだけだが、こちらは範囲の中で
+        文字列の埋まっている桁と合う最小の数を求める(smallest_completion)ので、被乗数と乗数の上の桁が
+        埋まると、積と中間結果の上の桁が文字列と合わないノードを枝切りできる。
+        mod 10^nの検査が下の桁で行う枝切りを、上の桁で行うもの。
+        """
+        value1, mask1, value2, mask2 = node.key()
+        lead1 = self.pow10[self.length1 - 1] if mask1 >> (self.length1 - 1) else 0
+        lead2 = self.pow10[self.length2 - 1] if mask2 >> (self.length2 - 1) else 0
+        min1 = value1 + lead1
+        max1 = value1 + self.nines(mask1)
+        min2 = value2 + lead2
+        max2 = value2 + self.nines(mask2)
+
+        line = self.product_line
+        lower = max(min1 * min2, self.product_min)
+        found = smallest_completion(line.value, line.mask, line.length, lower)
+        if found is None or found > min(max1 * max2, self.product_max):
+            return True
+
+        for i, line in enumerate(self.intermediate_lines):
+            if mask2 >> i & 1:
+                digit_min = 1 if i == self.length2 - 1 else 0
+                digit_max = 9
+            else:
+                digit_min = digit_max = value2 // self.pow10[i] % 10
+            found = smallest_completion(line.value, line.mask, line.length, min1 * digit_min)
+            if found is None or found > max1 * digit_max:
+                return True
+        return False
+
+    def is_wrong_answer_column(self, node: SearchNode) -> bool:
+        """
+        筆算の足し算を下の列から順に調べ、掛け算の結果と矛盾するかを判定する。
+
+        被乗数の下から連続して埋まっている桁数をkとすると、乗数の桁が埋まっている行の中間結果は
+        下k桁が決まり、乗数も下から埋まっていれば掛け算の結果も下の桁が決まる。
+        決まった桁はその数字、それ以外は入力の文字列が表す数字の集合として、繰り上がりの集合を求める。
+
+        Returns:
+            bool: 正しい答えでない場合はTrue。それ以外はFalse。
+        """
+        known1 = count_trailing_known(node.mask1)
+        known_product = min(known1, count_trailing_known(node.mask2))
+        pow10 = self.pow10
+        mask2 = node.mask2
+        partials = [
+            None if mask2 >> i & 1 else self.partial(node, i)
+            for i in range(self.length2)
+        ]
+        intermediate_domains = self.intermediate_domains
+        product_domains = self.product_domains
+        product_length = self.column_layout.product_length
+
+        carries = 1
+        for column, cells in enumerate(self.column_layout.cells):
+            sums = carries
+            for j, place in cells:
+                domain = intermediate_domains[j][place]
+                if partials[j] is not None and place < known1:
+                    domain &= 1 << (partials[j] // pow10[place] % 10)
+                sums = _add_digits(sums, domain)
+            if column >= product_length:
+                digit_domain = 1
+            else:
+                digit_domain = product_domains[column]
+                if column < known_product:
+                    digit_domain &= 1 << (node.product // pow10[column] % 10)
+            carries = _carries_out(sums, digit_domain)
+            if not carries:
+                return True
+        return not carries & 1
+
+    def is_correct_answer(self, node: SearchNode) -> bool:
+        """is_correct_answerのノード版。積と中間結果はノードが持っている値をcheckerで検査する。"""
+        return self.checker.check(node.product, node.partials)
+
+    def _filter_candidates(
+        self, node: SearchNode, candidates: List[SearchNode], check_mod: bool = True
+    ) -> Tuple[List[SearchNode], List[SearchNode], int, int, int, int]:
+        """
+        候補ノードを葉の検証と枝切りにかける。check_modがFalseならmod 10^nの検査は済んでいるものとする。
+
+        Returns:
+            Tuple[List[SearchNode], List[SearchNode], int, int, int, int]:
+                (正解だった葉, 枝切りされなかった子, modで枝切りした数, 範囲で枝切りした数,
+                 列ごとの足し算で枝切りした数, 検証した葉の数)
+        """
+        visited = self.visited
+        check_column = self.column_layout is not None
+        solutions = []
+        children = []
+        pruned_mod = pruned_range = pruned_column = leaves_verified = 0
+        for candidate in candidates:
+            if candidate in visited:
+                continue
+
+            # 全部埋まったらチェック
+            if not candidate.mask1 and not candidate.mask2:
+                visited.add(candidate)
+                leaves_verified += 1
+                if self.is_correct_answer(candidate):
+                    solutions.append(candidate)
+                continue
+
+            # 枝切り用
+            if check_mod and self.is_wrong_answer_mod(candidate, node):
+                visited.add(candidate)
+                pruned_mod += 1
+                continue
+
+            if self.is_wrong_answer_range(candidate):
+                visited.add(candidate)
+                pruned_range += 1
+                continue
+
+            if check_column and self.is_wrong_answer_column(candidate):
+                visited.add(candidate)
+                pruned_column += 1
+                continue
+
+            children.append(candidate)
+        return (solutions, children, pruned_mod, pruned_range, pruned_column,
+                leaves_verified)
+
+    def _filter_place(
+        self, node: SearchNode, star_place: Optional[Tuple[int, int]] = None
+    ) -> Tuple[List[SearchNode], List[SearchNode], int, int, int, int]:
+        """star_placeの*に0-9を入れた子を作り、_filter_candidatesにかける。"""
+        remaining = node.mask1 | node.mask2
+        if remaining & (remaining - 1):
+            if self.vectorized:
+                if star_place is None:
+                    star_place = self.find_star_place(node)
+                return self._filter_place_vectorized(node, star_place)
+            if self.options.suffix_tables:
+                if star_place is None:
+                    star_place = self.find_star_place(node)
+                digit_mask = self.suffix_digit_mask(node, star_place)
+                candidates = self.next_node_candidates(node, star_place, digit_mask)
+                result = self._filter_candidates(node, candidates, check_mod=False)
+                # 表で除いた数字はmodで枝切りしたものとして数える
+                pruned_mod = 10 - len(candidates) - self._first_digit(star_place)
+                return result[:2] + (result[2] + pruned_mod,) + result[3:]
+        return self._filter_candidates(node, self.next_node_candidates(node, star_place))
+
+    def _first_digit(self, star_place: Tuple[int, int]) -> int:
+        """star_placeの*に入れる最小の数字。先頭の桁なら1、それ以外は0。"""
+        line_number, place = star_place
+        length = self.length1 if line_number == 1 else self.length2
+        return 1 if place == length - 1 else 0
+
+    def _filter_place_vectorized(
+        self, node: SearchNode, star_place: Tuple[int, int]
+    ) -> Tuple[List[SearchNode], List[SearchNode], int, int, int, int]:
+        """
+        _filter_candidatesと同じ枝切りを、star_placeに入れる全ての数字についてNumPyの配列でまとめて行う。
+        SearchNodeは枝切りされなかった子の分だけ作る。子が葉になる場合は使わない。
+        """
+        line_number, place = star_place
+        if place == -1:
+            raise ValueError("Error: no answer")
+        pow10 = self.pow10
+        unit = pow10[place]
+        bit = 1 << place
+        value1, mask1 = node.value1, node.mask1
+        value2, mask2 = node.value2, node.mask2
+        length2 = self.length2
+        if line_number == 1:
+            first_digit = 1 if place == self.length1 - 1 else 0
+            new_mask1, new_mask2 = mask1 ^ bit, mask2
+            step_product = unit * value2
+        else:
+            first_digit = 1 if place == length2 - 1 else 0
+            new_mask1, new_mask2 = mask1, mask2 ^ bit
+            step_product = unit * value1
+        digits = _DIGITS[first_digit]
+        products = node.product + digits * step_product
+
+        # is_wrong_answer_mod(子, node)と同じ判定
+        alive = np.ones(len(digits), dtype=bool)
+        known1 = count_trailing_known(new_mask1)
+        known2 = count_trailing_known(new_mask2)
+        checked1 = count_trailing_known(mask1)
+        checked2 = count_trailing_known(mask2)
+        if known1 != checked1 or new_mask2 != mask2:
+            product_line = self.product_line
+            reliable_digit = min(known1, known2, product_line.known_suffix)
+            if reliable_digit > min(checked1, checked2, product_line.known_suffix):
+                alive &= self._suffix_matches(products, product_line, reliable_digit)
+
+            for i, line in enumerate(self.intermediate_lines):
+                if new_mask2 >> i & 1:
+                    continue
+                reliable_digit = min(known1, line.known_suffix)
+                checked_digit = 0 if mask2 >> i & 1 else min(checked1, line.known_suffix)
+                if reliable_digit <= checked_digit:
+                    continue
+                if line_number == 1:
+                    partials = self.partial(node, i) + digits * (
+                        unit * (value2 // pow10[i] % 10))
+                elif i == place:
+                    partials = digits * value1
+                else:
+                    partials = self.partial(node, i)
+                alive &= self._suffix_matches(partials, line, reliable_digit)
+        pruned_mod = len(digits) - int(np.count_nonzero(alive))
+
+        # is_wrong_answer_range(子)と同じ判定。数字によらない行は整数のまま判定する。
+        lead1 = pow10[self.length1 - 1] if new_mask1 >> (self.length1 - 1) else 0
+        lead2 = pow10[length2 - 1] if new_mask2 >> (length2 - 1) else 0
+        if line_number == 1:
+            values1 = value1 + digits * unit
+            min1, max1 = values1 + lead1, values1 + self.nines(new_mask1)
+            min2, max2 = value2 + lead2, value2 + self.nines(new_mask2)
+            # 各行の条件 max1 * digit_max >= line.min, min1 * digit_min <= line.max を
+            # max1 >= lower, min1 <= upper にまとめる
+            lower = -(-self.product_min // max2) if max2 else 0
+            upper = self.product_max // min2 if min2 else None
+            wrong_all = not max2 and self.product_min > 0
+            for i, line in enumerate(self.intermediate_lines):
+                if new_mask2 >> i & 1:
+                    digit_min = 1 if i == length2 - 1 else 0
+                    digit_max = 9
+                else:
+                    digit_min = digit_max = value2 // pow10[i] % 10
+                if digit_max:
+                    lower = max(lower, -(-line.min // digit_max))
+                elif line.min > 0:
+                    wrong_all = True
+                if digit_min and (upper is None or line.max // digit_min < upper):
+                    upper = line.max // digit_min
+            wrong = max1 < lower
+            if upper is not None:
+                wrong |= min1 > upper
+        else:
+            values2 = value2 + digits * unit
+            min1, max1 = value1 + lead1, value1 + self.nines(new_mask1)
+            min2, max2 = values2 + lead2, values2 + self.nines(new_mask2)
+            wrong = (max1 * max2 < self.product_min) | (min1 * min2 > self.product_max)
+            wrong_all = False
+            for i, line in enumerate(self.intermediate_lines):
+                if i == place:
+                    wrong |= (max1 * digits < line.min) | (min1 * digits > line.max)
+                    continue
+                if new_mask2 >> i & 1:
+                    digit_min = 1 if i == length2 - 1 else 0
+                    digit_max = 9
+                else:
+                    digit_min = digit_max = value2 // pow10[i] % 10
+                if max1 * digit_max < line.min or min1 * digit_min > line.max:
+                    wrong_all = True
+        if wrong_all:
+            wrong = np.ones(len(digits), dtype=bool)
+        pruned_range = int(np.count_nonzero(alive & wrong))
+        alive &= ~wrong
+
+        # 残った子だけノードにする
+        visited = self.visited
+        check_column = self.column_layout is not None
+        children = []
+        pruned_column = 0
+        if line_number == 1:
+            step_partials = unit * spread_digits(value2, self.partial_base)
+        else:
+            step_partials = self.partial_shift[place] * value1
+        for digit, product in zip(digits[alive].tolist(), products[alive].tolist()):
+            if line_number == 1:
+                child = SearchNode(value1 + digit * unit, new_mask1, value2, new_mask2,
+                                   product, node.partials + digit * step_partials)
+            else:
+                child = SearchNode(value1, new_mask1, value2 + digit * unit, new_mask2,
+                                   product, node.partials + digit * step_partials)
+            if child in visited:
+                continue
+            if check_column and self.is_wrong_answer_column(child):
+                visited.add(child)
+                pruned_column += 1
+                continue
+            children.append(child)
+        return [], children, pruned_mod, pruned_range, pruned_column, 0
+
+    def _suffix_matches(self, values, line: _LinePattern, reliable_digit):
+        """_matches_suffixの配列版。"""
+        if reliable_digit == math.inf:
+            return values == line.suffix_value
+        modulus = self.pow10[reliable_digit]
+        return values % modulus == line.suffix_value % modulus
+
+    def multiplier_star_place(self, node: SearchNode) -> Tuple[int, int]:
+        """
+        乗数の*のうち、find_star_placeと同じ優先順位で次に埋めるものを選ぶ。
+
+        Returns:
+            Tuple[int, int]: (2, 位)。乗数に*が無い場合は(0, -1)。
+        """
+        mask = node.mask2
+        if not mask:
+            return (0, -1)
+        first = mask.bit_length() - 1
+        last = (mask & -mask).bit_length() - 1
+        if last < self.length2 - 1 - first:
+            return (2, last)
+        return (2, first)
+
+    def divide_multiplicand(self, node: SearchNode) -> Optional[List[SearchNode]]:
+        """
+        乗数が全て埋まったノードについて、被乗数の候補を割り算で求める。
+
+        中間結果の行iは被乗数と乗数の下からi桁目dの積なので、行iの*を全て埋めたもののうち
+        dで割り切れて商が被乗数の文字列と一致するものが、被乗数の候補になる。
+        *の埋め方がdivision_limit以下の全ての行について候補を求め、その共通部分を返す。
+        行と数字の組ごとの候補は、同じ被乗数の文字列に対して一度だけ求める。
+
+        Args:
+            node (SearchNode): 乗数に*が無いノード
+
+        Returns:
+            Optional[List[SearchNode]]: 被乗数の候補を埋めた葉のリスト(被乗数の小さい順)。
+                候補を求められる行が無い場合はNone。
+        """
+        value1, mask1, value2 = node.value1, node.mask1, node.value2
+        limit = min(count_completions(mask1, self.length1), self.options.division_limit + 1)
+        candidates = None
+        for i, line in enumerate(self.intermediate_lines):
+            digit = value2 // self.pow10[i] % 10
+            if not digit or count_completions(line.mask, line.length) >= limit:
+                continue
+            key = (i, digit, value1, mask1)
+            quotients = self._quotients.get(key)
+            if quotients is None:
+                quotients = self._quotients[key] = frozenset(
+                    self._divide(line, digit, value1, mask1))
+            candidates = quotients if candidates is None else candidates & quotients
+        if candidates is None:
+            product_line = self.product_line
+            if not value2 or count_completions(product_line.mask, product_line.length) >= limit:
+                return None
+            # 掛け算の結果は乗数全体で割る。乗数ごとに違うので覚えておかない。
+            candidates = self._divide(product_line, value2, value1, mask1)
+
+        spread2 = spread_digits(value2, self.partial_base)
+        return [
+            SearchNode(value, 0, value2, 0, value * value2, value * spread2)
+            for value in sorted(candidates)
+        ]
+
+    def _divide(
+        self, line: _LinePattern, divisor: int, value1: int, mask1: int
+    ) -> List[int]:
+        """lineの*を埋めてdivisorで割り切れる数のうち、商が被乗数(value1, mask1)と一致するものの商。"""
+        length1 = self.length1
+        star_units = []
+        rest = mask1
+        while rest:
+            low_bit = rest & -rest
+            star_units.append(self.pow10[low_bit.bit_length() - 1])
+            rest ^= low_bit
+        lower = self.pow10[length1 - 1] if mask1 >> (length1 - 1) & 1 else 0
+        upper = self.pow10[length1]
+
+        quotients = []
+        for value in pattern_completions(line.value, line.mask, line.length):
+            quotient, remainder = divmod(value, divisor)
+            if remainder or not lower <= quotient < upper:
+                continue
+            # *の位を0にすると埋まっている桁だけが残る
+            known = quotient
+            for unit in star_units:
+                known -= quotient // unit % 10 * unit
+            if known == value1:
+                quotients.append(quotient)
+        return quotients
+
+    def _expand_ordering(
+        self, node: SearchNode
+    ) -> Tuple[List[SearchNode], List[SearchNode], int, int, int, int]:
+        """orderingに従って次の*を選び、_filter_candidatesと同じ結果を返す。"""
+        remaining = node.mask1 | node.mask2
+        if self.options.ordering == "mrv" and remaining & (remaining - 1):
+            # *が2つ以上残っている場合、枝切りされずに残る数字が最も少ない*を埋める
+            best = None
+            for star_place in self.open_places(node):
+                result = self._filter_place(node, star_place)
+                if best is None or len(result[1]) < len(best[1]):
+                    best = result
+                if not result[1]:
+                    # この*に入れられる数字が無いので、このノードの先に解は無い
+                    break
+            return best
+        # "****" -> "***0", "***1", "***2", "***3", "***4", "***5", "***6", "***7", "***8", "***9"
+        return self._filter_place(node)
+
+    def _expand_multiplier_first(
+        self, node: SearchNode
+    ) -> Optional[Tuple[List[SearchNode], List[SearchNode], int, int, int, int]]:
+        """
+        engine="multiplier_first"の展開。乗数に*があればそれを埋め、無ければ被乗数の候補を割り算で求める。
+        割り算で求められない場合はNoneを返し、orderingに従って展開する。
+        """
+        if node.mask2:
+            return self._filter_place(node, self.multiplier_star_place(node))
+        leaves = self.divide_multiplicand(node)
+        if leaves is None:
+            return None
+        self.stats.nodes_divided += 1
+        return self._filter_candidates(node, leaves)
+
+    def expand(self, node: SearchNode) -> Tuple[List[SearchNode], List[SearchNode]]:
+        """
+        ノードを展開する。
+
+        Args:
+            node (SearchNode): *を含むノード
+
+        Returns:
+            Tuple[List[SearchNode], List[SearchNode]]: (正解だった葉, スタックに積む子) のタプル。
+                子は葉だけか葉以外だけのどちらかになる。
+        """
+        stats = self.stats
+        if not node.mask1 and not node.mask2:
+            # preprocessで全ての*が埋まった根は、そのまま検証する
+            stats.leaves_verified += 1
+            solutions = [node] if self.is_correct_answer(node) else []
+            stats.solutions += len(solutions)
+            return solutions, []
+
+        best = None
+        if self.options.engine == "multiplier_first":
+            best = self._expand_multiplier_first(node)
+        if best is None:
+            best = self._expand_ordering(node)
+        (solutions, children, pruned_mod, pruned_range, pruned_column,
+         leaves_verified) = best
+
+        if self.options.nogood_cache and self.suffix_digits:
+            survivors = [
+                child for child in children if not self.is_wrong_answer_suffix(child)]
+            stats.pruned_suffix += len(children) - len(survivors)
+            children = survivors
+        if self.options.prefix_bounds:
+            survivors = [
+                child for child in children if not self.is_wrong_answer_prefix(child)]
+            stats.pruned_prefix += len(children) - len(survivors)
+            children = survivors
+
+        stats.nodes_expanded += 1
+        stats.pruned_mod += pruned_mod
+        stats.pruned_range += pruned_range
+        stats.pruned_column += pruned_column
+        stats.leaves_verified += leaves_verified
+        stats.solutions += len(solutions)
+        return solutions, children
+
+    def reset(self, nodes: List[SearchNode]) -> None:
+        """探索をやり直す。nodesを根とする部分木を、リストの先頭から順に探索する。"""
+        self.stack = list(reversed(nodes))
+        self.visited = self._new_visited()
+        self.counter = 0
+
+    def _new_visited(self):
+        """options.visitedに従って、探索済みのノードを覚える入れ物を作る。"""
+        if self.options.visited == "table":
+            return _VisitedTable(self.options.visited_table_size)
+        if self.options.visited == "none":
+            return _NoVisited()
+        return _VisitedSet()
+
+    def explored_fraction(self) -> float:
+        """
+        探索し終えた割合の見積もり。スタックに残っている部分木の根の*を全て埋める方法の数を、
+        根の*を全て埋める方法の数で割ったものを1から引く。枝切りした部分木は探索し終えたものに含める。
+        """
+        if not self.stack:
+            return 1.0
+
+        def completions(node: SearchNode) -> int:
+            return count_completions(node.mask1, self.length1) * count_completions(
+                node.mask2, self.length2)
+
+        remaining = sum(completions(node) for node in self.stack)
+        return max(0.0, 1 - remaining / completions(self.root))
+
+    def run(
+        self,
+        verbose: bool = False,
+        max_nodes: Optional[int] = None,
+        deadline: Optional[float] = None,
+        cancel: Optional[CancellationToken] = None,
+    ) -> Iterator[SearchNode]:
+        """
+        深さ優先探索を行い、正解のノードを見つけた順に返す。
+
+        max_nodes、deadline、cancelのいずれかで探索を止めた場合は、その理由("max_nodes"、
+        "timeout"、"cancelled")をinterruptedに入れる。最後まで探索した場合はNoneになる。
+        stackには未探索の部分木の根が残るので、もう一度runを呼ぶと続きから探索する。
+
+        Args:
+            verbose (bool): Trueなら取り出したノードを毎回表示する。
+            max_nodes (Optional[int]): スタックから取り出すノード数の上限(これまでのrunの分も含む)。
+            deadline (Optional[float]): time.monotonic()の値で表した期限。
+            cancel (Optional[CancellationToken]): 取り消されたら探索を止める。
+                deadlineとcancelは_CHECK_INTERVALノードごとに調べる。
+
+        Yields:
+            SearchNode: 正解のノード
+        """
+        stack = self.stack
+        stats = self.stats
+        self.interrupted = None
+        check = deadline is not None or cancel is not None
+        started = time.perf_counter()
+        try:
+            while stack:
+                if max_nodes is not None and self.counter >= max_nodes:
+                    self.interrupted = "max_nodes"
+                    return
+                if check and self.counter % _CHECK_INTERVAL == 0:
+                    if cancel is not None and cancel.cancelled:
+                        self.interrupted = "cancelled"
+                        return
+                    if deadline is not None and time.monotonic() >= deadline:
+                        self.interrupted = "timeout"
+                        return
+                node = stack.pop()
+                if verbose:
+                    print(
+                        f"counter:{self.counter},node:{self.decode(node)},len(stack):{len(stack)}")
+                self.counter += 1
+                if node in self.visited:
+                    continue
+                self.visited.add(node)
+
+                solutions, children = self.expand(node)
+                for solution in solutions:
+                    # 呼び出し側で止まっている間は時間に含めない
+                    stats.wall_time += time.perf_counter() - started
+                    started = None  # yield中に閉じられた場合、finallyで足さない
+                    yield solution
+                    started = time.perf_counter()
+                stack.extend(children)
+                if len(stack) > stats.max_stack_depth:
+                    stats.max_stack_depth = len(stack)
+                memory = len(stack) * self.node_bytes + self.visited.memory(self.node_bytes)
+                if memory > stats.peak_memory:
+                    stats.peak_memory = memory
+        finally:
+            if started is not None:
+                stats.wall_time += time.perf_counter() - started
+
+
+def _write_digits(line: str, value: int, places: range) -> str:
+    """lineの下からplacesの位を、valueのその位の数字で埋める。埋まっている数字と合わない場合はValueError。"""
+    chars = list(line)
+    domains = digit_domains(line)
+    for place in places:
+        digit = value // 10**place % 10
+        if not domains[place] >> digit & 1:
+            raise ValueError("Error: no answer")
+        chars[len(line) - 1 - place] = str(digit)
+    return "".join(chars)
+
+
+def _write_prefix(line: str, lower: int, upper: int) -> str:
+    """lineが取りうる値がlower以上upper以下のとき、lowerとupperで共通する上の桁を埋める。"""
+    line_min, line_max = make_min_max(line)
+    lower, upper = max(lower, line_min), min(upper, line_max)
+    if lower > upper:
+        raise ValueError("Error: no answer")
+    lower_str, upper_str = str(lower), str(upper)
+    if len(lower_str) != len(line) or len(upper_str) != len(line):
+        return line
+    common = 0
+    while common < len(line) and lower_str[common] == upper_str[common]:
+        common += 1
+    return _write_digits(line, lower, range(len(line) - common, len(line)))
+
+
+def _forced_operand_digits(search: "DepthFirstSearch") -> Tuple[str, str]:
+    """
+    被乗数と乗数の*それぞれに0-9を入れてみて、枝切りされない数字が一つだけならその数字で埋める。
+    どの数字も枝切りされる*があれば、解は無い。
+    """
+    root = search.root
+    lines = [list(line) for line in search.decode(root)]
+    for line_number, place in search.open_places(root):
+        survivors = []
+        for candidate in search.next_node_candidates(root, (line_number, place)):
+            if not candidate.mask1 and not candidate.mask2:
+                wrong = not search.is_correct_answer(candidate)
+            else:
+                wrong = (search.is_wrong_answer_mod(candidate)
+                         or search.is_wrong_answer_range(candidate)
+                         or search.is_wrong_answer_prefix(candidate)
+                         or search.is_wrong_answer_column(candidate))
+            if not wrong:
+                survivors.append(candidate)
+        if not survivors:
+            raise ValueError("Error: no answer")
+        if len(survivors) == 1:
+            value = survivors[0].value1 if line_number == 1 else survivors[0].value2
+            line = lines[line_number - 1]
+            line[len(line) - 1 - place] = str(value // 10**place % 10)
+    return "".join(lines[0]), "".join(lines[1])
+
+
+def preprocess_puzzle(
+    multiple_line1: str,
+    multiple_line2: str,
+    intermediate_lines: List[str],
+    product_line: str,
+) -> Tuple[str, str, List[str], str]:
+    """
+    探索の前に、数字が一つに決まる*をその数字で埋める。次の規則を、埋まる*が無くなるまで繰り返し適用する。
+
+    1. 筆算の足し算を列ごとに調べる(propagate_columns)。
+    2. 被乗数と乗数の*に0-9を入れてみて、mod 10^n・値の範囲・上の桁・列ごとの足し算の検査に
+       通る数字が一つだけならその数字で埋める。中間結果の桁数が被乗数より短ければ乗数の桁は0に、
+       下の桁同士の積から一の位が決まらない数字は除かれる、といった規則はこの検査で扱える。
+    3. 被乗数の下k桁と乗数の桁が決まっている行は、中間結果の下k桁を埋める。掛け算の結果も同様。
+    4. 被乗数と乗数が取りうる範囲から求めた中間結果と掛け算の結果の範囲で、最小値と最大値に共通する上の桁を埋める。
+
+    Args:
+        multiple_line1 (str): 掛けられる数を表す文字列。
+        multiple_line2 (str): 掛ける数を表す文字列。
+        intermediate_lines (List[str]): 掛け算の中間結果を表す文字列のリスト。
+        product_line (str): 掛け算の結果を表す文字列。
+
+    Returns:
+        Tuple[str, str, List[str], str]: *を埋めた(被乗数, 乗数, 中間結果, 掛け算の結果)のタプル。
+            解の集合は入力と変わらない。
+
+    Raises:
+        ValueError: 入力に誤りがある場合、解が無いと分かった場合。
+    """
+    validate_input(multiple_line1, multiple_line2, intermediate_lines, product_line)
+    puzzle = (multiple_line1, multiple_line2, list(intermediate_lines), product_line)
+    while True:
+        intermediate_lines, product_line = propagate_columns(puzzle[2], puzzle[3])
+        search = DepthFirstSearch(
+            puzzle[0], puzzle[1], intermediate_lines, product_line,
+            options=SearchOptions(column_propagation=True),
+        )
+        multiple_line1, multiple_line2 = _forced_operand_digits(search)
+
+        root = search.root
+        value1, mask1, value2, mask2 = root.key()
+        known1 = count_trailing_known(mask1)
+        min1, max1 = make_min_max(multiple_line1)
+        for i, line in enumerate(intermediate_lines):
+            if mask2 >> i & 1:
+                continue
+            digit = value2 // 10**i % 10
+            partial = search.partial(root, i)
+            line = _write_digits(line, partial, range(min(known1, len(line))))
+            intermediate_lines[i] = _write_prefix(line, min1 * digit, max1 * digit)
+        known_product = min(known1, count_trailing_known(mask2), len(product_line))
+        product_line = _write_digits(product_line, root.product, range(known_product))
+        min2, max2 = make_min_max(multiple_line2)
+        product_line = _write_prefix(product_line, min1 * min2, max1 * max2)
+
+        next_puzzle = (multiple_line1, multiple_line2, intermediate_lines, product_line)
+        if next_puzzle == puzzle:
+            return next_puzzle
+        puzzle = next_puzzle
+
+
 def solver(
     multiple_line1: str,
     multiple_line2: str,
     intermediate_lines: List[str],
     product_line: str,
+    verbose: bool = False,
+    stats: Optional[SearchStats] = None,
+    options: Optional[SearchOptions] = None,
+    max_nodes: Optional[int] = None,
+    timeout: Optional[float] = None,
+    cancel: Optional[CancellationToken] = None,
 ):
     """与えられた虫食い算を解く。
 
@@ -371,90 +2323,339 @@ def solver(
         multiple_line2 (str): 掛ける数を表す文字列。数字と*のみからなる。
         intermediate_lines (List[str]): 掛け算の中間結果を表す文字列のリスト。0の場合は0と表す。数字と*のみからなる。
         product_line (str): 掛け算の結果を表す文字列。数字と*のみからなる。
+        verbose (bool): Trueなら入力、探索中のノード、答えを表示する。
+        stats (Optional[SearchStats]): 与えた場合、探索の統計を書き込む。
+        options (Optional[SearchOptions]): 探索の方法。Noneなら既定の設定。
+        max_nodes (Optional[int]): 探索するノード数の上限。
+        timeout (Optional[float]): 探索する時間の上限(秒)。
+        cancel (Optional[CancellationToken]): 別のスレッドから取り消すための目印。
 
     Returns:
         Tuple[str, str]: 掛けられる数と掛ける数をタプルで返す。
 
     Raises:
         ValueError: 掛ける数の桁数と中間結果の数が一致していない場合、解が見つからない場合。
+        SearchInterrupted: 解が見つかる前にmax_nodes、timeoutの上限に達したか、取り消された場合。
     """
-    print(f"{multiple_line1}")
-    print(f"{multiple_line2}")
-    print(f"intermediate:")
-    for line in intermediate_lines:
-        print(f"{line}")
-    print(f"product:")
-    print(f"{product_line}")
-
-    validate_input(multiple_line1, multiple_line2,
-                   intermediate_lines, product_line)
-
-    intermediate_lines_min_max = [make_min_max(
-        line) for line in intermediate_lines]
-    product_line_min_max = make_min_max_product_line(
-        product_line, intermediate_lines_min_max
+    if verbose:
+        print(f"{multiple_line1}")
+        print(f"{multiple_line2}")
+        print("intermediate:")
+        for line in intermediate_lines:
+            print(f"{line}")
+        print("product:")
+        print(f"{product_line}")
+
+    deadline = _deadline(timeout)
+    search = DepthFirstSearch(
+        multiple_line1, multiple_line2, intermediate_lines, product_line, stats, options
     )
 
-    intermediate_lines_regex = [convert_to_regex(
-        line) for line in intermediate_lines]
-    product_line_regex = convert_to_regex(product_line)
-
-    visited = set()
-    stack = [(multiple_line1, multiple_line2)]
-    counter = 0
-    while stack:
-        node = stack.pop()
-        if counter % 1 == 0:
-            print(f"counter:{counter},node:{node},len(stack):{len(stack)}")
-        counter += 1
-        if node in visited:
-            continue
-        visited.add(node)
+    for node in search.run(verbose, max_nodes, deadline, cancel):
+        answer = search.decode(node)
+        if verbose:
+            print(f"Answer: {answer}")
 
-        # "****" -> "***0", "***1", "***2", "***3", "***4", "***5", "***6", "***7", "***8", "***9"
-        next_node_candidates = get_next_node_candidates(node)
+            for ans2_char in reversed(answer[1]):
+                print(f"intermediate:{int(answer[0]) * int(ans2_char)}")
+            print(f"product:{int(answer[0]) * int(answer[1])}")
+            print(f"visited:{len(search.visited)}")
 
-        for candidate in next_node_candidates:
-            if candidate in visited:
-                continue
+        return answer
+    if verbose:
+        print(f"visited:{len(search.visited)}")
+    _raise_if_interrupted(search)
+    raise ValueError("Error: no answer")
 
-            # 全部埋まったらチェック
-            if "*" not in candidate[0] and "*" not in candidate[1]:
-                if is_correct_answer(
-                    candidate, intermediate_lines_regex, product_line_regex
-                ):
-                    answer = candidate
-                    print(f"Answer: {answer}")
 
-                    for ans2_char in reversed(answer[1]):
-                        print(
-                            f"intermediate:{int(answer[0]) * int(ans2_char)}")
-                    print(f"product:{int(answer[0]) * int(answer[1])}")
-                    print(f"visited:{len(visited)}")
-                    visited.add(candidate)
+def _deadline(timeout: Optional[float]) -> Optional[float]:
+    """timeout秒後をtime.monotonic()の値で返す。"""
+    if timeout is None:
+        return None
+    if timeout < 0:
+        raise ValueError("Error: timeout should be 0 or more")
+    return time.monotonic() + timeout
 
-                    return candidate
-                else:
-                    # wrong answer
-                    visited.add(candidate)
-                    continue
 
-            # 枝切り用
-            if is_wrong_answer_mod(candidate, intermediate_lines, product_line):
-                # print(f"wrong answer mod:{candidate}")
-                visited.add(candidate)
-                continue
+def _raise_if_interrupted(search: DepthFirstSearch) -> None:
+    if search.interrupted is not None:
+        raise SearchInterrupted(search.interrupted, search.stats, search.explored_fraction())
 
-            if is_wrong_answer_range(
-                candidate, intermediate_lines_min_max, product_line_min_max
-            ):
-                visited.add(candidate)
-                # print(f"wrong answer range:{candidate}")
-                continue
 
-            stack.append(candidate)
-    print(f"visited:{len(visited)}")
-    raise ValueError("Error: no answer")
+def iter_solutions(
+    multiple_line1: str,
+    multiple_line2: str,
+    intermediate_lines: List[str],
+    product_line: str,
+    limit: Optional[int] = None,
+    stats: Optional[SearchStats] = None,
+    options: Optional[SearchOptions] = None,
+    max_nodes: Optional[int] = None,
+    timeout: Optional[float] = None,
+    cancel: Optional[CancellationToken] = None,
+) -> Iterator[Tuple[str, str]]:
+    """与えられた虫食い算の解を、solverと同じ深さ優先探索の順に全て返す。
+
+    解は見つかった時点で一つずつ返すので、必要な数だけ取り出せば残りの探索は行わない。
+
+    Args:
+        multiple_line1 (str): 掛けられる数を表す文字列。数字と*のみからなる。
+        multiple_line2 (str): 掛ける数を表す文字列。数字と*のみからなる。
+        intermediate_lines (List[str]): 掛け算の中間結果を表す文字列のリスト。0の場合は0と表す。数字と*のみからなる。
+        product_line (str): 掛け算の結果を表す文字列。数字と*のみからなる。
+        limit (Optional[int]): 返す解の最大数。Noneなら全て返す。
+        stats (Optional[SearchStats]): 与えた場合、探索の統計を書き込む。
+        options (Optional[SearchOptions]): 探索の方法。Noneなら既定の設定。
+        max_nodes (Optional[int]): 探索するノード数の上限。
+        timeout (Optional[float]): 呼び出してからの時間の上限(秒)。解を取り出さずに止まっている間も含む。
+        cancel (Optional[CancellationToken]): 別のスレッドから取り消すための目印。
+
+    Yields:
+        Tuple[str, str]: 掛けられる数と掛ける数のタプル。最初に返すものは、同じoptionsを与えたsolverの戻り値と同じ。
+
+    Raises:
+        ValueError: 掛ける数の桁数と中間結果の数が一致していない場合など、入力に誤りがある場合。
+        SearchInterrupted: 全ての解(limit個)を返す前にmax_nodes、timeoutの上限に達したか、取り消された場合。
+            それまでに見つかった解は返し終えている。
+    """
+    # 入力の誤りは、最初の解を取り出すときではなく呼び出した時点で送出する
+    deadline = _deadline(timeout)
+    search = DepthFirstSearch(
+        multiple_line1, multiple_line2, intermediate_lines, product_line, stats, options
+    )
+    return _decode_solutions(search, limit, max_nodes, deadline, cancel)
+
+
+def _decode_solutions(
+    search: DepthFirstSearch,
+    limit: Optional[int],
+    max_nodes: Optional[int] = None,
+    deadline: Optional[float] = None,
+    cancel: Optional[CancellationToken] = None,
+) -> Iterator[Tuple[str, str]]:
+    if limit is not None and limit <= 0:
+        return
+    for count, node in enumerate(search.run(False, max_nodes, deadline, cancel), 1):
+        yield search.decode(node)
+        if count == limit:
+            return
+    _raise_if_interrupted(search)
+
+
+def solve_all(
+    multiple_line1: str,
+    multiple_line2: str,
+    intermediate_lines: List[str],
+    product_line: str,
+    limit: Optional[int] = None,
+    stats: Optional[SearchStats] = None,
+    options: Optional[SearchOptions] = None,
+    max_nodes: Optional[int] = None,
+    timeout: Optional[float] = None,
+    cancel: Optional[CancellationToken] = None,
+) -> List[Tuple[str, str]]:
+    """iter_solutionsの結果をリストで返す。解が無い場合は空のリストを返す。"""
+    return list(
+        iter_solutions(
+            multiple_line1,
+            multiple_line2,
+            intermediate_lines,
+            product_line,
+            limit,
+            stats,
+            options,
+            max_nodes,
+            timeout,
+            cancel,
+        )
+    )
+
+
+def count_solutions(
+    multiple_line1: str,
+    multiple_line2: str,
+    intermediate_lines: List[str],
+    product_line: str,
+    limit: Optional[int] = None,
+    stats: Optional[SearchStats] = None,
+    options: Optional[SearchOptions] = None,
+    max_nodes: Optional[int] = None,
+    timeout: Optional[float] = None,
+    cancel: Optional[CancellationToken] = None,
+) -> int:
+    """解の数を数える。
+
+    limitを与えるとその数だけ見つけた時点で探索を打ち切る。
+    例えば解が一意かどうかは count_solutions(..., limit=2) == 1 で判定できる。
+
+    Returns:
+        int: 解の数。limitを与えた場合はlimit以下。
+
+    Raises:
+        SearchInterrupted: 数え終わる前に止めた場合。それまでに見つかった数はstats.solutions。
+    """
+    return sum(
+        1
+        for _ in iter_solutions(
+            multiple_line1,
+            multiple_line2,
+            intermediate_lines,
+            product_line,
+            limit,
+            stats,
+            options,
+            max_nodes,
+            timeout,
+            cancel,
+        )
+    )
+
+
+def _digits(domain: int) -> List[int]:
+    return [digit for digit in range(10) if domain >> digit & 1]
+
+
+def _exact_range(line: str) -> Tuple[int, int]:
+    """行の文字列に一致する数(先頭に0を付けない表記)の範囲。2桁以上で先頭が0の行では、最小値が最大値を超える。"""
+    low, high = make_min_max(line)
+    if len(line) > 1:
+        low = max(low, 10 ** (len(line) - 1))
+    return low, high
+
+
+def _fixed_places(line: str) -> dict:
+    """行の数字が決まっている位 -> その数字の集合(ビットdが数字dに対応する)。"""
+    return {len(line) - 1 - i: 1 << int(char) for i, char in enumerate(line) if char != "*"}
+
+
+def _multiplicand_range(value: int, low: int, high: int) -> Tuple[int, int]:
+    """value倍がlow以上high以下になる被乗数の範囲。無ければ最小値が最大値を超える。"""
+    if value == 0:
+        return (0, math.inf) if low <= 0 <= high else (1, 0)
+    return -(-low // value), high // value
+
+
+def count_solutions_dp(
+    multiple_line1: str,
+    multiple_line2: str,
+    intermediate_lines: List[str],
+    product_line: str,
+) -> int:
+    """
+    解を列挙せずに、解の数を数える。
+
+    被乗数を下の位から1桁ずつ決めながら筆算を進め、状態が同じになる被乗数の下の桁をまとめて数える。
+    乗数の全ての埋め方を最初の状態とし、違う乗数から来た状態もまとめる。
+
+    各行と積の桁数は、乗数ごとに被乗数の範囲[lo, hi]に直し、状態には被乗数の下の桁がloとhiの下の桁より
+    大きいか小さいかだけを持つ。状態に持つ乗数の桁と繰り上がりは、それより上の位に数字が決まっている桁が
+    残っている行(と積)のものだけなので、*ばかりの行は状態を増やさない。
+    状態は(loとhiの残りの桁, 比べた結果, 数字が残っている行の(乗数の桁, 繰り上がり), 積の(乗数, 繰り上がり))で、
+    数字が決まっている桁を全て過ぎると乗数は状態から消え、違う乗数の状態が一つにまとまる。
+    数える解はcount_solutionsと同じ。
+
+    Args:
+        multiple_line1 (str): 掛けられる数を表す文字列。数字と*のみからなる。
+        multiple_line2 (str): 掛ける数を表す文字列。数字と*のみからなる。
+        intermediate_lines (List[str]): 掛け算の中間結果を表す文字列のリスト。
+        product_line (str): 掛け算の結果を表す文字列。
+
+    Returns:
+        int: 解の数
+
+    Raises:
+        ValueError: 入力に誤りがある場合。
+    """
+    validate_input(multiple_line1, multiple_line2, intermediate_lines, product_line)
+    length1 = len(multiple_line1)
+    digits1 = [_digits(domain) for domain in digit_domains(multiple_line1)]
+    min1, max1 = make_min_max(multiple_line1)
+    row_ranges = [_exact_range(line) for line in intermediate_lines]
+    product_range = _exact_range(product_line)
+    row_fixed = [_fixed_places(line) for line in intermediate_lines]
+    product_fixed = _fixed_places(product_line)
+    # 位jを決めるときに、まだ数字が決まっている桁が残っている行
+    row_last = [max(fixed, default=-1) for fixed in row_fixed]
+    pending = [[i for i, last in enumerate(row_last) if last >= j] for j in range(length1 + 1)]
+    product_last = max(product_fixed, default=-1)
+
+    # 中間結果の桁数が合わない乗数の数字は先に除く
+    multiplier_digits = [
+        [digit for digit in _digits(domain)
+         if max(min1, _multiplicand_range(digit, *row_range)[0])
+         <= min(max1, _multiplicand_range(digit, *row_range)[1])]
+        for domain, row_range in zip(digit_domains(multiple_line2), row_ranges)
+    ]
+
+    states = defaultdict(int)
+    # multiplierは乗数の下の位から並べた数字
+    for multiplier in itertools.product(*multiplier_digits):
+        value2 = sum(digit * 10**place for place, digit in enumerate(multiplier))
+        lo, hi = _multiplicand_range(value2, *product_range)
+        lo, hi = max(lo, min1), min(hi, max1)
+        for digit, row_range in zip(multiplier, row_ranges):
+            low, high = _multiplicand_range(digit, *row_range)
+            lo, hi = max(lo, low), min(hi, high)
+        if lo > hi:
+            continue
+        rows = tuple((multiplier[i], 0) for i in pending[0])
+        product = (value2, 0) if product_last >= 0 else None
+        states[(lo, hi, True, True, rows, product)] += 1
+
+    for j, digits in enumerate(digits1):
+        checks = [row_fixed[i].get(j) for i in pending[j]]
+        keep = [pending[j].index(i) for i in pending[j + 1]]
+        product_check = product_fixed.get(j)
+        keep_product = product_last > j
+        # 行の(乗数の桁, 繰り上がり) -> 数字が決まっている桁が合う(被乗数の数字, 次の行の状態)のリスト
+        moves = {}
+        next_states = defaultdict(int)
+        for (lo, hi, lo_ok, hi_ok, rows, product), count in states.items():
+            if rows not in moves:
+                moves[rows] = []
+                for digit1 in digits:
+                    new_rows = []
+                    for (digit2, carry), check in zip(rows, checks):
+                        partial = digit1 * digit2 + carry
+                        if check is not None and not check >> (partial % 10) & 1:
+                            break
+                        new_rows.append((digit2, partial // 10))
+                    else:
+                        moves[rows].append((digit1, tuple(new_rows[k] for k in keep)))
+            lo_digit, lo_rest = lo % 10, lo // 10
+            hi_digit, hi_rest = hi % 10, hi // 10
+            for digit1, new_rows in moves[rows]:
+                new_product = None
+                if product is not None:
+                    value = digit1 * product[0] + product[1]
+                    if product_check is not None and not product_check >> (value % 10) & 1:
+                        continue
+                    if keep_product:
+                        new_product = (product[0], value // 10)
+                # 被乗数の下の桁が、loの下の桁以上か、hiの下の桁以下か
+                new_lo_ok = digit1 > lo_digit or (digit1 == lo_digit and lo_ok)
+                new_hi_ok = digit1 < hi_digit or (digit1 == hi_digit and hi_ok)
+                next_states[(lo_rest, hi_rest, new_lo_ok, new_hi_ok, new_rows, new_product)] += count
+        states = next_states
+
+    # 被乗数より上の位の数字は、最後の繰り上がりの数字
+    total = 0
+    for (lo, hi, lo_ok, hi_ok, rows, product), count in states.items():
+        if not (lo_ok and hi_ok) or lo or hi:
+            continue
+        carries = [carry for _, carry in rows]
+        if product is not None:
+            carries.append(product[1])
+        fixed = [row_fixed[i] for i in pending[length1]]
+        if product is not None:
+            fixed.append(product_fixed)
+        if all(
+            domain >> (carry // 10 ** (place - length1) % 10) & 1
+            for carry, places in zip(carries, fixed)
+            for place, domain in places.items() if place >= length1
+        ):
+            total += count
+    return total
 
 
 if __name__ == "__main__":
@@ -463,18 +2664,21 @@ if __name__ == "__main__":
     intermediate_lines = ["66****", "6*****", "**666**", "**6**6"]
     product_line = "****66****"
 
-    solver(multiple_line_1, multiple_line_2, intermediate_lines, product_line)
+    solver(multiple_line_1, multiple_line_2,
+           intermediate_lines, product_line, verbose=True)
 
     multiple_line_1 = "2*"
     multiple_line_2 = "**"
     intermediate_lines = ["*3*", "**"]
     product_line = "*4*"
 
-    solver(multiple_line_1, multiple_line_2, intermediate_lines, product_line)
+    solver(multiple_line_1, multiple_line_2,
+           intermediate_lines, product_line, verbose=True)
 
     multiple_line_1 = "**1"
     multiple_line_2 = "*2*"
     intermediate_lines = ["*3**", "*4**", "*5**"]
     product_line = "6*****"
 
-    solver(multiple_line_1, multiple_line_2, intermediate_lines, product_line)
+    solver(multiple_line_1, multiple_line_2,
+           intermediate_lines, product_line, verbose=True)
@@ -0,0 +1,81 @@
+import pytest
+
+from mushikui_batch import solve_many, solve_one
+from mushikui_solver import SearchOptions
+
+PUZZLES = [
+    ("5**", "*4", ["20*8", "3**2"], "3308*"),
+    ("**7", "7*", ["***", "***"], "77**"),
+    ("***", "**", ["***", "***"], "9973"),  # 解なし
+    ("***", "*", ["***", "***"], "9973"),  # 入力の誤り
+    ("1*3", "1*4", ["4*2", "0", "1*3"], "12*92"),
+]
+EXPECTED = [
+    (("517", "64"), None),
+    (("107", "72"), None),
+    (None, "Error: no answer"),
+    (None, "Error: the length of multiple_line2 and intermediate_lines are different"),
+    (("123", "104"), None),
+]
+
+
+def test_solve_one():
+    result = solve_one(0, PUZZLES[0])
+    assert result.ok
+    assert (result.index, result.puzzle, result.answer) == (0, PUZZLES[0], ("517", "64"))
+    assert result.stats.solutions == 1
+
+    result = solve_one(2, PUZZLES[2])
+    assert result.error == "Error: no answer"
+    assert result.stats.nodes_expanded > 0
+
+    result = solve_one(3, PUZZLES[3])
+    assert not result.ok
+    assert result.answer is None
+    assert result.stats is None
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+@pytest.mark.parametrize("chunksize", [1, 2, 16])
+def test_solve_many(workers, chunksize):
+    results = list(solve_many(PUZZLES * 3, workers=workers, chunksize=chunksize))
+    assert [result.index for result in results] == list(range(len(PUZZLES) * 3))
+    assert [(result.answer, result.error) for result in results] == EXPECTED * 3
+
+
+def test_solve_many_unordered():
+    results = list(solve_many(iter(PUZZLES), workers=2, ordered=False, chunksize=1))
+    assert sorted(result.index for result in results) == list(range(len(PUZZLES)))
+    for result in results:
+        assert (result.answer, result.error) == EXPECTED[result.index]
+        assert result.puzzle == PUZZLES[result.index]
+
+
+def test_solve_many_options():
+    results = list(solve_many(PUZZLES, workers=1, options=SearchOptions(ordering="mrv")))
+    assert [(result.answer, result.error) for result in results] == EXPECTED
+
+
+def test_solve_many_invalid_chunksize():
+    with pytest.raises(ValueError):
+        list(solve_many(PUZZLES, chunksize=0))
+
+
+def test_solve_many_all_solutions():
+    many = ("*1", "**", ["**", "***"], "**1*")
+    results = list(solve_many([PUZZLES[0], many, PUZZLES[2]], workers=1, all_solutions=True))
+    assert results[0].answers == [("517", "64")]
+    assert len(results[1].answers) == results[1].stats.solutions == 12
+    assert results[1].answer == results[1].answers[0]
+    assert (results[2].answers, results[2].error) == ([], "Error: no answer")
+
+
+def test_solve_many_timeout():
+    hard = ("******", "81*8", ["*06****", "****3*0", "*58***", "*069***"], "*1*3*0*64*")
+    results = list(solve_many([hard, PUZZLES[0]], workers=2, chunksize=1, timeout=0.05))
+    assert (results[0].answer, results[0].error) == (None, "Error: search interrupted (timeout)")
+    assert results[0].stats.nodes_expanded > 0
+    assert results[1].answer == ("517", "64")
+
+    with pytest.raises(ValueError):
+        list(solve_many(PUZZLES, timeout=-1))
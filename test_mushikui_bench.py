@@ -0,0 +1,79 @@
+from mushikui_bench import (
+    BenchCase,
+    compare_results,
+    configurations,
+    main,
+    make_corpus,
+    masked_puzzle,
+    read_results,
+    run_benchmark,
+    run_case,
+    summarize,
+    write_results,
+)
+from mushikui_solver import SearchOptions, solve_all, validate_input
+
+
+def test_masked_puzzle():
+    puzzle = masked_puzzle(4, 3, 0.5, 0)
+    assert puzzle == masked_puzzle(4, 3, 0.5, 0)
+    assert puzzle != masked_puzzle(4, 3, 0.5, 1)
+    validate_input(*puzzle)
+    assert len(puzzle[0]) == 4 and len(puzzle[1]) == 3
+    # 元の掛け算は解の一つ
+    assert solve_all(*masked_puzzle(3, 2, 0.5, 0))
+    assert masked_puzzle(3, 2, 0.0, 0)[0].isdigit()
+
+
+def test_make_corpus():
+    corpus = make_corpus(2)
+    names = [case.name for case in corpus]
+    assert len(names) == len(set(names))
+    grades = {case.grade for case in corpus}
+    assert {"demo", "no_answer", "multi", "3x2/0.5", "6x4/0.6"} <= grades
+    for case in corpus:
+        validate_input(*case.puzzle)
+
+
+def test_run_case():
+    case = BenchCase("many", "multi", ("*1", "**", ["**", "***"], "**1*"))
+    record = run_case(case, SearchOptions(), None)
+    assert (record["case"], record["grade"], record["complete"]) == ("many", "multi", True)
+    assert record["solutions"] == 12
+    assert record["nodes_expanded"] > 0 and record["peak_memory"] > 0
+
+    record = run_case(case, SearchOptions(), 1)
+    assert not record["complete"]
+
+    record = run_case(BenchCase("bad", "error", ("***", "*", ["***", "***"], "9973")),
+                      SearchOptions(), None)
+    assert "error" in record
+
+
+def test_run_benchmark(tmp_path):
+    corpus = make_corpus(1)[:4]
+    configs = configurations()
+    assert {"ends", "mrv", "multiplier_first", "combined"} <= set(configs)
+    configs = {name: configs[name] for name in ("ends", "combined")}
+    results = run_benchmark(corpus, configs)
+    assert len(results) == 8
+    assert [record["config"] for record in results[:2]] == ["ends", "combined"]
+
+    path = str(tmp_path / "bench.json")
+    write_results(path, results)
+    assert read_results(path) == results
+    assert [name for name, *_ in summarize(results)] == ["ends", "combined"]
+
+    assert compare_results(results, results) == []
+    worse = [dict(record, nodes_expanded=record["nodes_expanded"] * 2 + 1) for record in results]
+    regressions = compare_results(results, worse)
+    assert len(regressions) == 8
+    assert {regression["metric"] for regression in regressions} == {"nodes_expanded"}
+
+
+def test_main(tmp_path, capsys):
+    path = str(tmp_path / "bench.json")
+    assert main(["--output", path, "--cases", "0", "--config", "ends"]) == 0
+    assert "ends" in capsys.readouterr().out
+    assert main(["--output", path, "--cases", "0", "--config", "ends", "--compare", path,
+                 "--threshold", "100"]) == 0
@@ -0,0 +1,148 @@
+import pytest
+
+import mushikui_cache
+from mushikui_cache import SolutionCache, canonical_key, order_key
+from mushikui_solver import SearchOptions
+
+PUZZLE = ("5**", "*4", ["20*8", "3**2"], "3308*")
+NO_ANSWER = ("***", "**", ["***", "***"], "9973")
+MULTI = ("*1", "**", ["**", "***"], "**1*")
+
+
+def test_canonical_key():
+    assert canonical_key("1*3", "1*4", ["4*2", "0", "1*3"], "12*92") == "1*3x1*4|4*2,0,1*3|12*92"
+    assert canonical_key(" 1*3", "1*4 ", ["4*2", " 0", "1*3"], "12*92\n") == (
+        canonical_key("1*3", "1*4", ["4*2", "0", "1*3"], "12*92"))
+    with pytest.raises(ValueError):
+        canonical_key("***", "*", ["***", "***"], "9973")
+
+
+def test_solver(monkeypatch):
+    cache = SolutionCache()
+    assert cache.solver(*PUZZLE) == ("517", "64")
+    assert (cache.stats.hits, cache.stats.misses) == (0, 1)
+
+    # 2回目は探索しない
+    monkeypatch.setattr(mushikui_cache, "solver", None)
+    assert cache.solver(*PUZZLE) == ("517", "64")
+    assert (cache.stats.hits, cache.stats.misses) == (1, 1)
+
+
+def test_no_answer():
+    cache = SolutionCache()
+    for _ in range(2):
+        with pytest.raises(ValueError, match="no answer"):
+            cache.solver(*NO_ANSWER)
+    assert cache.stats.misses == 1
+    assert cache.count_solutions(*NO_ANSWER) == 0
+    assert cache.stats.misses == 1
+
+    # 解の数が0と分かっていれば、solverも探索しない
+    cache = SolutionCache()
+    assert cache.count_solutions(*NO_ANSWER) == 0
+    with pytest.raises(ValueError, match="no answer"):
+        cache.solver(*NO_ANSWER, options=SearchOptions(ordering="mrv"))
+    assert cache.stats.misses == 1
+
+
+def test_count_solutions():
+    cache = SolutionCache()
+    # limitに達した結果は覚えない
+    assert cache.count_solutions(*MULTI, limit=2) == 2
+    assert len(cache) == 0
+    count = cache.count_solutions(*MULTI)
+    assert count > 2
+    assert cache.count_solutions(*MULTI, limit=2) == 2
+    assert cache.count_solutions(*MULTI, limit=100) == count
+    assert cache.stats.misses == 2
+
+
+def test_options():
+    cache = SolutionCache()
+    cache.solver(*MULTI)
+    # 最初に見つかる解を変えうる設定は別に覚え、枝切りだけを変える設定は同じ結果を使う
+    cache.solver(*MULTI, options=SearchOptions(ordering="mrv"))
+    cache.solver(*MULTI, options=SearchOptions(prefix_bounds=True))
+    assert (cache.stats.hits, cache.stats.misses) == (1, 2)
+
+    # division_limitはengine="multiplier_first"のときだけ解の順序を変えうる
+    assert order_key(SearchOptions(division_limit=0)) == order_key(None)
+    assert order_key(SearchOptions(engine="multiplier_first", division_limit=0)) != (
+        order_key(SearchOptions(engine="multiplier_first")))
+
+
+def test_lru():
+    cache = SolutionCache(maxsize=2)
+    cache.solver(*PUZZLE)
+    cache.solver(*MULTI)
+    cache.solver(*PUZZLE)
+    cache.count_solutions(*PUZZLE)
+    # 最も長く使われていないMULTIが捨てられる
+    assert len(cache) == 2
+    cache.solver(*PUZZLE)
+    cache.solver(*MULTI)
+    assert (cache.stats.hits, cache.stats.misses) == (2, 4)
+
+    cache = SolutionCache(maxsize=0)
+    cache.solver(*PUZZLE)
+    assert len(cache) == 0
+
+    with pytest.raises(ValueError):
+        SolutionCache(maxsize=-1)
+
+
+def test_max_bytes():
+    cache = SolutionCache(max_bytes=120)
+    cache.solver(*PUZZLE)
+    size = cache.memory_bytes
+    assert 0 < size <= 120
+    cache.solver(*MULTI)
+    # 合計が上限を超えるので、最も長く使われていないPUZZLEが捨てられる
+    assert len(cache) == 1 and cache.memory_bytes <= 120
+    cache.solver(*PUZZLE)
+    assert (cache.stats.hits, cache.stats.misses) == (0, 3)
+    assert cache.memory_bytes == size
+    cache.clear()
+    assert cache.memory_bytes == 0
+
+    # 1件で上限を超える結果はメモリに覚えない
+    cache = SolutionCache(max_bytes=10)
+    cache.solver(*PUZZLE)
+    assert len(cache) == 0 and cache.memory_bytes == 0
+
+    with pytest.raises(ValueError):
+        SolutionCache(max_bytes=-1)
+
+
+def test_disk(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    with SolutionCache(path=path) as cache:
+        assert cache.solver(*PUZZLE) == ("517", "64")
+        with pytest.raises(ValueError):
+            cache.solver(*NO_ANSWER)
+
+    # 別のプロセスや後から作ったキャッシュでも、ファイルに覚えた結果を使う
+    with SolutionCache(path=path) as cache:
+        other = SolutionCache(path=path)
+        assert cache.solver(*PUZZLE) == ("517", "64")
+        with pytest.raises(ValueError):
+            cache.solver(*NO_ANSWER)
+        assert (cache.stats.disk_hits, cache.stats.misses) == (2, 0)
+
+        other.count_solutions(*MULTI)
+        assert cache.count_solutions(*MULTI) == other.count_solutions(*MULTI)
+        assert cache.stats.disk_hits == 3
+        other.close()
+
+        cache.clear()
+        assert len(cache) == 0
+        cache.solver(*PUZZLE)
+        assert cache.stats.misses == 1
+
+
+def test_whitespace():
+    cache = SolutionCache()
+    assert cache.solver(" 5**", "*4", ["20*8 ", "3**2"], "3308*\n") == ("517", "64")
+    assert cache.solver(*PUZZLE) == ("517", "64")
+    assert cache.count_solutions(" 5**", "*4", ["20*8", "3**2"], "3308*") == 1
+    assert (cache.stats.hits, cache.stats.misses) == (1, 2)
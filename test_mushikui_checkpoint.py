@@ -0,0 +1,94 @@
+import os
+
+import pytest
+
+import mushikui_checkpoint
+from mushikui_checkpoint import (
+    Checkpoint,
+    checkpointed_solve_all,
+    load_checkpoint,
+    resume,
+    save_checkpoint,
+)
+from mushikui_solver import SearchInterrupted, SearchNode, SearchOptions, solve_all
+
+MULTI = ("*1", "**", ["**", "***"], "**1*")
+PUZZLE = ("3*75**", "****", ["*12****", "*0*****", "3***6*6", "*******"], "*****1**66")
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / "search.ckpt")
+    checkpoint = Checkpoint(
+        MULTI, SearchOptions(ordering="mrv"), 3,
+        [SearchNode.from_strings("*1", "2*"), SearchNode.from_strings("91", "*")],
+        [("91", "21")], counter=5,
+    )
+    checkpoint.stats.nodes_expanded = 4
+    save_checkpoint(path, checkpoint)
+    assert load_checkpoint(path) == checkpoint
+    assert os.listdir(tmp_path) == ["search.ckpt"]
+
+
+def test_atomic_write(tmp_path, monkeypatch):
+    path = str(tmp_path / "search.ckpt")
+    save_checkpoint(path, Checkpoint(MULTI))
+
+    def fail(*args):
+        raise OSError("disk full")
+
+    # 置き換えに失敗しても、前回の途中経過と一時ファイルの無い状態のまま
+    monkeypatch.setattr(mushikui_checkpoint.os, "replace", fail)
+    with pytest.raises(OSError):
+        save_checkpoint(path, Checkpoint(MULTI, counter=10))
+    assert load_checkpoint(path).counter == 0
+    assert os.listdir(tmp_path) == ["search.ckpt"]
+
+
+@pytest.mark.parametrize("options", [SearchOptions(), SearchOptions(ordering="mrv", visited="none")])
+def test_resume(tmp_path, options):
+    path = str(tmp_path / "search.ckpt")
+    expected = solve_all(*PUZZLE, options=options)
+    # 途中で止めては再開することを繰り返しても、止めずに探索した場合と同じ解が同じ順に見つかる
+    with pytest.raises(SearchInterrupted):
+        checkpointed_solve_all(*PUZZLE, path=str(path), options=options, max_nodes=100)
+    max_nodes = 100
+    while True:
+        max_nodes += 100
+        try:
+            solutions = resume(path, max_nodes=max_nodes)
+            break
+        except SearchInterrupted:
+            checkpoint = load_checkpoint(path)
+            assert checkpoint.counter == max_nodes
+            assert not checkpoint.complete
+    assert solutions == expected
+    assert max_nodes > 300
+
+    checkpoint = load_checkpoint(path)
+    assert checkpoint.complete and checkpoint.nodes == []
+    assert checkpoint.stats.solutions == len(expected)
+    # 探索し終えた途中経過からは、探索せずに解を返す
+    assert resume(path) == expected
+
+
+def test_limit_and_interval(tmp_path, monkeypatch):
+    path = str(tmp_path / "search.ckpt")
+    saved = []
+    original = mushikui_checkpoint.save_checkpoint
+
+    def save(path, checkpoint):
+        saved.append(checkpoint.complete)
+        original(path, checkpoint)
+
+    monkeypatch.setattr(mushikui_checkpoint, "save_checkpoint", save)
+    assert checkpointed_solve_all(*MULTI, path=path, limit=2) == solve_all(*MULTI, limit=2)
+    assert saved == [True]
+    assert load_checkpoint(path).limit == 2
+
+    # 書き出す間隔を過ぎるたびに書き出す
+    saved.clear()
+    assert checkpointed_solve_all(*PUZZLE, path=path, interval=0.01) == solve_all(*PUZZLE)
+    assert len(saved) > 1 and saved[-1] and not any(saved[:-1])
+
+    with pytest.raises(ValueError):
+        checkpointed_solve_all(*MULTI, path=path, interval=0)
@@ -0,0 +1,66 @@
+import io
+import json
+
+import pytest
+
+from mushikui_cli import main, parse_line
+
+LINES = [
+    '["5**", "*4", ["20*8", "3**2"], "3308*"]',
+    "",
+    '{"id": "many", "puzzle": ["*1", "**", ["**", "***"], "**1*"]}',
+    '["***", "**", ["***", "***"], "9973"]',
+    '["***", "*", ["***", "***"], "9973"]',
+    "not json",
+    '{"puzzle": ["1", "2"]}',
+]
+
+
+def test_parse_line():
+    puzzle = ("5**", "*4", ["20*8", "3**2"], "3308*")
+    assert parse_line(json.dumps(list(puzzle))) == (None, puzzle)
+    assert parse_line(json.dumps({"id": 3, "puzzle": list(puzzle)})) == (3, puzzle)
+    for line in ["[", '["1", "2", "3", "4"]', '{"id": 1}', '["1", 2, [], "3"]']:
+        with pytest.raises(ValueError):
+            parse_line(line)
+
+
+def run_cli(tmp_path, capsys, *args):
+    path = tmp_path / "puzzles.jsonl"
+    path.write_text("\n".join(LINES) + "\n")
+    assert main([str(path), "--quiet", *args]) == 0
+    out, err = capsys.readouterr()
+    assert err == ""
+    return [json.loads(line) for line in out.splitlines()]
+
+
+@pytest.mark.parametrize("workers", ["1", "2"])
+def test_main(tmp_path, capsys, workers):
+    records = run_cli(tmp_path, capsys, "--workers", workers, "--ordered", "--chunksize", "1")
+    assert [record["line"] for record in records] == [1, 3, 4, 5, 6, 7]
+    assert records[0]["answer"] == ["517", "64"]
+    assert (records[0]["solutions"], records[0]["complete"]) == (1, False)
+    assert records[0]["nodes"] > 0 and records[0]["time"] >= 0
+    assert records[0]["error"] is None
+    assert (records[1]["id"], records[1]["answer"]) == ("many", ["91", "21"])
+    assert (records[2]["answer"], records[2]["error"]) == (None, "Error: no answer")
+    assert records[3]["error"].startswith("Error: the length")
+    assert records[4]["error"].startswith("Error: invalid JSON")
+    assert records[5]["error"].startswith("Error: puzzle should be")
+
+
+def test_all_solutions(tmp_path, capsys):
+    records = run_cli(tmp_path, capsys, "--workers", "1", "--all-solutions")
+    assert records[0]["answers"] == [["517", "64"]]
+    assert records[1]["solutions"] == len(records[1]["answers"]) == 12
+    assert (records[2]["solutions"], records[2]["complete"]) == (0, True)
+
+
+def test_stdin_and_summary(monkeypatch, capsys, tmp_path):
+    monkeypatch.setattr("sys.stdin", io.StringIO("\n".join(LINES[:4])))
+    output = tmp_path / "out.jsonl"
+    assert main(["--workers", "1", "--timeout", "10", "--output", str(output)]) == 0
+    out, err = capsys.readouterr()
+    assert out == ""
+    assert err.startswith("solved: 2, no answer: 1, error: 0")
+    assert len(output.read_text().splitlines()) == 3
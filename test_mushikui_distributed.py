@@ -0,0 +1,90 @@
+import asyncio
+import json
+
+import pytest
+
+from mushikui_distributed import Coordinator, distributed_solve_all, run_worker
+from mushikui_solver import SearchOptions, solve_all, solver
+
+PUZZLES = [
+    ("5**", "*4", ["20*8", "3**2"], "3308*"),
+    ("**", "*", ["**"], "9*"),
+    ("*1", "**", ["**", "***"], "**1*"),
+    ("***", "**", ["***", "***"], "9973"),
+]
+
+
+def test_distributed_solve_all():
+    for puzzle in PUZZLES:
+        assert distributed_solve_all(*puzzle, workers=2, chunk_nodes=5) == solve_all(*puzzle)
+    assert distributed_solve_all(*PUZZLES[2], limit=1, workers=2, chunk_nodes=3) == [
+        solver(*PUZZLES[2])]
+    # 解が一つだけかを調べる
+    assert len(distributed_solve_all(*PUZZLES[2], limit=2, workers=1, chunk_nodes=3)) == 2
+    options = SearchOptions(ordering="mrv", visited="none")
+    assert distributed_solve_all(*PUZZLES[2], workers=1, options=options) == solve_all(
+        *PUZZLES[2], options=options)
+
+    with pytest.raises(ValueError):
+        distributed_solve_all("***", "*", ["***", "***"], "9973")
+    with pytest.raises(ValueError):
+        distributed_solve_all(*PUZZLES[0], workers=0)
+
+
+async def _take_lease(port: int, close: bool):
+    """部分木を1つ借りたまま返さないワーカー。"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    for message in ({"type": "hello"}, {"type": "lease"}):
+        writer.write(json.dumps(message).encode() + b"\n")
+        await writer.drain()
+        reply = json.loads(await reader.readline())
+    assert reply["type"] == "subtree"
+    if close:
+        writer.close()
+    return writer
+
+
+@pytest.mark.parametrize("close", [False, True])
+def test_release(close):
+    async def main():
+        coordinator = Coordinator(*PUZZLES[2], chunk_nodes=3, lease_timeout=0.2)
+        host, port = await coordinator.start()
+        writer = await _take_lease(port, close)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, run_worker, host, port)
+        answers = await coordinator.wait()
+        writer.close()
+        return answers, coordinator.stats
+
+    answers, stats = asyncio.run(main())
+    assert answers == solve_all(*PUZZLES[2])
+    assert stats.workers == 2
+    if close:
+        assert stats.requeued == 1
+    else:
+        assert stats.expired >= 1
+    assert stats.nodes_expanded > 0
+
+
+@pytest.mark.parametrize("result", [
+    {"nodes": 1, "solutions": []},
+    {"nodes": 1, "solutions": [["x1", "2"]], "remaining": []},
+    {"nodes": "1", "solutions": [], "remaining": []},
+])
+def test_malformed_result(result):
+    # 形式が違う結果を返しても、部分木は失われずに貸し出し直される
+    async def main():
+        coordinator = Coordinator(*PUZZLES[2], chunk_nodes=3)
+        host, port = await coordinator.start()
+        writer = await _take_lease(port, close=False)
+        writer.write(json.dumps(dict(result, type="result", lease=0)).encode() + b"\n")
+        await writer.drain()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, run_worker, host, port)
+        answers = await coordinator.wait()
+        writer.close()
+        return answers, coordinator.stats
+
+    answers, stats = asyncio.run(main())
+    assert answers == solve_all(*PUZZLES[2])
+    assert stats.requeued == 1
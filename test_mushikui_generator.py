@@ -0,0 +1,67 @@
+import pytest
+
+from mushikui_generator import generate_many, generate_puzzle, has_other_solution
+from mushikui_solver import SearchOptions, count_solutions, solver
+
+
+def test_generate_puzzle():
+    for shape, difficulty in [((3, 2), "max"), ((4, 3), "normal"), ((6, 4), "easy")]:
+        for seed in range(3):
+            generated = generate_puzzle(shape, difficulty, seed)
+            assert generated == generate_puzzle(shape, difficulty, seed)
+            assert count_solutions(*generated.puzzle, limit=2) == 1
+            assert solver(*generated.puzzle) == generated.answer
+            assert tuple(map(len, generated.answer)) == shape
+            stars = sum(line.count("*") for line in (
+                generated.puzzle[0], generated.puzzle[1], *generated.puzzle[2], generated.puzzle[3]))
+            assert stars == generated.stars
+
+    generated = generate_puzzle((5, 3), 0.5, 1)
+    assert generated.stars == round(0.5 * generated.cells)
+    assert generate_puzzle((5, 3), 0.0, 1).stars == 0
+
+    with pytest.raises(ValueError):
+        generate_puzzle((5, 3), 1.5)
+    with pytest.raises(ValueError):
+        generate_puzzle((5, 3), "impossible")
+    with pytest.raises(ValueError):
+        generate_puzzle((0, 3))
+
+
+def test_has_other_solution():
+    # 517 * 64 = 33088
+    lines = ["517", "6*", "2068", "3102", "33088"]
+    assert has_other_solution(lines, 1, 1, "4") is False
+    lines = ["5*7", "64", "2068", "3102", "33088"]
+    assert has_other_solution(lines, 0, 1, "1") is False
+    lines = ["*17", "*4", "2068", "3102", "33088"]
+    assert has_other_solution(lines, 0, 0, "5") is False
+    # 積の一の位が無くても、中間結果から決まる
+    lines = ["517", "64", "2068", "3102", "3308*"]
+    assert has_other_solution(lines, 4, 4, "8") is False
+    # 1* * 1 = 1* は、被乗数の一の位が何でもよい
+    lines = ["1*", "1", "1*", "1*"]
+    assert has_other_solution(lines, 0, 1, "2") is True
+    # 1* * 2 = 36 の6を*にすると、15 * 2 = 30 なども解になる
+    lines = ["1*", "2", "**", "3*"]
+    assert has_other_solution(lines, 3, 1, "6") is True
+    assert has_other_solution(["**", "*", "**", "**"], 3, 1, "2", max_nodes=1) is None
+
+    # 探索を作るときに*が埋まる設定でも、埋まった*を数字の根として扱わない
+    lines = ["5*7", "64", "2068", "3102", "33088"]
+    for options in (SearchOptions(preprocess=True), SearchOptions(column_propagation=True)):
+        assert has_other_solution(lines, 0, 1, "1", options=options) is False
+        assert has_other_solution(["1*", "1", "1*", "1*"], 0, 1, "2", options=options) is True
+    # preprocessで埋まった*は数字が一つに決まっているので、探索しない
+    assert has_other_solution(
+        lines, 0, 1, "1", options=SearchOptions(preprocess=True), max_nodes=0) is False
+
+
+def test_generate_many():
+    generated = list(generate_many(6, (4, 2), "hard", seed=10, workers=1))
+    assert [puzzle.seed for puzzle in generated] == list(range(10, 16))
+    assert generated[0] == generate_puzzle((4, 2), "hard", 10)
+    assert list(generate_many(6, (4, 2), "hard", seed=10, workers=2, chunksize=2)) == generated
+    assert list(generate_many(0, workers=1)) == []
+    with pytest.raises(ValueError):
+        list(generate_many(1, difficulty=2, workers=1))
@@ -0,0 +1,67 @@
+import pytest
+
+from mushikui_parallel import parallel_solve_all, parallel_solver, split_search
+from mushikui_solver import DepthFirstSearch, SearchOptions, solve_all, solver
+
+PUZZLES = [
+    ("5**", "*4", ["20*8", "3**2"], "3308*"),
+    ("1*", "*", ["*6"], "*6"),
+    ("**", "*", ["**"], "9*"),
+    ("*1", "**", ["**", "***"], "**1*"),
+    ("3*75**", "****", ["*12****", "*0*****", "3***6*6", "*******"], "*****1**66"),
+]
+
+
+def test_split_search():
+    search = DepthFirstSearch(*PUZZLES[3])
+    solutions, subtrees = split_search(search, 2)
+    keys = [key for key, _ in solutions + subtrees]
+    assert len(set(keys)) == len(keys)
+
+    # 部分木を位置の順に探索すると、逐次の探索と同じ順に解が見つかる
+    found = sorted(solutions)
+    for key, node in subtrees:
+        sub_search = DepthFirstSearch(*PUZZLES[3])
+        sub_search.reset([node])
+        found += [((key, i), solution) for i, solution in enumerate(sub_search.run())]
+    found.sort(key=lambda item: item[0])
+    assert [search.decode(node) for _, node in found] == solve_all(*PUZZLES[3])
+
+    _, subtrees = split_search(search, 0)
+    assert [node for _, node in subtrees] == [search.root]
+
+
+@pytest.mark.parametrize("chunk_nodes", [3, 10000])
+def test_parallel_solve_all(chunk_nodes):
+    for puzzle in PUZZLES:
+        assert parallel_solve_all(
+            *puzzle, workers=2, chunk_nodes=chunk_nodes
+        ) == solve_all(*puzzle)
+        assert parallel_solve_all(
+            *puzzle, limit=2, workers=2, chunk_nodes=chunk_nodes
+        ) == solve_all(*puzzle, limit=2)
+
+
+def test_parallel_solver():
+    for puzzle in PUZZLES:
+        assert parallel_solver(*puzzle, workers=2, split_depth=3, chunk_nodes=5) == (
+            solver(*puzzle)
+        )
+
+    with pytest.raises(ValueError) as e:
+        parallel_solver("***", "**", ["***", "***"], "9973", workers=2)
+    assert str(e.value) == "Error: no answer"
+
+    with pytest.raises(ValueError):
+        parallel_solver("***", "*", ["***", "***"], "9973", workers=2)
+
+
+@pytest.mark.parametrize(
+    "options",
+    [SearchOptions(ordering="mrv"), SearchOptions(engine="multiplier_first")],
+)
+def test_parallel_options(options):
+    for puzzle in PUZZLES:
+        assert parallel_solve_all(
+            *puzzle, workers=2, chunk_nodes=3, options=options
+        ) == solve_all(*puzzle, options=options)
@@ -0,0 +1,147 @@
+import asyncio
+import json
+
+import pytest
+
+from mushikui_service import ServiceBusy, SolverService
+from mushikui_solver import SearchInterrupted, SearchOptions
+
+PUZZLE = ("5**", "*4", ["20*8", "3**2"], "3308*")
+NO_ANSWER = ("***", "**", ["***", "***"], "9973")
+# 最初の解が見つかるまでに約13万ノードを展開する
+HARD = ("******", "81*8", ["*06****", "****3*0", "*58***", "*069***"], "*1*3*0*64*")
+# 最初の解が見つかるまでに約1400ノードを展開する
+SLOW = ("*5**", "6**", ["***2*", "*1***", "2**9*"], "2****4*")
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_solve():
+    async def main():
+        async with SolverService(workers=1) as service:
+            assert await service.solve(*PUZZLE) == ("517", "64")
+            assert await service.solve(" 5**", "*4", ["20*8", "3**2 "], "3308*") == ("517", "64")
+            with pytest.raises(ValueError, match="no answer"):
+                await service.solve(*NO_ANSWER)
+            with pytest.raises(ValueError):
+                await service.solve("***", "*", ["***", "***"], "9973")
+            return service.stats
+
+    stats = run(main())
+    assert (stats.requests, stats.jobs) == (4, 3)
+
+
+def test_coalescing():
+    async def main():
+        async with SolverService(workers=1, slice_nodes=100) as service:
+            answers = await asyncio.gather(*[service.solve(*PUZZLE) for _ in range(5)])
+            # 設定が一つでも違えば別に探索する
+            await asyncio.gather(
+                service.solve(*PUZZLE), service.solve(*PUZZLE, options=SearchOptions(ordering="mrv")),
+                service.solve(*PUZZLE, options=SearchOptions(prefix_bounds=True)),
+                service.solve(*PUZZLE, options=SearchOptions()))
+            return answers, service.stats
+
+    answers, stats = run(main())
+    assert answers == [("517", "64")] * 5
+    assert (stats.jobs, stats.coalesced) == (4, 5)
+
+
+def test_stream():
+    async def main():
+        async with SolverService(workers=1, slice_nodes=100) as service:
+            return [event async for event in service.stream(*SLOW)]
+
+    events = run(main())
+    assert events[-1]["event"] == "answer"
+    progress = [event for event in events[:-1]]
+    assert progress and all(event["event"] == "progress" for event in progress)
+    nodes = [event["nodes"] for event in events]
+    assert nodes == sorted(nodes)
+    assert all(0 <= event["explored"] <= 1 for event in progress)
+    json.dumps(events)
+
+
+def test_backpressure():
+    async def main():
+        async with SolverService(workers=1, max_pending=1, slice_nodes=100) as service:
+            hard = asyncio.ensure_future(service.solve(*HARD))
+            await asyncio.sleep(0)
+            with pytest.raises(ServiceBusy):
+                await service.solve(*PUZZLE)
+            # 同じ虫食い算は待てる
+            waiting = asyncio.ensure_future(service.solve(*HARD))
+            await asyncio.sleep(0)
+            hard.cancel()
+            waiting.cancel()
+            await asyncio.gather(hard, waiting, return_exceptions=True)
+            return service.stats
+
+    stats = run(main())
+    assert (stats.rejected, stats.coalesced) == (1, 1)
+
+    with pytest.raises(ValueError):
+        SolverService(max_pending=0)
+
+
+def test_fairness():
+    async def main():
+        async with SolverService(workers=1, slice_nodes=200) as service:
+            hard = asyncio.ensure_future(service.solve(*HARD))
+            await asyncio.sleep(0)
+            # 難しい虫食い算の探索が終わるのを待たずに解ける
+            answer = await service.solve(*PUZZLE)
+            done = hard.done()
+            hard.cancel()
+            await asyncio.gather(hard, return_exceptions=True)
+            return answer, done
+
+    assert run(main()) == (("517", "64"), False)
+
+
+def test_timeout():
+    async def main():
+        async with SolverService(workers=1, slice_nodes=100, timeout=0.2) as service:
+            with pytest.raises(SearchInterrupted) as info:
+                await service.solve(*HARD)
+            return info.value
+
+    interrupted = run(main())
+    assert interrupted.reason == "timeout"
+    # 止めるまでの探索の統計を返す
+    assert interrupted.stats.nodes_expanded > 0
+    assert 0 < interrupted.explored < 1
+
+
+def test_serve():
+    async def main():
+        async with SolverService(workers=1) as service:
+            server = await service.serve("127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            requests = [
+                {"id": 1, "puzzle": [PUZZLE[0], PUZZLE[1], PUZZLE[2], PUZZLE[3]]},
+                {"id": 2, "puzzle": list(NO_ANSWER), "options": {"ordering": "mrv"}},
+                {"id": 3, "puzzle": ["1"]},
+                {"id": 4, "puzzle": list(PUZZLE), "options": {"unknown": 1}},
+            ]
+            for request in requests:
+                writer.write(json.dumps(request).encode() + b"\n")
+            writer.write(b"not json\n")
+            await writer.drain()
+            writer.write_eof()
+            events = [json.loads(line) async for line in reader]
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            return events
+
+    events = run(main())
+    final = {event["id"]: event for event in events if event["event"] != "progress"}
+    assert final[1]["answer"] == ["517", "64"]
+    assert final[2]["type"] == "no_answer"
+    assert final[3]["type"] == "invalid"
+    assert final[4]["type"] == "invalid"
+    assert final[None]["type"] == "invalid"
@@ -1,20 +1,47 @@
+import math
+import pickle
+import random
 import re
+import time
 
 import pytest
 
+import mushikui_solver
 from mushikui_solver import (
+    CancellationToken,
+    DepthFirstSearch,
+    SearchNode,
+    SearchInterrupted,
+    SearchOptions,
+    SearchStats,
     check_mod,
+    compile_puzzle,
     convert_to_regex,
+    count_completions,
+    count_solutions,
+    count_solutions_dp,
+    count_trailing_known,
+    decode_line,
+    digit_domains,
+    encode_line,
+    fill_forced_digits,
     find_star_index,
     get_next_node_candidates,
     is_correct_answer,
     is_wrong_answer_mod,
     is_wrong_answer_range,
+    iter_solutions,
     make_min_max,
     make_min_max_product_line,
+    pattern_completions,
+    preprocess_puzzle,
+    propagate_columns,
     range_check,
+    smallest_completion,
+    solve_all,
     solver,
-    validate_input
+    spread_digits,
+    validate_input,
 )
 
 
@@ -73,6 +100,84 @@ def test_get_next_node_candidates():
         get_next_node_candidates(node_bad)
 
 
+def test_encode_decode_line():
+    assert encode_line("1*2") == (102, 0b10)
+    assert encode_line("***") == (0, 0b111)
+    assert encode_line("305") == (305, 0)
+    for line in ["1*2", "***", "305", "*0*", "0"]:
+        assert decode_line(*encode_line(line), len(line)) == line
+
+
+def test_count_trailing_known():
+    assert count_trailing_known(0b100) == 2
+    assert count_trailing_known(0b1) == 0
+    assert count_trailing_known(0) == math.inf
+
+
+def test_spread_digits():
+    assert spread_digits(123, 1000) == 1002003
+    assert spread_digits(0, 1000) == 0
+    assert spread_digits(105, 100) == 10005
+
+
+def test_search_node():
+    node = SearchNode.from_strings("1*2", "*4")
+    assert node.to_strings(3, 2) == ("1*2", "*4")
+    assert node == SearchNode.from_strings("1*2", "*4")
+    assert node != SearchNode.from_strings("1*2", "14")
+    assert len({node, SearchNode.from_strings("1*2", "*4")}) == 1
+
+
+def test_depth_first_search_next_node_candidates():
+    # 文字列版のget_next_node_candidatesと同じ順序で同じ候補を返す
+    for node in [("11*22", "3*4"), ("1*2", "*34"), ("*1*2", "34"), ("1*2*", "34"), ("1*2", "3*4*")]:
+        search = DepthFirstSearch(
+            node[0], node[1], ["*"] * len(node[1]), "*")
+        candidates = search.next_node_candidates(search.root)
+        assert [search.decode(candidate) for candidate in candidates] == (
+            get_next_node_candidates(node)
+        )
+
+    search = DepthFirstSearch("12", "34", ["*", "*"], "*")
+    with pytest.raises(ValueError):
+        search.next_node_candidates(search.root)
+
+
+def test_depth_first_search_pruning():
+    search = DepthFirstSearch("5**", "*4", ["20*8", "3**2"], "3308*")
+    assert search.is_wrong_answer_mod(SearchNode.from_strings("517", "*3"))
+    assert not search.is_wrong_answer_mod(SearchNode.from_strings("5*7", "*4"))
+    assert search.is_wrong_answer_range(SearchNode.from_strings("5**", "9*"))
+    assert not search.is_wrong_answer_range(SearchNode.from_strings("5**", "6*"))
+    assert search.is_correct_answer(SearchNode.from_strings("517", "64"))
+    assert not search.is_correct_answer(SearchNode.from_strings("518", "64"))
+
+
+def test_depth_first_search_incremental_mod():
+    search = DepthFirstSearch(
+        "******", "****", ["66****", "6*****", "**666**", "**6**6"], "****66****")
+    random.seed(0)
+    for _ in range(200):
+        parent = search.root
+        while True:
+            candidates = search.next_node_candidates(parent)
+            for child in candidates:
+                # 差分で更新した積は、値から作り直したものと一致する
+                rebuilt = SearchNode.from_values(*child.key(), search.length1)
+                assert (child.product, child.partials) == (
+                    rebuilt.product, rebuilt.partials)
+                # 親で検査済みなら、差分の検査と全体の検査は一致する
+                assert search.is_wrong_answer_mod(child, parent) == (
+                    search.is_wrong_answer_mod(child))
+            alive = [
+                child for child in candidates
+                if child.mask1 | child.mask2 and not search.is_wrong_answer_mod(child)
+            ]
+            if not alive:
+                break
+            parent = random.choice(alive)
+
+
 def test_solver():
     # テストケース1
     multiple_line_1 = "5**"  # 517
@@ -117,6 +222,573 @@ def test_solver():
         )
     assert str(e.value) == "Error: no answer"
 
+    # 掛ける数に0を含む場合
+    assert solver("1*3", "1*4", ["4*2", "0", "1*3"], "12*92") == ("123", "104")
+
+
+def brute_force(multiple_line1, multiple_line2, intermediate_lines, product_line):
+    """全ての組み合わせを試して解を列挙する。"""
+    def candidates(line):
+        for value in range(10 ** (len(line) - 1), 10 ** len(line)):
+            if re.fullmatch(convert_to_regex(line), str(value)):
+                yield str(value)
+
+    return [
+        (a, b)
+        for a in candidates(multiple_line1)
+        for b in candidates(multiple_line2)
+        if is_correct_answer(
+            (a, b),
+            [convert_to_regex(line) for line in intermediate_lines],
+            convert_to_regex(product_line),
+        )
+    ]
+
+
+MULTI_SOLUTION_PUZZLES = [
+    ("1*", "*", ["*6"], "*6"),
+    ("**", "*", ["**"], "9*"),
+    ("*1", "**", ["**", "***"], "**1*"),
+    ("2*", "*0", ["0", "*6"], "*60"),
+]
+
+
+def test_iter_solutions():
+    for puzzle in MULTI_SOLUTION_PUZZLES:
+        solutions = list(iter_solutions(*puzzle))
+        assert sorted(solutions) == brute_force(*puzzle)
+        assert len(set(solutions)) == len(solutions)
+        # 最初の解はsolverと同じ
+        assert solutions[0] == solver(*puzzle)
+
+    # limitの数だけ返す
+    assert len(list(iter_solutions(*MULTI_SOLUTION_PUZZLES[1], limit=3))) == 3
+    assert list(iter_solutions(*MULTI_SOLUTION_PUZZLES[1], limit=0)) == []
+
+    # 解が無い場合
+    assert list(iter_solutions("***", "**", ["***", "***"], "9973")) == []
+
+    # 入力の誤りは呼び出した時点でわかる
+    with pytest.raises(ValueError):
+        iter_solutions("***", "*", ["***", "***"], "9973")
+
+
+def test_solve_all():
+    assert solve_all("5**", "*4", ["20*8", "3**2"], "3308*") == [("517", "64")]
+    assert len(solve_all(*MULTI_SOLUTION_PUZZLES[0], limit=2)) == 2
+
+
+def test_count_solutions():
+    for puzzle in MULTI_SOLUTION_PUZZLES:
+        assert count_solutions(*puzzle) == len(brute_force(*puzzle))
+        assert count_solutions(*puzzle, limit=2) == 2
+    assert count_solutions("5**", "*4", ["20*8", "3**2"], "3308*", limit=2) == 1
+    assert count_solutions("***", "**", ["***", "***"], "9973") == 0
+
+
+def test_count_solutions_dp():
+    for puzzle in MULTI_SOLUTION_PUZZLES:
+        assert count_solutions_dp(*puzzle) == len(brute_force(*puzzle))
+    assert count_solutions_dp("5**", "*4", ["20*8", "3**2"], "3308*") == 1
+    assert count_solutions_dp("***", "**", ["***", "***"], "9973") == 0
+    # 行の先頭の*は1-9で、0の行は"0"とだけ一致する
+    assert count_solutions_dp("*", "*", ["*"], "*") == count_solutions("*", "*", ["*"], "*")
+    assert count_solutions_dp("**", "*", ["0"], "0") == 0
+    assert count_solutions_dp("0", "*", ["0"], "0") == 9
+
+    rng = random.Random(0)
+    for _ in range(30):
+        value1, value2 = rng.randrange(1, 1000), rng.randrange(1, 100)
+        lines = [str(value1), str(value2)]
+        lines += [str(value1 * int(digit)) for digit in reversed(lines[1])]
+        lines.append(str(value1 * value2))
+        lines = ["".join("*" if rng.random() < 0.6 else char for char in line) for line in lines]
+        puzzle = (lines[0], lines[1], lines[2:-1], lines[-1])
+        assert count_solutions_dp(*puzzle) == count_solutions(*puzzle)
+
+    # 解を列挙すると時間のかかる虫食い算も数えられる
+    assert count_solutions_dp("***", "**", ["***", "***"], "****") == 6557
+    # *だけの6x4も、乗数を状態にまとめるので短い時間で数えられる
+    started = time.perf_counter()
+    assert count_solutions_dp("******", "****", ["*******"] * 4, "**********") == 2598177323
+    assert count_solutions_dp(
+        "******", "81*8", ["*06****", "****3*0", "*58***", "*069***"], "*1*3*0*64*") == 1
+    assert time.perf_counter() - started < 10
+    with pytest.raises(ValueError):
+        count_solutions_dp("***", "*", ["***", "***"], "9973")
+
+
+def test_solver_quiet(capsys):
+    puzzle = ("******", "****", ["66****", "6*****", "**666**", "**6**6"], "****66****")
+    assert solver(*puzzle) == ("666666", "1711")
+    assert capsys.readouterr().out == ""
+
+    assert solver(*puzzle, verbose=True) == ("666666", "1711")
+    out = capsys.readouterr().out
+    assert "counter:0" in out
+    assert "Answer: ('666666', '1711')" in out
+
+
+def test_search_stats():
+    puzzle = ("******", "****", ["66****", "6*****", "**666**", "**6**6"], "****66****")
+    stats = SearchStats()
+    solver(*puzzle, stats=stats)
+    assert stats.nodes_expanded > 0
+    assert stats.pruned_mod > 0
+    assert stats.pruned_range > 0
+    assert stats.leaves_verified >= 1
+    assert stats.solutions == 1
+    assert stats.max_stack_depth > 0
+    assert stats.wall_time > 0
+
+    # 全ての解を数える場合は、探索しきるまでの統計になる
+    all_stats = SearchStats()
+    assert count_solutions(*puzzle, stats=all_stats) == 1
+    assert all_stats.nodes_expanded > stats.nodes_expanded
+    assert all_stats.solutions == 1
+
+    stats = SearchStats()
+    with pytest.raises(ValueError):
+        solver("***", "**", ["***", "***"], "9973", stats=stats)
+    assert stats.solutions == 0
+    assert stats.nodes_expanded > 0
+
+
+def test_search_stats_wall_time_paused():
+    # 解を返して止まっている間に閉じても、止まっていた時間は含めない
+    stats = SearchStats()
+    solutions = iter_solutions(*MULTI_SOLUTION_PUZZLES[0], stats=stats)
+    next(solutions)
+    searched = stats.wall_time
+    time.sleep(0.3)
+    solutions.close()
+    assert stats.wall_time == searched
+    assert stats.wall_time < 0.3
+
+
+def test_search_options():
+    assert SearchOptions().ordering == "ends"
+    with pytest.raises(ValueError):
+        SearchOptions(ordering="random")
+
+
+def test_depth_first_search_open_places():
+    search = DepthFirstSearch("1**2*", "*3", ["*", "*"], "*")
+    node = search.root
+    assert search.open_places(node) == [(1, 0), (2, 1), (1, 3), (1, 2)]
+    assert search.open_places(node)[0] == search.find_star_place(node)
+
+
+def test_mrv_ordering():
+    mrv = SearchOptions(ordering="mrv")
+    puzzles = MULTI_SOLUTION_PUZZLES + [
+        ("5**", "*4", ["20*8", "3**2"], "3308*"),
+        ("******", "****", ["66****", "6*****", "**666**", "**6**6"], "****66****"),
+        ("3*75**", "****", ["*12****", "*0*****", "3***6*6", "*******"], "*****1**66"),
+    ]
+    for puzzle in puzzles:
+        solutions = solve_all(*puzzle, options=mrv)
+        assert sorted(solutions) == sorted(solve_all(*puzzle))
+        assert solutions[0] == solver(*puzzle, options=mrv)
+
+    # 残る数字の少ない*から埋めるので、展開するノードが減る
+    ends_stats = SearchStats()
+    mrv_stats = SearchStats()
+    count_solutions(*puzzles[-2], stats=ends_stats)
+    count_solutions(*puzzles[-2], stats=mrv_stats, options=mrv)
+    assert mrv_stats.nodes_expanded < ends_stats.nodes_expanded
+
+    with pytest.raises(ValueError):
+        solver("***", "**", ["***", "***"], "9973", options=mrv)
+
+
+def test_digit_domains():
+    assert digit_domains("*3*") == [0b1111111111, 0b1000, 0b1111111110]
+    assert digit_domains("0") == [0b1]
+    assert fill_forced_digits("*3*", [0b10, 0b1000, 0b1111111110]) == "*31"
+
+
+def test_propagate_columns():
+    # *3* + **0 = *4* の十の位から、中間結果の2行目の一の位は1
+    assert propagate_columns(["*3*", "**"], "*4*") == (["*3*", "*1"], "*4*")
+    assert propagate_columns(["4*2", "0", "1*3"], "12*92") == (
+        ["492", "0", "123"], "12792")
+    with pytest.raises(ValueError):
+        propagate_columns(["9", "9"], "1")
+    with pytest.raises(ValueError):
+        propagate_columns(["**", "**"], "**")
+
+
+def test_column_propagation():
+    columns = SearchOptions(column_propagation=True)
+    puzzles = MULTI_SOLUTION_PUZZLES + [
+        ("5**", "*4", ["20*8", "3**2"], "3308*"),
+        ("******", "****", ["66****", "6*****", "**666**", "**6**6"], "****66****"),
+        ("4*93*", "***9", ["*6845*", "***6**", "***4**", "*0*6**"], "*********"),
+    ]
+    for puzzle in puzzles:
+        assert solve_all(*puzzle, options=columns) == solve_all(*puzzle)
+
+    # 足し算の列から矛盾が分かるノードを枝切りする
+    default_stats = SearchStats()
+    columns_stats = SearchStats()
+    count_solutions(*puzzles[-1], stats=default_stats)
+    count_solutions(*puzzles[-1], stats=columns_stats, options=columns)
+    assert columns_stats.pruned_column > 0
+    assert columns_stats.nodes_expanded < default_stats.nodes_expanded
+
+    # 探索の前に矛盾が分かる場合
+    assert solve_all("*", "**", ["9", "9"], "1**", options=columns) == []
+    with pytest.raises(ValueError):
+        solver("*", "**", ["**", "9"], "1*", options=columns)
+
+
+def test_vectorized():
+    pytest.importorskip("numpy")
+    puzzles = MULTI_SOLUTION_PUZZLES + [
+        ("5**", "*4", ["20*8", "3**2"], "3308*"),
+        ("******", "****", ["66****", "6*****", "**666**", "**6**6"], "****66****"),
+        ("4*93*", "***9", ["*6845*", "***6**", "***4**", "*0*6**"], "*********"),
+        ("1*3", "1*4", ["4*2", "0", "1*3"], "12*92"),
+    ]
+    for options in (
+        SearchOptions(),
+        SearchOptions(ordering="mrv"),
+        SearchOptions(column_propagation=True),
+    ):
+        vectorized = SearchOptions(
+            ordering=options.ordering,
+            column_propagation=options.column_propagation,
+            vectorized=True,
+        )
+        for puzzle in puzzles:
+            # 探索の順序も枝切りも変わらない
+            stats = SearchStats()
+            vectorized_stats = SearchStats()
+            assert solve_all(*puzzle, stats=vectorized_stats, options=vectorized) == (
+                solve_all(*puzzle, stats=stats, options=options))
+            stats.wall_time = vectorized_stats.wall_time = 0.0
+            stats.peak_memory = vectorized_stats.peak_memory = 0
+            assert vectorized_stats == stats
+
+    # int64に収まらない場合は通常の方法で探索する
+    search = DepthFirstSearch(
+        "*" * 10, "*" * 9, ["*" * 10] * 9, "*" * 19, options=SearchOptions(vectorized=True))
+    assert not search.vectorized
+
+
+def test_vectorized_without_numpy(monkeypatch):
+    monkeypatch.setattr(mushikui_solver, "np", None)
+    with pytest.raises(ValueError):
+        SearchOptions(vectorized=True)
+
+
+def test_pattern_completions():
+    assert count_completions(0b10, 3) == 10
+    assert count_completions(0b11, 2) == 90
+    assert count_completions(0, 2) == 1
+    assert pattern_completions(102, 0b10, 3) == list(range(102, 193, 10))
+    assert pattern_completions(0, 0b11, 2) == list(range(10, 100))
+    assert pattern_completions(42, 0, 2) == [42]
+
+
+def test_multiplier_first():
+    multiplier_first = SearchOptions(engine="multiplier_first")
+    puzzles = MULTI_SOLUTION_PUZZLES + [
+        ("5**", "*4", ["20*8", "3**2"], "3308*"),
+        ("1*3", "1*4", ["4*2", "0", "1*3"], "12*92"),
+        ("******", "****", ["66****", "6*****", "**666**", "**6**6"], "****66****"),
+        ("*****9", "**", ["**0*3**", "301**3*"], "3*63*67*"),
+    ]
+    for puzzle in puzzles:
+        solutions = solve_all(*puzzle, options=multiplier_first)
+        assert sorted(solutions) == sorted(solve_all(*puzzle))
+        assert solutions[0] == solver(*puzzle, options=multiplier_first)
+
+    # 被乗数が長く乗数が短い場合、被乗数を1桁ずつ埋めるより少ないノードで済む
+    dfs_stats = SearchStats()
+    multiplier_first_stats = SearchStats()
+    count_solutions(*puzzles[-1], stats=dfs_stats)
+    count_solutions(*puzzles[-1], stats=multiplier_first_stats, options=multiplier_first)
+    assert multiplier_first_stats.nodes_divided > 0
+    assert multiplier_first_stats.nodes_expanded < dfs_stats.nodes_expanded
+
+    # 割り算を使わない場合も同じ解になる
+    stats = SearchStats()
+    options = SearchOptions(engine="multiplier_first", division_limit=0)
+    assert sorted(solve_all(*puzzles[-1], stats=stats, options=options)) == sorted(
+        solve_all(*puzzles[-1]))
+    assert stats.nodes_divided == 0
+
+    with pytest.raises(ValueError):
+        SearchOptions(engine="bfs")
+    with pytest.raises(ValueError):
+        solver("***", "**", ["***", "***"], "9973", options=multiplier_first)
+
+
+def test_suffix_digit_mask():
+    search = DepthFirstSearch("**7", "*4", ["**28", "****"], "*****")
+    node = search.root
+    # 被乗数の十の位をdとすると (10d + 7) * 4 = 40d + 28 (mod 100) が28になるのはd=0,5
+    mask = search.suffix_digit_mask(node, (1, 1))
+    expected = 0
+    for child in search.next_node_candidates(node, (1, 1)):
+        if not search.is_wrong_answer_mod(child, node):
+            expected |= 1 << (child.value1 // 10 % 10)
+    assert mask == expected == (1 << 0 | 1 << 5)
+
+
+def test_suffix_tables():
+    puzzles = MULTI_SOLUTION_PUZZLES + [
+        ("5**", "*4", ["20*8", "3**2"], "3308*"),
+        ("******", "****", ["66****", "6*****", "**666**", "**6**6"], "****66****"),
+        ("3*75**", "****", ["*12****", "*0*****", "3***6*6", "*******"], "*****1**66"),
+    ]
+    for options in (SearchOptions(), SearchOptions(ordering="mrv")):
+        for limit in (0, 1 << 20):
+            tables = SearchOptions(
+                ordering=options.ordering, suffix_tables=True, suffix_table_limit=limit)
+            for puzzle in puzzles:
+                # 探索の順序も枝切りの数も変わらない
+                stats = SearchStats()
+                tables_stats = SearchStats()
+                assert solve_all(*puzzle, stats=tables_stats, options=tables) == (
+                    solve_all(*puzzle, stats=stats, options=options))
+                stats.wall_time = tables_stats.wall_time = 0.0
+                stats.peak_memory = tables_stats.peak_memory = 0
+                assert tables_stats == stats
+
+    search = DepthFirstSearch(
+        *puzzles[-1], options=SearchOptions(suffix_tables=True, suffix_table_limit=5))
+    list(search.run())
+    assert len(search._suffix_masks) == 5
+
+    with pytest.raises(ValueError):
+        SearchOptions(suffix_table_limit=-1)
+
+
+def test_is_wrong_answer_suffix():
+    options = SearchOptions(nogood_cache=10)
+    # 被乗数が偶数だと、どの数字を掛けても一の位は3にならない
+    search = DepthFirstSearch("**2", "**", ["***3", "***6"], "*****", options=options)
+    assert search.is_wrong_answer_suffix(search.root)
+    search = DepthFirstSearch("**1", "**", ["***3", "***6"], "*****", options=options)
+    assert not search.is_wrong_answer_suffix(search.root)
+
+    # 上の桁だけが違うノードでは覚えた結果を使う
+    search = DepthFirstSearch("***2", "**", ["***3", "***6"], "*****", options=options)
+    assert search.is_wrong_answer_suffix(SearchNode.from_strings("1**2", "**"))
+    assert search.is_wrong_answer_suffix(SearchNode.from_strings("9**2", "**"))
+    assert (search.stats.nogood_hits, search.stats.nogood_misses) == (1, 1)
+
+
+def test_nogood_cache():
+    puzzles = MULTI_SOLUTION_PUZZLES + [
+        ("5**", "*4", ["20*8", "3**2"], "3308*"),
+        ("3*75**", "****", ["*12****", "*0*****", "3***6*6", "*******"], "*****1**66"),
+        ("2****", "****", ["*****9", "****77", "*7*11", "*****5"], "********9"),
+        ("*****", "****", ["****0", "****2", "***708", "*****2"], "**0*0***0"),
+    ]
+    for options in (SearchOptions(), SearchOptions(engine="multiplier_first")):
+        nogood = SearchOptions(engine=options.engine, nogood_cache=1000)
+        for puzzle in puzzles:
+            assert solve_all(*puzzle, options=nogood) == solve_all(*puzzle, options=options)
+
+    # 乗数が全て*の場合、上の桁が違うだけの同じ失敗を何度も繰り返さない
+    stats = SearchStats()
+    nogood_stats = SearchStats()
+    count_solutions(*puzzles[-1], stats=stats)
+    count_solutions(*puzzles[-1], stats=nogood_stats, options=SearchOptions(nogood_cache=1000))
+    assert nogood_stats.pruned_suffix > 0
+    assert nogood_stats.nogood_hits > nogood_stats.nogood_misses
+    assert nogood_stats.nodes_expanded < stats.nodes_expanded
+
+    search = DepthFirstSearch(*puzzles[-1], options=SearchOptions(nogood_cache=5))
+    list(search.run())
+    assert len(search.nogoods) == 5
+
+    with pytest.raises(ValueError):
+        SearchOptions(nogood_cache=-1)
+
+
+def test_visited():
+    puzzles = MULTI_SOLUTION_PUZZLES + [
+        ("5**", "*4", ["20*8", "3**2"], "3308*"),
+        ("*****", "****", ["****0", "****2", "***708", "*****2"], "**0*0***0"),
+    ]
+    for options in (
+        SearchOptions(),
+        SearchOptions(ordering="mrv", column_propagation=True),
+        SearchOptions(engine="multiplier_first", suffix_tables=True),
+    ):
+        for mode in ("table", "none"):
+            bounded = SearchOptions(
+                ordering=options.ordering,
+                column_propagation=options.column_propagation,
+                engine=options.engine,
+                suffix_tables=options.suffix_tables,
+                visited=mode,
+                visited_table_size=64,
+            )
+            for puzzle in puzzles:
+                # 探索木に同じノードは現れないので、探索の順序も枝切りも変わらない
+                stats = SearchStats()
+                bounded_stats = SearchStats()
+                assert solve_all(*puzzle, stats=bounded_stats, options=bounded) == (
+                    solve_all(*puzzle, stats=stats, options=options))
+                assert 0 < bounded_stats.peak_memory <= stats.peak_memory
+                stats.wall_time = bounded_stats.wall_time = 0.0
+                stats.peak_memory = bounded_stats.peak_memory = 0
+                assert bounded_stats == stats
+
+    search = DepthFirstSearch(*puzzles[-1], options=SearchOptions(visited="table", visited_table_size=100))
+    list(search.run())
+    assert 0 < len(search.visited) <= 128
+    search = DepthFirstSearch(*puzzles[-1], options=SearchOptions(visited="none"))
+    list(search.run())
+    assert len(search.visited) == 0
+
+    with pytest.raises(ValueError):
+        SearchOptions(visited="bloom")
+    with pytest.raises(ValueError):
+        SearchOptions(visited="table", visited_table_size=0)
+
+
+def test_smallest_completion():
+    assert smallest_completion(102, 0b10, 3, 150) == 152
+    assert smallest_completion(102, 0b10, 3, 0) == 102
+    assert smallest_completion(102, 0b10, 3, 193) is None
+    # 上の*を1つ大きくして、残りを最小に埋める
+    assert smallest_completion(305, 0b1010, 4, 1960) == 2305
+    assert smallest_completion(0, 0b11, 2, 5) == 10
+    assert smallest_completion(0, 1, 1, 0) == 1
+    assert smallest_completion(0, 0, 1, 0) == 0
+    assert smallest_completion(42, 0, 2, 43) is None
+
+
+def test_prefix_bounds():
+    puzzles = MULTI_SOLUTION_PUZZLES + [
+        ("5**", "*4", ["20*8", "3**2"], "3308*"),
+        ("*****", "****", ["****0", "****2", "***708", "*****2"], "**0*0***0"),
+    ]
+    for options in (
+        SearchOptions(),
+        SearchOptions(ordering="mrv", column_propagation=True),
+        SearchOptions(engine="multiplier_first"),
+    ):
+        prefix = SearchOptions(
+            ordering=options.ordering,
+            column_propagation=options.column_propagation,
+            engine=options.engine,
+            prefix_bounds=True,
+        )
+        for puzzle in puzzles:
+            assert solve_all(*puzzle, options=prefix) == solve_all(*puzzle, options=options)
+
+    # 被乗数の上の桁が埋まると、積の上の桁の66が合わないノードを枝切りできる
+    puzzle = ("******", "****", ["66****", "6*****", "**666**", "**6**6"], "****66****")
+    stats = SearchStats()
+    prefix_stats = SearchStats()
+    solver(*puzzle, stats=stats)
+    solver(*puzzle, stats=prefix_stats, options=SearchOptions(prefix_bounds=True))
+    assert prefix_stats.pruned_prefix > 0
+    assert prefix_stats.nodes_expanded < stats.nodes_expanded
+
+    search = DepthFirstSearch("1**", "2", ["*4*"], "*4*")
+    # 160*2=320から169*2=338の間に、十の位が4の数は無い。最小値と最大値だけでは枝切りできない。
+    node = SearchNode.from_strings("16*", "2")
+    assert not search.is_wrong_answer_range(node)
+    assert search.is_wrong_answer_prefix(node)
+    assert not search.is_wrong_answer_prefix(SearchNode.from_strings("17*", "2"))
+
+
+def test_preprocess_puzzle():
+    # 埋まる*が無くなるまで繰り返すと、探索するまでもなく解ける
+    assert preprocess_puzzle(
+        "*****", "5***", ["*5*2**", "733**2", "*1*44", "*58**0"], "***1****0"
+    ) == ("91644", "5185", ["458220", "733152", "91644", "458220"], "475174140")
+    assert preprocess_puzzle("1*3", "1*4", ["4*2", "0", "1*3"], "12*92") == (
+        "123", "104", ["492", "0", "123"], "12792")
+    # 中間結果が0なら乗数の桁は0で、掛け算の結果の一の位も0
+    assert preprocess_puzzle("2**", "**", ["0", "***"], "****") == (
+        "2**", "*0", ["0", "***"], "***0")
+    # 2**に何を掛けても9000以上にはならない
+    with pytest.raises(ValueError):
+        preprocess_puzzle("2**", "**", ["0", "9***"], "****")
+
+    puzzles = MULTI_SOLUTION_PUZZLES + [
+        ("5**", "*4", ["20*8", "3**2"], "3308*"),
+        ("*****", "5***", ["*5*2**", "733**2", "*1*44", "*58**0"], "***1****0"),
+        ("2**", "**", ["0", "9***"], "****"),
+    ]
+    for options in (SearchOptions(), SearchOptions(engine="multiplier_first")):
+        preprocess = SearchOptions(engine=options.engine, preprocess=True)
+        for puzzle in puzzles:
+            assert sorted(solve_all(*puzzle, options=preprocess)) == sorted(
+                solve_all(*puzzle, options=options))
+
+    stats = SearchStats()
+    solver("*****", "5***", ["*5*2**", "733**2", "*1*44", "*58**0"], "***1****0",
+           stats=stats, options=SearchOptions(preprocess=True))
+    assert (stats.nodes_expanded, stats.leaves_verified) == (0, 1)
+
+
+def test_search_budgets():
+    puzzle = ("******", "****", ["66****", "6*****", "**666**", "**6**6"], "****66****")
+    with pytest.raises(SearchInterrupted) as e:
+        solver(*puzzle, max_nodes=10)
+    assert e.value.reason == "max_nodes"
+    assert e.value.stats.nodes_expanded <= 10
+    assert 0 < e.value.explored < 1
+    assert str(e.value) == "Error: search interrupted (max_nodes)"
+    # 例外はプロセスの間で受け渡せる
+    restored = pickle.loads(pickle.dumps(e.value))
+    assert (restored.reason, restored.explored) == (e.value.reason, e.value.explored)
+
+    with pytest.raises(SearchInterrupted) as e:
+        solver(*puzzle, timeout=0)
+    assert e.value.reason == "timeout"
+    assert e.value.explored == 0
+    with pytest.raises(ValueError):
+        solver(*puzzle, timeout=-1)
+
+    # 上限に達しなければ結果は変わらない
+    assert solver(*puzzle, max_nodes=100000, timeout=60, cancel=CancellationToken()) == (
+        solver(*puzzle))
+
+    # 解が無いことと、探索を止めたことは区別する
+    no_answer = ("***", "**", ["***", "***"], "9973")
+    with pytest.raises(SearchInterrupted):
+        solver(*no_answer, max_nodes=1)
+    with pytest.raises(ValueError, match="no answer"):
+        solver(*no_answer, max_nodes=100000)
+
+    # 取り消すと、それまでに見つかった解を返した後で止まる
+    puzzle = ("***", "**", ["****", "***"], "*****")
+    token = CancellationToken()
+    solutions = iter_solutions(*puzzle, cancel=token)
+    assert next(solutions) == ("909", "19")
+    token.cancel()
+    with pytest.raises(SearchInterrupted) as e:
+        list(solutions)
+    assert e.value.reason == "cancelled"
+    assert 1 <= e.value.stats.solutions < count_solutions(*puzzle)
+
+    stats = SearchStats()
+    with pytest.raises(SearchInterrupted):
+        count_solutions(*puzzle, stats=stats, max_nodes=50)
+    assert 0 < stats.solutions
+    assert len(solve_all(*puzzle, limit=3, max_nodes=1000)) == 3
+
+    search = DepthFirstSearch(*puzzle)
+    assert search.explored_fraction() == 0
+    list(search.run(max_nodes=20))
+    assert search.interrupted == "max_nodes"
+    # 続きから探索できる
+    list(search.run())
+    assert search.interrupted is None
+    assert search.explored_fraction() == 1
+
 
 def test_convert_to_regex():
     assert convert_to_regex("*1") == re.compile("[1-9]1")
@@ -125,6 +797,32 @@ def test_convert_to_regex():
     assert convert_to_regex("12*34") == re.compile("12[0-9]34")
 
 
+def test_compile_puzzle():
+    # 先頭の*、0だけの行、先頭が0の行も正規表現と同じ判定になる
+    lines = ["*", "0", "7", "0*", "*0*", "1*", "**", "*2*4"]
+    for line in lines:
+        checker = compile_puzzle([line], "*", 1)
+        regex = convert_to_regex(line)
+        for value in range(20000):
+            assert checker.check(1, value) == bool(regex.fullmatch(str(value))), (line, value)
+            assert compile_puzzle(["*"], line, 1).check(value, 1) == bool(
+                regex.fullmatch(str(value))), (line, value)
+
+    intermediate_lines = ["20*8", "3**2"]
+    checker = compile_puzzle(intermediate_lines, "3308*", 3)
+    assert compile_puzzle(list(intermediate_lines), "3308*", 3) is checker
+    assert pickle.loads(pickle.dumps(checker)).source == checker.source
+    random.seed(0)
+    for _ in range(2000):
+        multiple = (str(random.randrange(100, 1000)), str(random.randrange(10, 100)))
+        node = SearchNode.from_strings(*multiple)
+        assert checker.check(node.product, node.partials) == is_correct_answer(
+            multiple, [convert_to_regex(line) for line in intermediate_lines],
+            convert_to_regex("3308*"))
+    node = SearchNode.from_strings("517", "64")
+    assert checker.check(node.product, node.partials)
+
+
 def test_is_wrong_answer_mod():
     # mod product is bad
     assert is_wrong_answer_mod(
@@ -220,6 +918,7 @@ def test_make_min_max():
     assert make_min_max("1*2") == (102, 192)
     assert make_min_max("***") == (100, 999)
     assert make_min_max("1") == (1, 1)
+    assert make_min_max("0") == (0, 0)
 
 
 def test_check_mod():
@@ -256,6 +955,9 @@ def test_check_mod():
 
     assert check_mod(multiple_1, multiple_2, product) == True
 
+    # テストケース6: 下の桁が0で始まる場合 (101 * 3 = 303)
+    assert check_mod("*01", "3", "303") == True
+
 
 def test_is_correct_answer():
     # テストケース1: 正しい場合
@@ -326,6 +1028,16 @@ def test_is_correct_answer():
     )
 
 
+def test_is_correct_answer_length():
+    # 桁数が違う場合は一致しない
+    assert not is_correct_answer(
+        ("517", "64"), [convert_to_regex("***8"), convert_to_regex("***2")],
+        convert_to_regex("3308"))
+    assert not is_correct_answer(
+        ("517", "64"), [convert_to_regex("***"), convert_to_regex("***2")],
+        convert_to_regex("*****"))
+
+
 def test_validate_input():
     with pytest.raises(ValueError):
         # multiple_line1にaが含まれている